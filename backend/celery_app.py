@@ -1,15 +1,28 @@
 from celery import Celery
+from celery.signals import task_postrun, task_prerun
+from typing import Dict
 import os
+import time
 from dotenv import load_dotenv
 
+from services.alert_queue import ALERT_QUEUE_KEY
+from services.metrics import TASK_SECONDS, registry
+
 load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Seconds between alert counter reconciliation runs (see services/alert_counters.py)
+ALERT_COUNTERS_RECONCILE_INTERVAL = float(os.getenv("ALERT_COUNTERS_RECONCILE_INTERVAL", "300"))
+# Seconds between alert queue polls, picks up payloads a batch trigger missed (see services/alert_queue.py)
+ALERT_BATCH_POLL_INTERVAL = float(os.getenv("ALERT_BATCH_POLL_INTERVAL", "5"))
+# Seconds between log partition maintenance runs (see services/partition_manager.py)
+LOG_PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("LOG_PARTITION_MAINTENANCE_INTERVAL", "3600"))
 
 celery_app = Celery(
     'securewatch',
     broker=REDIS_URL,
-    backend=REDIS_URL
+    backend=REDIS_URL,
+    include=['tasks.alert_tasks', 'tasks.maintenance_tasks']
 )
 
 celery_app.conf.update(
@@ -19,5 +32,53 @@ celery_app.conf.update(
     timezone='UTC',
     enable_utc=True,
     task_track_started=True,
+    beat_schedule={
+        'reconcile-alert-counters': {
+            'task': 'tasks.alert_tasks.reconcile_alert_counters',
+            'schedule': ALERT_COUNTERS_RECONCILE_INTERVAL,
+        },
+        'maintain-log-partitions': {
+            'task': 'tasks.maintenance_tasks.maintain_log_partitions',
+            'schedule': LOG_PARTITION_MAINTENANCE_INTERVAL,
+        },
+        'process-alert-batch': {
+            'task': 'tasks.alert_tasks.process_alert_batch',
+            'schedule': ALERT_BATCH_POLL_INTERVAL,
+        },
+        'prune-log-rollups': {
+            'task': 'tasks.maintenance_tasks.prune_log_rollups',
+            'schedule': LOG_PARTITION_MAINTENANCE_INTERVAL,
+        },
+    },
 )
 
+
+# Queue the workers consume from (Celery's default), a Redis list on the broker
+CELERY_QUEUE = 'celery'
+
+_redis = None
+_task_started: Dict[str, float] = {}
+
+def queue_depths() -> Dict:
+    """Messages waiting per queue, by (queue,) label for /metrics"""
+    global _redis
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+    pipe = _redis.pipeline(transaction=False)
+    pipe.llen(CELERY_QUEUE)
+    pipe.llen(ALERT_QUEUE_KEY)
+    celery_depth, alert_depth = pipe.execute()
+    return {('celery',): celery_depth, ('alert_batch',): alert_depth}
+
+@task_prerun.connect
+def _start_task_timer(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+@task_postrun.connect
+def _record_task(task_id=None, task=None, state=None, **kwargs):
+    """Time the task and push this worker's metrics for the API's /metrics"""
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_SECONDS.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+    registry.maybe_push()
@@ -1,11 +1,18 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+import asyncio
 import os
 from dotenv import load_dotenv
 
 from routers import logs, alerts, incidents, health
+from celery_app import queue_depths
 from database import init_db
+from services.broadcast_backplane import create_backplane
+from services.connection_manager import ConnectionManager
+from services.elasticsearch_service import ES_BULK_CLOSE_TIMEOUT, close_bulk_indexer
+from services.ingest_pipeline import ingest_pipeline
+from services.metrics import registry
+from services.warmup import LazyResource, warmup
 
 load_dotenv()
 
@@ -26,13 +33,46 @@ app.add_middleware(
     ],
     allow_credentials=True,
     allow_methods=["*"],
+    expose_headers=["X-Next-Cursor"],
     allow_headers=["*"],
 )
 
-# Initialize database
+# Schema creation, partition maintenance and counter reconciliation run in the
+# background with the other warm-ups (Elasticsearch, model); see GET /ready
+warmup.add(LazyResource('database', init_db))
+
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    warmup.start()
+    await backplane.start(manager.deliver)
+    await ingest_pipeline.start(manager.broadcast)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingest_pipeline.stop()
+    await backplane.stop()
+    # The final flush retries with sleeps, keep it off the event loop and bounded
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.wait_for(loop.run_in_executor(None, close_bulk_indexer), ES_BULK_CLOSE_TIMEOUT + 1)
+    except asyncio.TimeoutError:
+        print(f"Elasticsearch bulk flush did not finish within {ES_BULK_CLOSE_TIMEOUT}s, shutting down anyway")
+
+# WebSocket connection manager, fed through the cross-worker backplane
+backplane = create_backplane()
+manager = ConnectionManager(backplane=backplane)
+
+# Read when GET /metrics is scraped, from counters the manager and Redis already keep
+registry.gauge_callback("securewatch_websocket_connections", "Open WebSocket connections on this worker", lambda: len(manager.clients))
+registry.counter_callback(
+    "securewatch_websocket_messages_total", "WebSocket messages sent to clients or dropped by the slow-consumer policy",
+    lambda: {('sent',): manager.messages_sent, ('dropped',): manager.messages_dropped}, ("outcome",)
+)
+registry.counter_callback(
+    "securewatch_websocket_evicted_total", "WebSocket clients disconnected for failed or timed out sends",
+    lambda: manager.clients_evicted
+)
+registry.gauge_callback("securewatch_celery_queue_depth", "Messages waiting in Redis per queue", queue_depths, ("queue",))
 
 # Include routers
 app.include_router(health.router)
@@ -42,35 +82,15 @@ app.include_router(logs.router)
 app.include_router(alerts.router)
 app.include_router(incidents.router)
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-    
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-    
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
-
-manager = ConnectionManager()
-
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            await websocket.receive_text()
+            await manager.handle_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
 # Export manager for use in other modules
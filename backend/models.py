@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Enum, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Enum, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 import enum
@@ -39,6 +39,41 @@ class Alert(Base):
     category = Column(String(100), nullable=True)
     threat_intel = Column(JSON, nullable=True)  # Store threat intelligence data
     anomaly_score = Column(String(50), nullable=True)
+    # Repeats folded into this alert by the deduplication window
+    occurrence_count = Column(Integer, default=1)
+    first_seen = Column(DateTime, nullable=True)
+    last_seen = Column(DateTime, nullable=True)
+    
+    # Keyset pagination on (timestamp, id)
+    __table_args__ = (Index("ix_alerts_timestamp_id", "timestamp", "id"),)
+
+class AlertCounter(Base):
+    """Alert counts per (severity, is_resolved), kept in step with the alerts table"""
+    __tablename__ = "alert_counters"
+    
+    severity = Column(Enum(SeverityLevel), primary_key=True)
+    is_resolved = Column(Boolean, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class LogRollup(Base):
+    """Log counts per minute or hour bucket, maintained incrementally at ingest"""
+    __tablename__ = "log_rollups"
+    
+    resolution = Column(String(10), primary_key=True)  # minute or hour
+    bucket = Column(DateTime, primary_key=True)
+    severity = Column(Enum(SeverityLevel), primary_key=True)
+    log_type = Column(String(50), primary_key=True)
+    is_anomaly = Column(Boolean, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class LogRollupSource(Base):
+    """HyperLogLog registers of the source IPs seen per minute or hour bucket, a fixed number of rows per bucket"""
+    __tablename__ = "log_rollup_source_registers"
+    
+    resolution = Column(String(10), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    register = Column(Integer, primary_key=True)
+    rank = Column(Integer, nullable=False)
 
 class Incident(Base):
     __tablename__ = "incidents"
@@ -53,14 +88,19 @@ class Incident(Base):
     assigned_to = Column(String(100), nullable=True)
     playbook_executed = Column(Boolean, default=False)
     playbook_results = Column(JSON, nullable=True)
+    
+    # Keyset pagination on (created_at, id)
+    __table_args__ = (Index("ix_incidents_created_at_id", "created_at", "id"),)
 
 class LogEntry(Base):
+    # Range-partitioned by timestamp on PostgreSQL, see services/partition_manager.py
     __tablename__ = "log_entries"
     
-    id = Column(Integer, primary_key=True, index=True)
+    # id and timestamp lookups are served by the primary key and the (timestamp, id) index
+    id = Column(Integer, primary_key=True)
     source_ip = Column(String(45), index=True)
     destination_ip = Column(String(45), index=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
     log_type = Column(String(50))
     raw_log = Column(Text)
     message = Column(Text)
@@ -68,4 +108,6 @@ class LogEntry(Base):
     severity = Column(Enum(SeverityLevel), default=SeverityLevel.LOW)
     is_anomaly = Column(Boolean, default=False)
     anomaly_score = Column(String(50), nullable=True)
-
+    
+    # Keyset pagination on (timestamp, id)
+    __table_args__ = (Index("ix_log_entries_timestamp_id", "timestamp", "id"),)
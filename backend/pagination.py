@@ -0,0 +1,53 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional
+
+import os
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+# Response header carrying the opaque cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Largest page a list endpoint serves
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+def encode_cursor(timestamp: datetime, id: int) -> str:
+    """Opaque token pointing just past the (timestamp, id) of the last row served"""
+    raw = json.dumps([timestamp.isoformat(), id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Decode a cursor token, raises HTTPException(400) when it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate(query, timestamp_column, id_column, skip: int, limit: int, cursor: Optional[str]):
+    """
+    Order a query newest first on (timestamp, id) and page it. With a cursor
+    the page starts right after the cursor row through the composite index,
+    so its cost does not depend on how deep the page is. One extra row is
+    fetched to tell whether there is a next page
+    """
+    if cursor:
+        if skip:
+            raise HTTPException(status_code=400, detail="Use either skip or cursor, not both")
+        timestamp, id = decode_cursor(cursor)
+        query = query.where(tuple_(timestamp_column, id_column) < tuple_(timestamp, id))
+    elif skip:
+        query = query.offset(skip)
+    return query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1)
+
+def page_rows(rows: List, limit: int, response: Response, timestamp_attr: str = "timestamp") -> List:
+    """Trim the look-ahead row and set the next cursor header when more rows exist"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        # limit=0 serves an empty page, there is no last row to point a cursor at
+        if rows:
+            last = rows[-1]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, timestamp_attr), last.id)
+    return rows
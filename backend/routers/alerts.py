@@ -1,9 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional, List
-from database import get_db
+from database import get_async_db
 from models import Alert, SeverityLevel, AlertStatus
+from pagination import MAX_PAGE_SIZE, page_rows, paginate
+from tasks.alert_tasks import threat_intel
+from services.alert_counters import (
+    ALERT_COUNTERS_ENABLED,
+    counters_query,
+    grouped_counts_query,
+    resolution_change_statements,
+    summarize
+)
 
 router = APIRouter(prefix="/api/alerts", tags=["alerts"])
 
@@ -20,6 +30,9 @@ class AlertResponse(BaseModel):
     assigned_to: Optional[str]
     category: Optional[str]
     anomaly_score: Optional[str] = None
+    occurrence_count: int = 1
+    first_seen: Optional[str] = None
+    last_seen: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -31,34 +44,37 @@ class AlertUpdate(BaseModel):
 
 @router.get("/", response_model=List[AlertResponse])
 async def get_alerts(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=0, le=MAX_PAGE_SIZE),
     severity: Optional[str] = None,
     status: Optional[str] = None,
     resolved: Optional[bool] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get alerts with optional filtering"""
-    query = db.query(Alert)
+    """Get alerts with optional filtering, newest first (pass the X-Next-Cursor header back as cursor for the next page)"""
+    query = select(Alert)
     
     if severity:
         try:
             severity_enum = SeverityLevel[severity.upper()]
-            query = query.filter(Alert.severity == severity_enum)
+            query = query.where(Alert.severity == severity_enum)
         except KeyError:
             pass
     
     if status:
         try:
             status_enum = AlertStatus[status.upper()]
-            query = query.filter(Alert.status == status_enum)
+            query = query.where(Alert.status == status_enum)
         except KeyError:
             pass
     
     if resolved is not None:
-        query = query.filter(Alert.is_resolved == resolved)
+        query = query.where(Alert.is_resolved == resolved)
     
-    alerts = query.order_by(Alert.timestamp.desc()).offset(skip).limit(limit).all()
+    result = await db.execute(paginate(query, Alert.timestamp, Alert.id, skip, limit, cursor))
+    alerts = page_rows(result.scalars().all(), limit, response)
     
     return [
         AlertResponse(
@@ -73,15 +89,18 @@ async def get_alerts(
             is_resolved=alert.is_resolved,
             assigned_to=alert.assigned_to,
             category=alert.category,
-            anomaly_score=alert.anomaly_score
+            anomaly_score=alert.anomaly_score,
+            occurrence_count=alert.occurrence_count or 1,
+            first_seen=alert.first_seen.isoformat() if alert.first_seen else None,
+            last_seen=alert.last_seen.isoformat() if alert.last_seen else None
         )
         for alert in alerts
     ]
 
 @router.get("/{alert_id}", response_model=AlertResponse)
-async def get_alert(alert_id: int, db: Session = Depends(get_db)):
+async def get_alert(alert_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific alert"""
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
+    alert = await db.get(Alert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
@@ -97,20 +116,26 @@ async def get_alert(alert_id: int, db: Session = Depends(get_db)):
         is_resolved=alert.is_resolved,
         assigned_to=alert.assigned_to,
         category=alert.category,
-        anomaly_score=alert.anomaly_score
+        anomaly_score=alert.anomaly_score,
+        occurrence_count=alert.occurrence_count or 1,
+        first_seen=alert.first_seen.isoformat() if alert.first_seen else None,
+        last_seen=alert.last_seen.isoformat() if alert.last_seen else None
     )
 
 @router.patch("/{alert_id}")
 async def update_alert(
     alert_id: int,
     update: AlertUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an alert"""
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
+    # Row lock so concurrent updates can't both move the same alert's counters
+    alert = await db.get(Alert, alert_id, with_for_update=True)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
+    was_resolved = alert.is_resolved
+    
     if update.status:
         try:
             alert.status = AlertStatus[update.status.upper()]
@@ -125,8 +150,10 @@ async def update_alert(
         if update.is_resolved:
             alert.status = AlertStatus.RESOLVED
     
-    db.commit()
-    db.refresh(alert)
+    for statement in resolution_change_statements(alert.severity, was_resolved, alert.is_resolved):
+        await db.execute(statement)
+    await db.commit()
+    await db.refresh(alert)
     
     return AlertResponse(
         id=alert.id,
@@ -140,38 +167,35 @@ async def update_alert(
         is_resolved=alert.is_resolved,
         assigned_to=alert.assigned_to,
         category=alert.category,
-        anomaly_score=alert.anomaly_score
+        anomaly_score=alert.anomaly_score,
+        occurrence_count=alert.occurrence_count or 1,
+        first_seen=alert.first_seen.isoformat() if alert.first_seen else None,
+        last_seen=alert.last_seen.isoformat() if alert.last_seen else None
     )
 
 @router.patch("/{alert_id}/resolve")
-async def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
+async def resolve_alert(alert_id: int, db: AsyncSession = Depends(get_async_db)):
     """Resolve an alert"""
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
+    alert = await db.get(Alert, alert_id, with_for_update=True)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     
+    for statement in resolution_change_statements(alert.severity, alert.is_resolved, True):
+        await db.execute(statement)
     alert.is_resolved = True
     alert.status = AlertStatus.RESOLVED
-    db.commit()
+    await db.commit()
     
     return {"status": "resolved", "alert_id": alert_id}
 
 @router.get("/stats/summary")
-async def get_alert_stats(db: Session = Depends(get_db)):
+async def get_alert_stats(db: AsyncSession = Depends(get_async_db)):
     """Get alert statistics"""
-    total = db.query(Alert).count()
-    unresolved = db.query(Alert).filter(Alert.is_resolved == False).count()
-    critical = db.query(Alert).filter(Alert.severity == SeverityLevel.CRITICAL).count()
-    high = db.query(Alert).filter(Alert.severity == SeverityLevel.HIGH).count()
-    medium = db.query(Alert).filter(Alert.severity == SeverityLevel.MEDIUM).count()
-    low = db.query(Alert).filter(Alert.severity == SeverityLevel.LOW).count()
-    
-    return {
-        "total_alerts": total,
-        "unresolved": unresolved,
-        "critical": critical,
-        "high": high,
-        "medium": medium,
-        "low": low
-    }
+    query = counters_query() if ALERT_COUNTERS_ENABLED else grouped_counts_query()
+    result = await db.execute(query)
+    return summarize(result.all())
 
+@router.get("/stats/threat-intel")
+async def get_threat_intel_stats():
+    """Get reputation cache counters (totals across workers with the Redis backend)"""
+    return threat_intel.cache.stats()
@@ -1,8 +1,28 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Response
+
+from services.metrics import CONTENT_TYPE, registry
+from services.ml_service import detector
+from services.warmup import warmup
 
 router = APIRouter(tags=["health"])
 
 @router.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "SecureWatch API"}
+    return {"status": "healthy", "service": "SecureWatch API", "model": detector.info()}
+
+@router.get("/ready")
+def readiness_check(response: Response):
+    """Initialization state of each subsystem, 503 until every required one is ready"""
+    # Also retries subsystems whose initialization failed
+    warmup.start()
+    status = warmup.status()
+    if not status['ready']:
+        response.status_code = 503
+    return status
 
+@router.get("/metrics")
+def metrics():
+    """Prometheus metrics of this API worker, plus the snapshots Celery workers push to Redis"""
+    if not registry.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=false)")
+    return Response(registry.render(registry.read_workers()), media_type=CONTENT_TYPE)
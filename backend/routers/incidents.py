@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import Optional, List
-from database import get_db
+from typing import Dict, Optional, List
+from database import get_async_db
 from models import Incident, SeverityLevel, IncidentStatus
+from pagination import MAX_PAGE_SIZE, page_rows, paginate
 
 router = APIRouter(prefix="/api/incidents", tags=["incidents"])
 
@@ -17,6 +19,8 @@ class IncidentResponse(BaseModel):
     updated_at: Optional[str]
     assigned_to: Optional[str]
     playbook_executed: bool
+    # Per-step status and timings of the automated response, when a playbook ran
+    playbook_results: Optional[Dict] = None
 
     class Config:
         from_attributes = True
@@ -29,22 +33,25 @@ class IncidentCreate(BaseModel):
 
 @router.get("/", response_model=List[IncidentResponse])
 async def get_incidents(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=0, le=MAX_PAGE_SIZE),
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get incidents"""
-    query = db.query(Incident)
+    """Get incidents, newest first (pass the X-Next-Cursor header back as cursor for the next page)"""
+    query = select(Incident)
     
     if status:
         try:
             status_enum = IncidentStatus[status.upper()]
-            query = query.filter(Incident.status == status_enum)
+            query = query.where(Incident.status == status_enum)
         except KeyError:
             pass
     
-    incidents = query.order_by(Incident.created_at.desc()).offset(skip).limit(limit).all()
+    result = await db.execute(paginate(query, Incident.created_at, Incident.id, skip, limit, cursor))
+    incidents = page_rows(result.scalars().all(), limit, response, "created_at")
     
     return [
         IncidentResponse(
@@ -56,13 +63,14 @@ async def get_incidents(
             created_at=incident.created_at.isoformat(),
             updated_at=incident.updated_at.isoformat() if incident.updated_at else None,
             assigned_to=incident.assigned_to,
-            playbook_executed=incident.playbook_executed
+            playbook_executed=incident.playbook_executed,
+            playbook_results=incident.playbook_results
         )
         for incident in incidents
     ]
 
 @router.post("/", response_model=IncidentResponse)
-async def create_incident(incident: IncidentCreate, db: Session = Depends(get_db)):
+async def create_incident(incident: IncidentCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new incident"""
     try:
         severity_enum = SeverityLevel[incident.severity.upper()]
@@ -76,8 +84,8 @@ async def create_incident(incident: IncidentCreate, db: Session = Depends(get_db
         assigned_to=incident.assigned_to
     )
     db.add(db_incident)
-    db.commit()
-    db.refresh(db_incident)
+    await db.commit()
+    await db.refresh(db_incident)
     
     return IncidentResponse(
         id=db_incident.id,
@@ -88,6 +96,7 @@ async def create_incident(incident: IncidentCreate, db: Session = Depends(get_db
         created_at=db_incident.created_at.isoformat(),
         updated_at=db_incident.updated_at.isoformat() if db_incident.updated_at else None,
         assigned_to=db_incident.assigned_to,
-        playbook_executed=db_incident.playbook_executed
+        playbook_executed=db_incident.playbook_executed,
+        playbook_results=db_incident.playbook_results
     )
 
@@ -1,13 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional, List
-from database import get_db
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, List
+import asyncio
+import os
+import time
+from database import get_async_db
 from models import LogEntry, SeverityLevel
+from pagination import MAX_PAGE_SIZE, page_rows, paginate
+from services.behavior_store import BEHAVIOR_FEATURE_NAMES
 from services.elasticsearch_service import index_log
+from services.heavy_hitters import DIMENSIONS, HEAVY_HITTERS_CAPACITY, HEAVY_HITTERS_RETAIN, heavy_hitters
+from services.ingest_pipeline import ingest_pipeline
+from services.ingest_service import ingest_in_session, log_event, severity_for_prediction
+from services.metrics import ANOMALIES, INGEST_ERRORS, LOGS_INGESTED, stage_timers
 from services.ml_service import detector, extract_features
-from tasks.alert_tasks import analyze_log_and_create_alert
+from services.rollup_service import (
+    RESOLUTIONS,
+    ROLLUP_MAX_POINTS,
+    apply_rollups,
+    choose_resolution,
+    timeseries
+)
+from tasks.alert_tasks import queue_alert_analysis
+
+# Upper bound on the number of logs accepted by a single batch request
+MAX_INGEST_BATCH_SIZE = int(os.getenv("MAX_INGEST_BATCH_SIZE", "5000"))
+
+SINGLE_STAGES = stage_timers('single')
+BATCH_STAGES = stage_timers('batch')
 
 # Import manager function - will be set by main.py
 _manager = None
@@ -23,6 +46,12 @@ def get_manager():
 
 router = APIRouter(prefix="/api/logs", tags=["logs"])
 
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; query parameters with an offset or Z are converted to match"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
 class LogCreate(BaseModel):
     source_ip: str
     destination_ip: str
@@ -44,32 +73,78 @@ class LogResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class LogBatchCreate(BaseModel):
+    logs: List[LogCreate]
+
+class LogBatchItem(BaseModel):
+    id: int
+    severity: str
+    is_anomaly: bool
+    anomaly_score: Optional[str] = None
+
+class LogBatchResponse(BaseModel):
+    ingested: int
+    anomalies: int
+    items: List[LogBatchItem]
+
+class LogQueuedResponse(BaseModel):
+    status: str
+    queue_depth: int
+
+class TimeseriesBucket(BaseModel):
+    bucket: datetime
+    total: int
+    anomalies: int
+    distinct_sources: int
+    severity: Dict[str, int]
+    log_type: Dict[str, int]
+
+class TimeseriesResponse(BaseModel):
+    resolution: str
+    since: datetime
+    until: datetime
+    buckets: List[TimeseriesBucket]
+
+class HeavyHitter(BaseModel):
+    value: str
+    # count overestimates the true count by at most error; guaranteed = count - error
+    count: int
+    error: int
+    guaranteed: int
+
+class TopDimension(BaseModel):
+    total: int
+    error_bound: int
+    items: List[HeavyHitter]
+
+class TopResponse(BaseModel):
+    since: datetime
+    until: datetime
+    anomalies_only: bool
+    workers: int
+    dimensions: Dict[str, TopDimension]
+
 @router.post("/ingest", response_model=LogResponse)
-async def ingest_log(log: LogCreate, db: Session = Depends(get_db)):
+async def ingest_log(log: LogCreate, db: AsyncSession = Depends(get_async_db)):
     """Ingest a log entry and analyze it for anomalies"""
+    started = time.perf_counter()
     try:
         # Extract features for ML analysis
-        features = extract_features({
-            'timestamp': datetime.utcnow(),
-            'source_ip': log.source_ip,
-            'destination_ip': log.destination_ip,
-            'raw_log': log.raw_log
-        })
+        with SINGLE_STAGES['extract_features'].time():
+            features = extract_features({
+                'timestamp': datetime.utcnow(),
+                'source_ip': log.source_ip,
+                'destination_ip': log.destination_ip,
+                'raw_log': log.raw_log
+            })
         
         # Run ML prediction
-        prediction = detector.predict(features)
+        with SINGLE_STAGES['predict'].time():
+            # Never wait for the model on the event loop, the rules score until it is loaded
+            prediction = detector.predict(features, wait=False)
         
         # Determine severity based on anomaly detection
-        severity = SeverityLevel.LOW
-        if prediction['is_anomaly']:
-            if prediction['confidence'] > 0.8:
-                severity = SeverityLevel.CRITICAL
-            elif prediction['confidence'] > 0.6:
-                severity = SeverityLevel.HIGH
-            elif prediction['confidence'] > 0.4:
-                severity = SeverityLevel.MEDIUM
-            else:
-                severity = SeverityLevel.LOW
+        severity = severity_for_prediction(prediction)
         
         # Create log entry in database
         db_log = LogEntry(
@@ -87,51 +162,73 @@ async def ingest_log(log: LogCreate, db: Session = Depends(get_db)):
                 'prediction': prediction
             }
         )
-        db.add(db_log)
-        db.commit()
-        db.refresh(db_log)
-        
-        # Index in Elasticsearch
-        try:
-            index_log({
-                'timestamp': db_log.timestamp.isoformat(),
+        with SINGLE_STAGES['db_commit'].time():
+            db.add(db_log)
+            await db.run_sync(apply_rollups, [{
+                'timestamp': db_log.timestamp,
                 'source_ip': db_log.source_ip,
-                'destination_ip': db_log.destination_ip,
                 'log_type': db_log.log_type,
-                'raw_log': db_log.raw_log,
-                'message': db_log.message,
-                'severity': db_log.severity.value if db_log.severity else 'low'
-            })
-        except Exception as e:
-            print(f"Elasticsearch indexing error: {e}")
+                'severity': db_log.severity,
+                'is_anomaly': db_log.is_anomaly
+            }])
+            await db.commit()
+            await db.refresh(db_log)
+        LOGS_INGESTED.labels('single').inc()
+        if db_log.is_anomaly:
+            ANOMALIES.inc()
+        heavy_hitters.observe([{
+            'source_ip': db_log.source_ip,
+            'destination_ip': db_log.destination_ip,
+            'log_type': db_log.log_type,
+            'is_anomaly': db_log.is_anomaly
+        }])
+        
+        # Index in Elasticsearch
+        with SINGLE_STAGES['index'].time():
+            try:
+                index_log({
+                    'timestamp': db_log.timestamp.isoformat(),
+                    'source_ip': db_log.source_ip,
+                    'destination_ip': db_log.destination_ip,
+                    'log_type': db_log.log_type,
+                    'raw_log': db_log.raw_log,
+                    'message': db_log.message,
+                    'severity': db_log.severity.value if db_log.severity else 'low'
+                })
+            except Exception as e:
+                print(f"Elasticsearch indexing error: {e}")
         
         # Send to background task for alert generation if anomaly
         if prediction['is_anomaly']:
-            analyze_log_and_create_alert.delay({
-                'log_id': db_log.id,
-                'source_ip': log.source_ip,
-                'destination_ip': log.destination_ip,
-                'raw_log': log.raw_log,
-                'log_type': log.log_type,
-                'anomaly_score': prediction['anomaly_score'],
-                'confidence': prediction['confidence']
-            })
+            with SINGLE_STAGES['alert_publish'].time():
+                queue_alert_analysis([{
+                    'log_id': db_log.id,
+                    'source_ip': log.source_ip,
+                    'destination_ip': log.destination_ip,
+                    'raw_log': log.raw_log,
+                    'log_type': log.log_type,
+                    'anomaly_score': prediction['anomaly_score'],
+                    'confidence': prediction['confidence'],
+                    'behavior': {name: features[name] for name in BEHAVIOR_FEATURE_NAMES}
+                }])
         
         # Broadcast via WebSocket
         manager = get_manager()
-        await manager.broadcast({
-            'type': 'new_log',
-            'data': {
-                'id': db_log.id,
-                'source_ip': db_log.source_ip,
-                'destination_ip': db_log.destination_ip,
-                'log_type': db_log.log_type,
-                'message': db_log.message,
-                'severity': db_log.severity.value if db_log.severity else 'low',
-                'is_anomaly': db_log.is_anomaly,
-                'timestamp': db_log.timestamp.isoformat()
-            }
-        })
+        with SINGLE_STAGES['broadcast'].time():
+            await manager.broadcast({
+                'type': 'new_log',
+                'data': {
+                    'id': db_log.id,
+                    'source_ip': db_log.source_ip,
+                    'destination_ip': db_log.destination_ip,
+                    'log_type': db_log.log_type,
+                    'message': db_log.message,
+                    'severity': db_log.severity.value if db_log.severity else 'low',
+                    'is_anomaly': db_log.is_anomaly,
+                    'timestamp': db_log.timestamp.isoformat()
+                }
+            })
+        SINGLE_STAGES['total'].observe(time.perf_counter() - started)
         
         return LogResponse(
             id=db_log.id,
@@ -145,27 +242,146 @@ async def ingest_log(log: LogCreate, db: Session = Depends(get_db)):
             anomaly_score=db_log.anomaly_score
         )
     except Exception as e:
-        db.rollback()
+        INGEST_ERRORS.labels('single').inc()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/ingest/batch", response_model=LogBatchResponse)
+async def ingest_logs_batch(batch: LogBatchCreate):
+    """Ingest many log entries at once with a single scoring pass and bulk insert"""
+    if not batch.logs:
+        return LogBatchResponse(ingested=0, anomalies=0, items=[])
+    if len(batch.logs) > MAX_INGEST_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large, at most {MAX_INGEST_BATCH_SIZE} logs per request"
+        )
+    
+    started = time.perf_counter()
+    try:
+        # Scoring, the blocking Elasticsearch and Celery calls and the sync session all
+        # run in a worker thread so the event loop keeps serving other requests
+        loop = asyncio.get_running_loop()
+        records = await loop.run_in_executor(None, ingest_in_session, [log.model_dump() for log in batch.logs])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    # Broadcast via WebSocket
+    manager = get_manager()
+    with BATCH_STAGES['broadcast'].time():
+        for record in records:
+            await manager.broadcast(log_event(record))
+    BATCH_STAGES['total'].observe(time.perf_counter() - started)
+    
+    return LogBatchResponse(
+        ingested=len(records),
+        anomalies=sum(1 for record in records if record['is_anomaly']),
+        items=[
+            LogBatchItem(
+                id=record['id'],
+                severity=record['severity'].value,
+                is_anomaly=record['is_anomaly'],
+                anomaly_score=record['anomaly_score']
+            )
+            for record in records
+        ]
+    )
+
+@router.post("/ingest/async", response_model=LogQueuedResponse, status_code=202)
+async def ingest_log_async(log: LogCreate):
+    """Queue a log entry for micro-batched ingestion and return immediately"""
+    if not ingest_pipeline.running:
+        raise HTTPException(status_code=503, detail="Ingest pipeline is not running")
+    if not ingest_pipeline.submit(log.model_dump()):
+        raise HTTPException(status_code=503, detail="Ingest queue is full, retry later")
+    
+    return LogQueuedResponse(status="queued", queue_depth=ingest_pipeline.queue_depth())
+
+@router.get("/pipeline/stats")
+async def get_pipeline_stats():
+    """Get ingest pipeline queue and lag metrics"""
+    return ingest_pipeline.stats()
+
+@router.get("/timeseries", response_model=TimeseriesResponse)
+async def get_timeseries(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    resolution: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Log volume by severity, log type and anomaly flag per minute or hour (defaults to the last 24 hours)"""
+    until = naive_utc(until) or datetime.utcnow()
+    since = naive_utc(since) or until - timedelta(hours=24)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    
+    resolution = resolution or choose_resolution(since, until)
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="resolution must be minute or hour")
+    if (until - since) / RESOLUTIONS[resolution] > ROLLUP_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Range covers more than {ROLLUP_MAX_POINTS} {resolution} buckets")
+    
+    buckets = await db.run_sync(timeseries, since, until, resolution)
+    return TimeseriesResponse(resolution=resolution, since=since, until=until, buckets=buckets)
+
+@router.get("/top", response_model=TopResponse)
+def get_top_talkers(
+    dimension: Optional[str] = None,
+    k: int = 10,
+    windows: int = 2,
+    anomalies: bool = False,
+):
+    """
+    Top source IPs, destination IPs and log types over the last `windows`
+    tumbling windows (the current one included), from in-memory Space-Saving
+    sketches merged across workers
+    """
+    if dimension is not None and dimension not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"dimension must be one of {', '.join(DIMENSIONS)}")
+    if not 1 <= k <= HEAVY_HITTERS_CAPACITY:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {HEAVY_HITTERS_CAPACITY}")
+    if not 1 <= windows <= HEAVY_HITTERS_RETAIN:
+        raise HTTPException(status_code=400, detail=f"windows must be between 1 and {HEAVY_HITTERS_RETAIN}")
+    
+    top = heavy_hitters.top(k, windows, anomalies, [dimension] if dimension else DIMENSIONS)
+    return TopResponse(
+        since=datetime.fromtimestamp(top['since'], timezone.utc).replace(tzinfo=None),
+        until=datetime.fromtimestamp(top['until'], timezone.utc).replace(tzinfo=None),
+        anomalies_only=anomalies,
+        workers=top['workers'],
+        dimensions=top['dimensions']
+    )
+
 @router.get("/", response_model=List[LogResponse])
 async def get_logs(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=0, le=MAX_PAGE_SIZE),
     severity: Optional[str] = None,
-    db: Session = Depends(get_db)
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get logs with optional filtering"""
-    query = db.query(LogEntry)
+    """Get logs with optional filtering, newest first (pass the X-Next-Cursor header back as cursor for the next page)"""
+    query = select(LogEntry)
     
     if severity:
         try:
             severity_enum = SeverityLevel[severity.upper()]
-            query = query.filter(LogEntry.severity == severity_enum)
+            query = query.where(LogEntry.severity == severity_enum)
         except KeyError:
             pass
     
-    logs = query.order_by(LogEntry.timestamp.desc()).offset(skip).limit(limit).all()
+    since, until = naive_utc(since), naive_utc(until)
+    # Time bounds let PostgreSQL skip every log_entries partition outside the range
+    if since:
+        query = query.where(LogEntry.timestamp >= since)
+    if until:
+        query = query.where(LogEntry.timestamp < until)
+    
+    result = await db.execute(paginate(query, LogEntry.timestamp, LogEntry.id, skip, limit, cursor))
+    logs = page_rows(result.scalars().all(), limit, response)
     return [
         LogResponse(
             id=log.id,
@@ -182,9 +398,9 @@ async def get_logs(
     ]
 
 @router.get("/{log_id}", response_model=LogResponse)
-async def get_log(log_id: int, db: Session = Depends(get_db)):
+async def get_log(log_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific log entry"""
-    log = db.query(LogEntry).filter(LogEntry.id == log_id).first()
+    log = await db.get(LogEntry, log_id)
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
     
@@ -0,0 +1,77 @@
+import os
+from typing import Dict, Iterable, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, insert, select, text, update
+
+from models import Alert, AlertCounter, SeverityLevel
+
+load_dotenv()
+
+# Answer /api/alerts/stats/summary from the alert_counters table instead of scanning alerts
+ALERT_COUNTERS_ENABLED = os.getenv("ALERT_COUNTERS_ENABLED", "true").lower() == "true"
+
+def grouped_counts_query():
+    """One aggregate over alerts grouped by (severity, is_resolved)"""
+    return (
+        select(Alert.severity, Alert.is_resolved, func.count())
+        .group_by(Alert.severity, Alert.is_resolved)
+    )
+
+def counters_query():
+    return select(AlertCounter.severity, AlertCounter.is_resolved, AlertCounter.count)
+
+def summarize(rows: Iterable[Tuple]) -> Dict:
+    """Build the stats summary from (severity, is_resolved, count) rows"""
+    summary = {
+        "total_alerts": 0,
+        "unresolved": 0,
+        "critical": 0,
+        "high": 0,
+        "medium": 0,
+        "low": 0
+    }
+    for severity, is_resolved, count in rows:
+        summary["total_alerts"] += count
+        if not is_resolved:
+            summary["unresolved"] += count
+        if severity is not None:
+            summary[severity.value] += count
+    return summary
+
+def adjust_statement(severity: SeverityLevel, is_resolved: bool, delta: int):
+    """
+    Statement that moves one counter by delta. Run it in the same
+    transaction as the alert change so a reconciliation never sees one
+    without the other
+    """
+    return (
+        update(AlertCounter)
+        .where(AlertCounter.severity == severity, AlertCounter.is_resolved == bool(is_resolved))
+        .values(count=AlertCounter.count + delta)
+    )
+
+def resolution_change_statements(severity: SeverityLevel, was_resolved: bool, is_resolved: bool):
+    """Statements moving an alert between the resolved and unresolved counters"""
+    if bool(was_resolved) == bool(is_resolved):
+        return []
+    return [
+        adjust_statement(severity, was_resolved, -1),
+        adjust_statement(severity, is_resolved, 1),
+    ]
+
+def reconcile(db) -> Dict:
+    """Rebuild the counters from the alerts table and return the fresh summary"""
+    if db.bind.dialect.name == "postgresql":
+        # Blocks concurrent counter updates until the rebuild commits, so an
+        # alert committed meanwhile is counted exactly once
+        db.execute(text("LOCK TABLE alert_counters IN EXCLUSIVE MODE"))
+
+    counts = {(severity, bool(is_resolved)): count for severity, is_resolved, count in db.execute(grouped_counts_query())}
+    db.execute(delete(AlertCounter))
+    db.execute(insert(AlertCounter), [
+        {"severity": severity, "is_resolved": is_resolved, "count": counts.get((severity, is_resolved), 0)}
+        for severity in SeverityLevel
+        for is_resolved in (False, True)
+    ])
+    db.commit()
+    return summarize((severity, is_resolved, count) for (severity, is_resolved), count in counts.items())
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Alerts for the same (source_ip, category) within this many seconds of the
+# last occurrence are folded into one alert, 0 disables deduplication
+ALERT_DEDUP_WINDOW = float(os.getenv("ALERT_DEDUP_WINDOW", "300"))
+# redis: one window index shared by all Celery workers; memory: per process, only
+# correct with a single worker process (prefork children each get their own)
+ALERT_DEDUP_BACKEND = os.getenv("ALERT_DEDUP_BACKEND", "redis")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# How long a worker waits for another worker that is creating the alert for the same key
+PENDING_WAIT = 2.0
+
+Key = Tuple[str, str]
+
+class MemoryAlertWindow:
+    """
+    Open alert windows keyed by (source_ip, category) in this process.
+    acquire() either returns the alert to fold into (sliding its window
+    forward) or makes the caller the creator of a new alert, which it must
+    follow with register() or release(). Concurrent callers for a key that
+    is being created wait for the creator instead of creating duplicates
+    """
+
+    def __init__(self, window: float = ALERT_DEDUP_WINDOW):
+        self.window = window
+        self._entries: Dict[Key, Dict] = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def acquire(self, key: Key) -> Optional[int]:
+        deadline = time.monotonic() + PENDING_WAIT
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._calls += 1
+                if self._calls % 1000 == 0:
+                    self._prune(now)
+                entry = self._entries.get(key)
+                if entry is None or entry['expires'] <= now:
+                    self._entries[key] = {'alert_id': None, 'expires': now + self.window, 'ready': threading.Event()}
+                    return None
+                if entry['alert_id'] is not None:
+                    entry['expires'] = now + self.window
+                    return entry['alert_id']
+                ready = entry['ready']
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not ready.wait(remaining):
+                return None
+
+    def register(self, key: Key, alert_id: int):
+        with self._lock:
+            entry = self._entries.setdefault(key, {'ready': threading.Event()})
+            entry['alert_id'] = alert_id
+            entry['expires'] = time.monotonic() + self.window
+        entry['ready'].set()
+
+    def release(self, key: Key):
+        """Give up on creating the alert for key so others can try"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['alert_id'] is None:
+                del self._entries[key]
+        if entry is not None:
+            entry['ready'].set()
+
+    def forget(self, key: Key, alert_id: int):
+        """Close key's window if it still points at alert_id (the alert was resolved)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.get('alert_id') == alert_id:
+                del self._entries[key]
+
+    def _prune(self, now: float):
+        for key in [key for key, entry in self._entries.items() if entry['expires'] <= now and entry['alert_id'] is not None]:
+            del self._entries[key]
+
+class RedisAlertWindow:
+    """
+    One Redis string per (source_ip, category). The first worker sets a
+    "pending" marker with SET NX and replaces it with the alert id once
+    the alert exists; each repeat re-arms the key's expiry, so the window
+    slides with the last occurrence
+    """
+
+    PENDING = b"pending"
+
+    def __init__(self, url: str = REDIS_URL, window: float = ALERT_DEDUP_WINDOW, prefix: str = "securewatch:alert-window"):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.window_ms = max(1, int(window * 1000))
+        self.prefix = prefix
+
+    def _key(self, key: Key) -> str:
+        return f"{self.prefix}:{key[0]}:{key[1]}"
+
+    def acquire(self, key: Key) -> Optional[int]:
+        name = self._key(key)
+        deadline = time.monotonic() + PENDING_WAIT
+        while True:
+            # The creator holds a pending marker until it registers the alert id
+            if self._redis.set(name, self.PENDING, nx=True, px=self.window_ms):
+                return None
+            value = self._redis.get(name)
+            if value is not None and value != self.PENDING:
+                self._redis.pexpire(name, self.window_ms)
+                return int(value)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+
+    def register(self, key: Key, alert_id: int):
+        self._redis.set(self._key(key), alert_id, px=self.window_ms)
+
+    def release(self, key: Key):
+        name = self._key(key)
+        if self._redis.get(name) == self.PENDING:
+            self._redis.delete(name)
+
+    def forget(self, key: Key, alert_id: int):
+        """Close key's window if it still points at alert_id; WATCH keeps a newer alert's window from being deleted"""
+        import redis
+        name = self._key(key)
+        with self._redis.pipeline() as pipe:
+            try:
+                pipe.watch(name)
+                if pipe.get(name) == str(alert_id).encode():
+                    pipe.multi()
+                    pipe.delete(name)
+                    pipe.execute()
+            except redis.WatchError:
+                pass
+
+def create_alert_window():
+    """Build the window index selected by ALERT_DEDUP_BACKEND, None when disabled"""
+    if ALERT_DEDUP_WINDOW <= 0:
+        return None
+    if ALERT_DEDUP_BACKEND == "redis":
+        return RedisAlertWindow()
+    print("Warning: ALERT_DEDUP_BACKEND=memory deduplicates per process; Celery workers with concurrency > 1 will raise duplicate alerts")
+    return MemoryAlertWindow()
+
+def dedup_key(source_ip: Optional[str], threat_type: str) -> Key:
+    return (source_ip or "unknown", threat_type)
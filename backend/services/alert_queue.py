@@ -0,0 +1,40 @@
+import json
+import os
+from typing import Dict, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Queue anomaly payloads in Redis and create alerts in batches instead of one task per anomaly
+ALERT_BATCH_MODE = os.getenv("ALERT_BATCH_MODE", "false").lower() == "true"
+# Payloads handled per batch, and batches drained per consumer task run
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", "200"))
+ALERT_BATCH_MAX_BATCHES = int(os.getenv("ALERT_BATCH_MAX_BATCHES", "50"))
+ALERT_QUEUE_KEY = os.getenv("ALERT_QUEUE_KEY", "securewatch:alert-queue")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_redis = None
+
+def _client():
+    global _redis
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
+
+def push_alert_payloads(payloads: List[Dict]) -> int:
+    """Append payloads to the alert queue in one round trip, returns the queue length"""
+    if not payloads:
+        return 0
+    return _client().rpush(ALERT_QUEUE_KEY, *(json.dumps(payload, default=str) for payload in payloads))
+
+def pop_alert_payloads(count: int) -> List[bytes]:
+    """Atomically take up to count raw payloads off the front of the queue"""
+    pipe = _client().pipeline(transaction=True)
+    pipe.lrange(ALERT_QUEUE_KEY, 0, count - 1)
+    pipe.ltrim(ALERT_QUEUE_KEY, count, -1)
+    items, _ = pipe.execute()
+    return items
+
+def queue_depth() -> int:
+    return _client().llen(ALERT_QUEUE_KEY)
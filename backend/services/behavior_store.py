@@ -0,0 +1,250 @@
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Add per-source sliding-window features (event rate, failed logins, distinct destinations) to every log
+BEHAVIOR_FEATURES_ENABLED = os.getenv("BEHAVIOR_FEATURES_ENABLED", "true").lower() == "true"
+# Length of the sliding window in seconds and the number of sub-windows it advances by
+BEHAVIOR_WINDOW = float(os.getenv("BEHAVIOR_WINDOW", "60"))
+BEHAVIOR_SLOTS = int(os.getenv("BEHAVIOR_SLOTS", "6"))
+# Count-Min sketch size: estimates overshoot by at most ~e/width of the window's events
+# with probability 1 - e^-depth, whatever the number of distinct sources
+BEHAVIOR_CMS_WIDTH = int(os.getenv("BEHAVIOR_CMS_WIDTH", "16384"))
+BEHAVIOR_CMS_DEPTH = int(os.getenv("BEHAVIOR_CMS_DEPTH", "4"))
+# Cells of the HyperLogLog grid that counts distinct destinations per source; every
+# source sharing a cell adds its own destinations, so keep the width well above
+# (active sources per window) / (BEHAVIOR_DISTINCT_DESTINATION_THRESHOLD / 2)
+BEHAVIOR_HLL_WIDTH = int(os.getenv("BEHAVIOR_HLL_WIDTH", "16384"))
+BEHAVIOR_HLL_DEPTH = int(os.getenv("BEHAVIOR_HLL_DEPTH", "2"))
+
+# Distinct sources whose sketch indexes are cached
+BEHAVIOR_SOURCE_CACHE_SIZE = int(os.getenv("BEHAVIOR_SOURCE_CACHE_SIZE", "8192"))
+
+# Column order of the behavioral features, appended after FEATURE_NAMES
+BEHAVIOR_FEATURE_NAMES = ['src_events', 'src_failed_logins', 'src_distinct_destinations']
+
+# 32 registers per HyperLogLog cell, about 18% standard error; small cells let the
+# grid be wide, which matters more than precision once many sources share a cell
+HLL_PRECISION = 5
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_ALPHA = 0.697
+# The window-wide HyperLogLog of (source, destination) pairs used for noise correction
+PAIR_PRECISION = 12
+PAIR_REGISTERS = 1 << PAIR_PRECISION
+PAIR_ALPHA = 0.7213 / (1 + 1.079 / PAIR_REGISTERS)
+
+# Destination port tokens from firewall / flow style logs
+DESTINATION_PORT = re.compile(r'\b(?:dpt|dport|dst_port|dest_port|destination_port)\s*[=:]\s*(\d{1,5})|\bon port (\d{1,5})', re.IGNORECASE)
+
+def _hash_pair(value: str) -> Tuple[int, int]:
+    digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+def destination_key(destination_ip: Optional[str], raw_log: str) -> str:
+    """The destination a log touched: its IP plus the destination port when the log names one"""
+    match = DESTINATION_PORT.search(raw_log or '')
+    port = (match.group(1) or match.group(2)) if match else ''
+    return f"{destination_ip or ''}:{port}"
+
+class BehaviorStore:
+    """
+    Sliding-window behavior of every source IP in fixed memory. Event and
+    failed-login counts live in Count-Min sketches and distinct destinations
+    in a grid of small HyperLogLog cells, one set per sub-window so the
+    oldest sub-window can be dropped as the window slides. Memory depends
+    only on the sketch sizes, never on the number of sources. Each row's
+    estimate is corrected by the share of the window's traffic expected to
+    collide in that cell (Count-Mean-Min), so estimates stay close to the
+    truth under heavy load instead of only being upper bounds.
+
+    The window-wide HyperLogLog registers and each cell's harmonic sum are
+    maintained incrementally and rebuilt from the sub-windows when one
+    expires, so observing a log is a few dozen scalar updates
+    """
+
+    def __init__(
+        self,
+        window: float = BEHAVIOR_WINDOW,
+        slots: int = BEHAVIOR_SLOTS,
+        cms_width: int = BEHAVIOR_CMS_WIDTH,
+        cms_depth: int = BEHAVIOR_CMS_DEPTH,
+        hll_width: int = BEHAVIOR_HLL_WIDTH,
+        hll_depth: int = BEHAVIOR_HLL_DEPTH
+    ):
+        self.slots = slots
+        self.slot_seconds = window / slots
+        self.cms_width = cms_width
+        self.cms_depth = cms_depth
+        self.hll_width = hll_width
+        self.hll_depth = hll_depth
+        cells = hll_depth * hll_width
+        # counts[slot, counter, row * width + column], counter 0 = events, 1 = failed logins
+        self._counts = np.zeros((slots, 2, cms_depth * cms_width), dtype=np.int32)
+        # Sum over all slots, kept up to date so estimates read one array
+        self._totals = np.zeros((2, cms_depth * cms_width), dtype=np.int64)
+        # registers[slot, cell * HLL_REGISTERS + register], merged = max over slots
+        self._registers = np.zeros((slots, cells * HLL_REGISTERS), dtype=np.uint8)
+        self._merged = np.zeros(cells * HLL_REGISTERS, dtype=np.uint8)
+        # Per cell: sum of 2^-register and number of zero registers over the merged registers
+        self._harmonic = np.full(cells, float(HLL_REGISTERS))
+        self._zeros = np.full(cells, HLL_REGISTERS, dtype=np.int32)
+        # One larger HyperLogLog over all (source, destination) pairs in the window, and
+        # the window's event / failed-login totals, give the noise every cell carries
+        self._pair_registers = np.zeros((slots, PAIR_REGISTERS), dtype=np.uint8)
+        self._pair_merged = np.zeros(PAIR_REGISTERS, dtype=np.uint8)
+        self._pair_harmonic = float(PAIR_REGISTERS)
+        self._pair_zeros = PAIR_REGISTERS
+        self._slot_totals = [[0, 0] for _ in range(slots)]
+        self._window_totals = [0, 0]
+        # Memoryviews give cheap scalar access to the arrays above
+        self._count_views = [[memoryview(self._counts[slot, counter]) for counter in range(2)] for slot in range(slots)]
+        self._total_views = [memoryview(self._totals[counter]) for counter in range(2)]
+        self._register_views = [memoryview(self._registers[slot]) for slot in range(slots)]
+        self._merged_view = memoryview(self._merged)
+        self._harmonic_view = memoryview(self._harmonic)
+        self._zeros_view = memoryview(self._zeros)
+        self._pair_register_views = [memoryview(self._pair_registers[slot]) for slot in range(slots)]
+        self._pair_merged_view = memoryview(self._pair_merged)
+        # Sources repeat, so their sketch indexes are cached
+        self._columns = lru_cache(maxsize=BEHAVIOR_SOURCE_CACHE_SIZE)(self._compute_columns)
+        self._epoch: Optional[int] = None
+        self._lock = threading.Lock()
+        self.events = 0
+
+    def _advance(self, now: float) -> int:
+        """Clear sub-windows that slid out of the window, returns the current slot"""
+        epoch = int(now // self.slot_seconds)
+        if self._epoch is None:
+            self._epoch = epoch
+        elif epoch > self._epoch:
+            expired = range(self._epoch + 1, epoch + 1) if epoch - self._epoch < self.slots else range(self.slots)
+            for slot in {e % self.slots for e in expired}:
+                self._totals -= self._counts[slot]
+                self._counts[slot] = 0
+                self._registers[slot] = 0
+                self._pair_registers[slot] = 0
+                for counter in range(2):
+                    self._window_totals[counter] -= self._slot_totals[slot][counter]
+                self._slot_totals[slot] = [0, 0]
+            np.max(self._registers, axis=0, out=self._merged)
+            merged = self._merged.reshape(-1, HLL_REGISTERS)
+            self._harmonic[:] = np.power(2.0, -merged.astype(np.float64)).sum(axis=1)
+            self._zeros[:] = (merged == 0).sum(axis=1)
+            np.max(self._pair_registers, axis=0, out=self._pair_merged)
+            self._pair_harmonic = float(np.power(2.0, -self._pair_merged.astype(np.float64)).sum())
+            self._pair_zeros = int((self._pair_merged == 0).sum())
+            self._epoch = epoch
+        return self._epoch % self.slots
+
+    def _compute_columns(self, source: str) -> Tuple[List[int], List[int]]:
+        """Flat sketch indexes of a source, one per row (double hashing)"""
+        h1, h2 = _hash_pair(source)
+        cms = [row * self.cms_width + (h1 + row * h2) % self.cms_width for row in range(self.cms_depth)]
+        # Different bits of h1 pick the HyperLogLog cells; h2 is odd so strides cover every column
+        hll = [row * self.hll_width + ((h1 >> 32) + row * h2) % self.hll_width for row in range(self.hll_depth)]
+        return cms, hll
+
+    def observe(self, source_ip: Optional[str], destination: str, failed_login: bool, now: Optional[float] = None) -> Tuple[int, int, int]:
+        """Count one event for source_ip and return its features in BEHAVIOR_FEATURE_NAMES order"""
+        source = source_ip or 'unknown'
+        cms, hll = self._columns(source)
+        # Only compared within this process, so the salted builtin hash is fine here
+        d = hash((source, destination)) & 0xFFFFFFFFFFFFFFFF
+        register = d & (HLL_REGISTERS - 1)
+        rank = 64 - HLL_PRECISION - (d >> HLL_PRECISION).bit_length() + 1
+
+        with self._lock:
+            slot = self._advance(time.time() if now is None else now)
+            self.events += 1
+            for counter in ((0, 1) if failed_login else (0,)):
+                counts = self._count_views[slot][counter]
+                totals = self._total_views[counter]
+                for i in cms:
+                    counts[i] += 1
+                    totals[i] += 1
+                self._slot_totals[slot][counter] += 1
+                self._window_totals[counter] += 1
+            pair_register = d & (PAIR_REGISTERS - 1)
+            pair_rank = 64 - PAIR_PRECISION - (d >> PAIR_PRECISION).bit_length() + 1
+            if self._pair_register_views[slot][pair_register] < pair_rank:
+                self._pair_register_views[slot][pair_register] = pair_rank
+                old = self._pair_merged_view[pair_register]
+                if old < pair_rank:
+                    self._pair_merged_view[pair_register] = pair_rank
+                    self._pair_harmonic += 2.0 ** -pair_rank - 2.0 ** -old
+                    if old == 0:
+                        self._pair_zeros -= 1
+            registers = self._register_views[slot]
+            merged = self._merged_view
+            for cell in hll:
+                i = cell * HLL_REGISTERS + register
+                if registers[i] < rank:
+                    registers[i] = rank
+                    old = merged[i]
+                    if old < rank:
+                        merged[i] = rank
+                        self._harmonic_view[cell] += 2.0 ** -rank - 2.0 ** -old
+                        if old == 0:
+                            self._zeros_view[cell] -= 1
+            return self._estimate(cms, hll)
+
+    def estimate(self, source_ip: Optional[str], now: Optional[float] = None) -> Tuple[int, int, int]:
+        """Features for source_ip without counting an event"""
+        cms, hll = self._columns(source_ip or 'unknown')
+        with self._lock:
+            self._advance(time.time() if now is None else now)
+            return self._estimate(cms, hll)
+
+    def _estimate(self, cms: List[int], hll: List[int]) -> Tuple[int, int, int]:
+        events, failed = self._total_views
+        harmonic, zeros = self._harmonic_view, self._zeros_view
+        pairs = _hll_cardinality(self._pair_harmonic, self._pair_zeros, PAIR_REGISTERS, PAIR_ALPHA)
+        return (
+            _count_mean_min([events[i] for i in cms], self._window_totals[0], self.cms_width),
+            _count_mean_min([failed[i] for i in cms], self._window_totals[1], self.cms_width),
+            _count_mean_min([_hll_cardinality(harmonic[cell], zeros[cell]) for cell in hll], pairs, self.hll_width)
+        )
+
+    def stats(self) -> Dict:
+        arrays = (self._counts, self._totals, self._registers, self._merged, self._harmonic, self._zeros, self._pair_registers, self._pair_merged)
+        return {
+            'events': self.events,
+            'memory_bytes': sum(array.nbytes for array in arrays),
+            'window_seconds': self.slot_seconds * self.slots,
+        }
+
+def _hll_cardinality(harmonic: float, zeros: int, m: int = HLL_REGISTERS, alpha: float = HLL_ALPHA) -> float:
+    """HyperLogLog estimate from the sum of 2^-register and the zero count, with the small-range correction"""
+    estimate = alpha * m * m / harmonic
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return estimate
+
+def _count_mean_min(raw: List[float], total: float, width: int) -> int:
+    """
+    Count-Mean-Min: subtract from the rows the share of the other traffic
+    expected to land in the same cell, take the median over rows and never
+    exceed the plain minimum. The correction is monotonic, so it is applied
+    once to the median of the raw rows
+    """
+    ordered = sorted(raw)
+    middle = len(ordered) // 2
+    median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+    return max(0, round(min(median - (total - median) / (width - 1), ordered[0])))
+
+behavior_store = BehaviorStore()
+
+def behavior_features(source_ip: Optional[str], destination_ip: Optional[str], raw_log: str, failed_login: bool) -> Tuple[int, int, int]:
+    """Observe a log and return its source's behavioral features (zeros when disabled)"""
+    if not BEHAVIOR_FEATURES_ENABLED:
+        return (0, 0, 0)
+    return behavior_store.observe(source_ip, destination_key(destination_ip, raw_log), failed_login)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# memory: single process (dev/tests), redis: fan out across API workers and Celery
+BROADCAST_BACKEND = os.getenv("BROADCAST_BACKEND", "memory")
+BROADCAST_CHANNEL = os.getenv("BROADCAST_CHANNEL", "securewatch:events")
+# Events are published to Redis in batches of up to this many messages...
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "100"))
+# ...or after this many milliseconds, whichever comes first
+BROADCAST_FLUSH_INTERVAL_MS = float(os.getenv("BROADCAST_FLUSH_INTERVAL_MS", "10"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+Deliver = Callable[[Dict], Awaitable]
+
+class InMemoryBackplane:
+    """Delivers events straight to the local connection manager"""
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        self._deliver = None
+
+    async def publish(self, message: Dict):
+        if self._deliver:
+            await self._deliver(message)
+
+class RedisBackplane:
+    """
+    Publishes events to a Redis pub/sub channel in small batches and runs
+    one subscriber per worker that hands every received event to the local
+    connection manager, so dashboards see events from all workers
+    """
+
+    def __init__(
+        self,
+        url: str = REDIS_URL,
+        channel: str = BROADCAST_CHANNEL,
+        batch_size: int = BROADCAST_BATCH_SIZE,
+        flush_interval_ms: float = BROADCAST_FLUSH_INTERVAL_MS
+    ):
+        self.url = url
+        self.channel = channel
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._redis = None
+        self._deliver: Optional[Deliver] = None
+        self._pending: List[Dict] = []
+        self._flush_now: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.published = 0
+        self.received = 0
+        self.publish_errors = 0
+
+    async def start(self, deliver: Deliver):
+        import redis.asyncio as aioredis
+
+        self._deliver = deliver
+        self._redis = aioredis.from_url(self.url)
+        self._flush_now = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._subscriber()),
+            asyncio.create_task(self._flusher()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._flush()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def publish(self, message: Dict):
+        self._pending.append(message)
+        if len(self._pending) >= self.batch_size and self._flush_now is not None:
+            self._flush_now.set()
+
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self._flush()
+
+    async def _flush(self):
+        while self._pending and self._redis is not None:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            try:
+                await self._redis.publish(self.channel, json.dumps(batch, default=str))
+                self.published += len(batch)
+            except Exception as e:
+                self.publish_errors += len(batch)
+                print(f"Broadcast publish error: {e}")
+
+    async def _subscriber(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for item in pubsub.listen():
+                    if item['type'] != 'message':
+                        continue
+                    for message in json.loads(item['data']):
+                        self.received += 1
+                        await self._deliver(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Broadcast subscriber error: {e}, reconnecting")
+            finally:
+                # Release the old connection before the next attempt opens another one
+                await self._close_pubsub(pubsub)
+            await asyncio.sleep(1)
+
+    async def _close_pubsub(self, pubsub):
+        try:
+            await pubsub.aclose()
+        except Exception as e:
+            print(f"Broadcast subscriber close error: {e}")
+
+def create_backplane():
+    """Build the backplane selected by BROADCAST_BACKEND"""
+    if BROADCAST_BACKEND == "redis":
+        return RedisBackplane()
+    return InMemoryBackplane()
+
+_sync_redis = None
+
+def publish_event(message: Dict):
+    """
+    Publish an event from outside the API process (e.g. Celery tasks).
+    Only the Redis backend can reach API workers, so this is a no-op with
+    the in-memory backend
+    """
+    global _sync_redis
+    if BROADCAST_BACKEND != "redis":
+        return
+    try:
+        if _sync_redis is None:
+            import redis
+            _sync_redis = redis.Redis.from_url(REDIS_URL)
+        _sync_redis.publish(BROADCAST_CHANNEL, json.dumps([message], default=str))
+    except Exception as e:
+        print(f"Broadcast publish error: {e}")
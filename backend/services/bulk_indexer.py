@@ -0,0 +1,218 @@
+import atexit
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+class BulkIndexer:
+    """
+    Buffers documents in memory and ships them to Elasticsearch through the
+    _bulk API from a background thread. A flush happens when the buffer
+    reaches max_docs or max_bytes, or every flush_interval seconds. Failed
+    items are retried with exponential backoff, and the buffer is bounded by
+    max_buffer: once full (e.g. while ES is down) new documents are dropped
+    and counted instead of growing memory
+    """
+
+    def __init__(
+        self,
+        client,
+        index: str,
+        max_docs: int = 1000,
+        max_bytes: int = 5 * 1024 * 1024,
+        flush_interval: float = 1.0,
+        max_buffer: int = 50000,
+        max_retries: int = 3,
+        backoff: float = 0.5
+    ):
+        self.client = client
+        self.index = index
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self._action = json.dumps({"index": {"_index": index}}).encode() + b"\n"
+        self._buffer: deque = deque()
+        self._buffer_bytes = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._close_deadline: Optional[float] = None
+        self._atexit_registered = False
+
+        self.queued = 0
+        self.indexed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retried = 0
+        self.flushes = 0
+
+    def start(self):
+        """Start the background flush thread (idempotent, a no-op once closed)"""
+        with self._lock:
+            if self._closed or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="es-bulk-indexer", daemon=True)
+            self._thread.start()
+            register = not self._atexit_registered
+            self._atexit_registered = True
+        if register:
+            atexit.register(self.close)
+
+    def add(self, document: Dict) -> bool:
+        """Buffer a document for indexing, returns False if it was dropped (buffer full or closed)"""
+        line = self._action + json.dumps(document, default=str).encode() + b"\n"
+
+        with self._lock:
+            if self._closed or len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return False
+            self._buffer.append(line)
+            self._buffer_bytes += len(line)
+            self.queued += 1
+            full = len(self._buffer) >= self.max_docs or self._buffer_bytes >= self.max_bytes
+
+        if self._thread is None:
+            self.start()
+        if full:
+            self._wakeup.set()
+        return True
+
+    def flush(self, deadline: Optional[float] = None):
+        """Send everything currently buffered, giving up on retries past deadline (time.monotonic())"""
+        timeout = -1 if deadline is None else max(0.0, deadline - time.monotonic())
+        if not self._flush_lock.acquire(timeout=timeout):
+            return
+        try:
+            while True:
+                chunk = self._take_chunk()
+                if not chunk:
+                    return
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._drop_buffered(chunk)
+                    return
+                self._send(chunk, deadline)
+                self.flushes += 1
+        finally:
+            self._flush_lock.release()
+
+    def close(self, timeout: float = 10.0):
+        """
+        Stop the flush thread and send whatever is left within about timeout
+        seconds. Documents added afterwards are refused
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._close_deadline = deadline
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+            self._thread = None
+        self.flush(deadline)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            buffered, buffered_bytes = len(self._buffer), self._buffer_bytes
+        return {
+            'buffered': buffered,
+            'buffered_bytes': buffered_bytes,
+            'queued': self.queued,
+            'indexed': self.indexed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'retried': self.retried,
+            'flushes': self.flushes,
+        }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush(self._close_deadline)
+            except Exception as e:
+                print(f"Elasticsearch bulk flush error: {e}")
+
+    def _drop_buffered(self, chunk: List[bytes]):
+        """Give up on chunk and everything still buffered"""
+        with self._lock:
+            count = len(chunk) + len(self._buffer)
+            self._buffer.clear()
+            self._buffer_bytes = 0
+        self.dropped += count
+        print(f"Elasticsearch bulk indexing: dropped {count} documents still buffered at the close deadline")
+
+    def _take_chunk(self) -> List[bytes]:
+        """Pop up to max_docs / max_bytes worth of buffered lines"""
+        chunk, size = [], 0
+        with self._lock:
+            while self._buffer and len(chunk) < self.max_docs:
+                line = self._buffer[0]
+                if chunk and size + len(line) > self.max_bytes:
+                    break
+                self._buffer.popleft()
+                self._buffer_bytes -= len(line)
+                chunk.append(line)
+                size += len(line)
+        return chunk
+
+    def _send(self, chunk: List[bytes], deadline: Optional[float] = None):
+        """Send one _bulk request, retrying failed items with backoff until deadline"""
+        pending = chunk
+        error = None
+        retries = 0
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self.backoff * (2 ** (attempt - 1))
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    break
+                self.retried += len(pending)
+                retries += 1
+                time.sleep(delay)
+            try:
+                response = self.client.bulk(operations=pending)
+            except Exception as e:
+                # Transport-level failure, the whole chunk is retryable
+                error = e
+                continue
+
+            retry, rejected = self._split_response(pending, response)
+            self.indexed += len(pending) - len(retry) - rejected
+            self.failed += rejected
+            pending = retry
+            if not pending:
+                return
+
+        # Out of retries: ES is unavailable or overloaded, give the documents up
+        self.dropped += len(pending)
+        reason = f": {error}" if error else ""
+        print(f"Elasticsearch bulk indexing: dropped {len(pending)} documents after {retries} retries{reason}")
+
+    def _split_response(self, sent: List[bytes], response) -> Tuple[List[bytes], int]:
+        """Return (lines to retry, number permanently rejected) from a _bulk response"""
+        if not response.get('errors'):
+            return [], 0
+
+        retry, rejected = [], 0
+        for line, item in zip(sent, response.get('items', [])):
+            status = next(iter(item.values())).get('status', 500)
+            if status < 300:
+                continue
+            # Back-pressure and server errors are retryable, mapping errors are not
+            if status == 429 or status >= 500:
+                retry.append(line)
+            else:
+                rejected += 1
+        return retry, rejected
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+from typing import Dict, List
+
+from fastapi import WebSocket
+
+from services.subscriptions import MATCH_ALL, SubscriptionFilter, SubscriptionIndex
+
+# Messages buffered per client before the slow-consumer policy applies
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# What to do when a client's queue is full: drop_oldest, drop_newest, coalesce or disconnect
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+# Seconds a single send may take before the client is considered dead
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "drop_newest", "coalesce", "disconnect")
+
+class ClientConnection:
+    """A connected WebSocket with its own bounded send queue and writer task"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: asyncio.Task = None
+        self.filter: SubscriptionFilter = MATCH_ALL
+        self.dropped = 0
+
+class ConnectionManager:
+    """
+    WebSocket fan-out: each message is serialized once and put on every
+    subscribed client's bounded queue without awaiting any socket, so
+    broadcasting costs the same no matter how slow the dashboards are. A
+    per-client writer task drains the queue, and clients whose sends fail
+    or time out are evicted. Clients start subscribed to everything and
+    can narrow that with a subscribe message (see SubscriptionFilter).
+    With a backplane, broadcast() publishes through it and the backplane
+    calls deliver() on every worker's manager
+    """
+
+    def __init__(
+        self,
+        queue_size: int = WS_SEND_QUEUE_SIZE,
+        policy: str = WS_SLOW_CONSUMER_POLICY,
+        send_timeout: float = WS_SEND_TIMEOUT,
+        backplane=None
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.backplane = backplane
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.subscriptions = SubscriptionIndex()
+
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.clients_evicted = 0
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        client = ClientConnection(websocket, self.queue_size)
+        client.writer = asyncio.create_task(self._writer(client))
+        self.clients[websocket] = client
+        self.subscriptions.add(client.filter, client)
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        self.subscriptions.remove(client.filter, client)
+        if client.writer and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+    def subscribe(self, websocket: WebSocket, filter_: SubscriptionFilter):
+        """Replace a client's subscription filter"""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        self.subscriptions.remove(client.filter, client)
+        client.filter = filter_
+        self.subscriptions.add(filter_, client)
+
+    async def handle_message(self, websocket: WebSocket, text: str):
+        """Handle a control message sent by a client"""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        try:
+            message = json.loads(text)
+            action = message.get('action') if isinstance(message, dict) else None
+            if action == 'subscribe':
+                self.subscribe(websocket, SubscriptionFilter.from_dict(message.get('filter')))
+            elif action == 'unsubscribe':
+                self.subscribe(websocket, MATCH_ALL)
+            else:
+                raise ValueError("Expected action 'subscribe' or 'unsubscribe'")
+        except ValueError as e:
+            reply = {'type': 'error', 'detail': str(e)}
+        else:
+            reply = {'type': 'subscribed', 'filter': client.filter.to_dict()}
+        self._enqueue(client, json.dumps(reply))
+
+    async def broadcast(self, message: dict):
+        """Send a message to matching clients on every worker"""
+        if self.backplane is not None:
+            await self.backplane.publish(message)
+        else:
+            await self.deliver(message)
+
+    async def deliver(self, message: dict):
+        """Queue a message for every local client whose subscription matches it"""
+        payload = None
+        for client in list(self.subscriptions.match(message)):
+            if payload is None:
+                payload = json.dumps(message, default=str)
+            self._enqueue(client, payload)
+        # Give writer tasks a turn so bursts (e.g. batch ingest) drain
+        # into fast sockets instead of overflowing every queue
+        await asyncio.sleep(0)
+
+    def _enqueue(self, client: ClientConnection, payload: str):
+        try:
+            client.queue.put_nowait(payload)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.policy == "drop_newest":
+            self._drop(client, 1)
+        elif self.policy == "drop_oldest":
+            client.queue.get_nowait()
+            self._drop(client, 1)
+            client.queue.put_nowait(payload)
+        elif self.policy == "coalesce":
+            # Replace the backlog with a marker telling the client to resync,
+            # followed by the newest message
+            dropped = client.queue.qsize()
+            while not client.queue.empty():
+                client.queue.get_nowait()
+            self._drop(client, dropped)
+            client.queue.put_nowait(json.dumps({'type': 'overflow', 'dropped': dropped}))
+            if client.queue.full():
+                self._drop(client, 1)
+            else:
+                client.queue.put_nowait(payload)
+        else:
+            self._evict(client)
+
+    def _drop(self, client: ClientConnection, count: int):
+        client.dropped += count
+        self.messages_dropped += count
+
+    def _evict(self, client: ClientConnection):
+        if self.clients.get(client.websocket) is not client:
+            return
+        self.disconnect(client.websocket)
+        self.clients_evicted += 1
+        asyncio.create_task(self._close(client.websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    async def _writer(self, client: ClientConnection):
+        while True:
+            payload = await client.queue.get()
+            try:
+                async with asyncio.timeout(self.send_timeout):
+                    await client.websocket.send_text(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._evict(client)
+                return
+            self.messages_sent += 1
+
+    def stats(self) -> Dict:
+        return {
+            'connections': len(self.clients),
+            'subscription_groups': len(self.subscriptions),
+            'policy': self.policy,
+            'queue_size': self.queue_size,
+            'messages_sent': self.messages_sent,
+            'messages_dropped': self.messages_dropped,
+            'clients_evicted': self.clients_evicted,
+        }
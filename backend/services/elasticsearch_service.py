@@ -1,56 +1,150 @@
-from elasticsearch import Elasticsearch
+from typing import Dict, List
 import os
 from dotenv import load_dotenv
 
+from services.bulk_indexer import BulkIndexer
+from services.metrics import ES_FAILURES, registry
+from services.warmup import WARMUP_RETRY_INTERVAL, LazyResource, warmup
+
 load_dotenv()
 
 # Elasticsearch connection
 ELASTICSEARCH_URL = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
 
-try:
-    es = Elasticsearch([ELASTICSEARCH_URL])
-    # Test connection
-    if not es.ping():
-        print("Warning: Elasticsearch connection failed, continuing without it")
-        es = None
-except Exception as e:
-    print(f"Warning: Elasticsearch not available: {e}")
-    es = None
+# Buffered bulk indexing settings
+ES_BULK_ENABLED = os.getenv("ES_BULK_ENABLED", "true").lower() == "true"
+ES_BULK_MAX_DOCS = int(os.getenv("ES_BULK_MAX_DOCS", "1000"))
+ES_BULK_MAX_BYTES = int(os.getenv("ES_BULK_MAX_BYTES", str(5 * 1024 * 1024)))
+ES_BULK_FLUSH_INTERVAL = float(os.getenv("ES_BULK_FLUSH_INTERVAL", "1.0"))
+ES_BULK_MAX_BUFFER = int(os.getenv("ES_BULK_MAX_BUFFER", "50000"))
+ES_BULK_MAX_RETRIES = int(os.getenv("ES_BULK_MAX_RETRIES", "3"))
+# Seconds the shutdown flush may take before the remaining documents are dropped
+ES_BULK_CLOSE_TIMEOUT = float(os.getenv("ES_BULK_CLOSE_TIMEOUT", "10"))
+
+# Seconds between reconnection attempts while Elasticsearch is unreachable
+ES_RETRY_INTERVAL = float(os.getenv("ES_RETRY_INTERVAL", str(WARMUP_RETRY_INTERVAL)))
+
+LOG_INDEX = "securewatch-logs"
+
+def _connect():
+    """Client and bulk indexer, raises when the cluster does not answer a ping"""
+    from elasticsearch import Elasticsearch
+    client = Elasticsearch([ELASTICSEARCH_URL])
+    if not client.ping():
+        raise ConnectionError(f"no answer from {ELASTICSEARCH_URL}, continuing without it")
+    indexer = None
+    if ES_BULK_ENABLED:
+        indexer = BulkIndexer(
+            client,
+            LOG_INDEX,
+            max_docs=ES_BULK_MAX_DOCS,
+            max_bytes=ES_BULK_MAX_BYTES,
+            flush_interval=ES_BULK_FLUSH_INTERVAL,
+            max_buffer=ES_BULK_MAX_BUFFER,
+            max_retries=ES_BULK_MAX_RETRIES
+        )
+    return client, indexer
+
+# Connected in the background; optional, logs are stored in the database either way
+elasticsearch = warmup.add(LazyResource('elasticsearch', _connect, required=False, retry_interval=ES_RETRY_INTERVAL))
+
+def _client():
+    """(client, bulk indexer) once connected, (None, None) while connecting or unreachable"""
+    return elasticsearch.get(wait=False) or (None, None)
+
+def _bulk_stats() -> Dict:
+    """Bulk indexer counters for /metrics, empty until connected"""
+    if not elasticsearch.ready:
+        return {}
+    _, bulk_indexer = elasticsearch.get()
+    return bulk_indexer.stats() if bulk_indexer else {}
+
+registry.counter_callback(
+    "securewatch_es_bulk_documents_total",
+    "Documents handled by the bulk indexer, by outcome",
+    lambda: {(outcome,): count for outcome, count in _bulk_stats().items() if outcome in ('indexed', 'failed', 'dropped', 'retried')},
+    ("outcome",)
+)
+registry.gauge_callback(
+    "securewatch_es_bulk_buffered", "Documents waiting in the bulk indexer buffer",
+    lambda: _bulk_stats().get('buffered')
+)
+
+def _log_document(log_data: Dict) -> Dict:
+    """Build the Elasticsearch document for a log entry"""
+    return {
+        "timestamp": log_data.get("timestamp"),
+        "source_ip": log_data.get("source_ip"),
+        "destination_ip": log_data.get("destination_ip"),
+        "log_type": log_data.get("log_type"),
+        "raw_log": log_data.get("raw_log"),
+        "message": log_data.get("message"),
+        "severity": log_data.get("severity", "low")
+    }
 
 def index_log(log_data):
-    """Index a log entry in Elasticsearch"""
+    """Index a log entry in Elasticsearch (buffered when bulk indexing is enabled)"""
+    es, bulk_indexer = _client()
     if not es:
+        ES_FAILURES.labels('index').inc()
         return None
     
+    if bulk_indexer:
+        return bulk_indexer.add(_log_document(log_data))
+    
     try:
-        return es.index(
-            index="securewatch-logs",
-            body={
-                "timestamp": log_data.get("timestamp"),
-                "source_ip": log_data.get("source_ip"),
-                "destination_ip": log_data.get("destination_ip"),
-                "log_type": log_data.get("log_type"),
-                "raw_log": log_data.get("raw_log"),
-                "message": log_data.get("message"),
-                "severity": log_data.get("severity", "low")
-            }
-        )
+        return es.index(index=LOG_INDEX, body=_log_document(log_data))
     except Exception as e:
+        ES_FAILURES.labels('index').inc()
         print(f"Elasticsearch indexing error: {e}")
         return None
 
+def bulk_index_logs(logs: List[Dict]) -> int:
+    """Index many log entries, returns the number accepted"""
+    if not logs:
+        return 0
+    es, bulk_indexer = _client()
+    if not es:
+        ES_FAILURES.labels('bulk').inc()
+        return 0
+    
+    if bulk_indexer:
+        return sum(1 for log in logs if bulk_indexer.add(_log_document(log)))
+    
+    try:
+        operations = []
+        for log in logs:
+            operations.append({"index": {"_index": LOG_INDEX}})
+            operations.append(_log_document(log))
+        response = es.bulk(operations=operations)
+        return sum(1 for item in response['items'] if item['index'].get('status', 500) < 300)
+    except Exception as e:
+        ES_FAILURES.labels('bulk').inc()
+        print(f"Elasticsearch bulk indexing error: {e}")
+        return 0
+
+def close_bulk_indexer(timeout: float = ES_BULK_CLOSE_TIMEOUT):
+    """Flush buffered documents, call on shutdown; blocks for up to timeout seconds"""
+    if elasticsearch.ready:
+        _, bulk_indexer = elasticsearch.get()
+        if bulk_indexer:
+            bulk_indexer.close(timeout)
+
 def search_logs(query, size=100):
     """Search logs in Elasticsearch"""
+    es, _ = _client()
     if not es:
+        ES_FAILURES.labels('search').inc()
         return {"hits": {"hits": []}}
     
     try:
         return es.search(
-            index="securewatch-logs",
+            index=LOG_INDEX,
             body={"query": query},
             size=size
         )
     except Exception as e:
+        ES_FAILURES.labels('search').inc()
         print(f"Elasticsearch search error: {e}")
         return {"hits": {"hits": []}}
 
@@ -0,0 +1,119 @@
+import os
+import numpy as np
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Number of distinct IP addresses kept in the ip_to_int LRU cache
+IP_CACHE_SIZE = int(os.getenv("FEATURE_IP_CACHE_SIZE", "8192"))
+# Logs shorter than this many characters are scanned with the Aho-Corasick
+# automaton, longer ones with substring search, which is faster on them
+AHOCORASICK_MAX_LENGTH = int(os.getenv("FEATURE_AHOCORASICK_MAX_LENGTH", "64"))
+
+# Column order of the per-log features, must match the start of the feature list in ml-engine/train_model.py
+FEATURE_NAMES = [
+    'hour', 'day_of_week', 'source_ip_int', 'dest_ip_int',
+    'log_length', 'has_sql_keywords', 'has_script_tags', 'failed_login'
+]
+
+# Case-insensitive substrings that set each indicator flag, in FEATURE_NAMES order
+INDICATORS = {
+    'has_sql_keywords': ['select', 'union', 'drop', 'delete', 'insert', 'update', "' or '1'='1", '--'],
+    'has_script_tags': ['<script>', 'javascript:'],
+    'failed_login': ['failed login', 'authentication failed', 'unauthorized'],
+}
+
+@lru_cache(maxsize=IP_CACHE_SIZE)
+def ip_to_int(ip: str) -> int:
+    """Convert IP address to integer"""
+    try:
+        a, b, c, d = ip.split('.')
+        return int(a) * 16777216 + int(b) * 65536 + int(c) * 256 + int(d)
+    except (AttributeError, ValueError):
+        return 0
+
+def _parse_timestamp(timestamp) -> datetime:
+    """Normalize a timestamp field to a datetime"""
+    if isinstance(timestamp, datetime):
+        return timestamp
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except ValueError:
+            pass
+    return datetime.utcnow()
+
+class FeatureExtractor:
+    """Single-pass feature extraction with all indicators compiled into one matcher"""
+
+    def __init__(self):
+        self.flags = list(INDICATORS)
+        self._automaton = None
+        self._groups = [(i, tuple(INDICATORS[flag])) for i, flag in enumerate(self.flags)]
+
+        if AHOCORASICK_AVAILABLE:
+            # One Aho-Corasick automaton over every keyword; it reports
+            # overlapping matches, so flags agree exactly with `in` checks
+            self._automaton = ahocorasick.Automaton()
+            for i, keywords in self._groups:
+                for keyword in keywords:
+                    self._automaton.add_word(keyword, i)
+            self._automaton.make_automaton()
+
+    def scan(self, raw_log: str) -> List[int]:
+        """Scan a log once and return its indicator flags in INDICATORS order"""
+        lowered = raw_log.lower()
+        found = [0] * len(self.flags)
+
+        if self._automaton is not None and len(lowered) < AHOCORASICK_MAX_LENGTH:
+            remaining = len(found)
+            for _, i in self._automaton.iter(lowered):
+                if not found[i]:
+                    found[i] = 1
+                    remaining -= 1
+                    if not remaining:
+                        break
+            return found
+
+        # Past a few dozen characters, C-level substring search over the single
+        # lowercased copy is faster than walking the automaton (measured in bench_features.py)
+        for i, keywords in self._groups:
+            for keyword in keywords:
+                if keyword in lowered:
+                    found[i] = 1
+                    break
+        return found
+
+    def extract_row(self, log_entry: Dict) -> Tuple[int, ...]:
+        """Extract features for one log entry in FEATURE_NAMES order"""
+        timestamp = _parse_timestamp(log_entry.get('timestamp'))
+        raw_log = log_entry.get('raw_log', '')
+        has_sql_keywords, has_script_tags, failed_login = self.scan(raw_log)
+
+        return (
+            timestamp.hour,
+            timestamp.weekday(),
+            ip_to_int(log_entry.get('source_ip', '0.0.0.0')),
+            ip_to_int(log_entry.get('destination_ip', '0.0.0.0')),
+            len(raw_log),
+            has_sql_keywords,
+            has_script_tags,
+            failed_login,
+        )
+
+    def extract(self, log_entry: Dict) -> np.ndarray:
+        """Extract features for one log entry as a fixed-order vector"""
+        return np.array(self.extract_row(log_entry), dtype=np.float64)
+
+    def extract_matrix(self, log_entries: Iterable[Dict]) -> np.ndarray:
+        """Extract features for many log entries as an (N, len(FEATURE_NAMES)) matrix"""
+        rows = [self.extract_row(entry) for entry in log_entries]
+        return np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURE_NAMES))
+
+feature_extractor = FeatureExtractor()
@@ -0,0 +1,218 @@
+"""
+Isolation Forest compiled to flat NumPy arrays
+
+A fitted IsolationForest (and the StandardScaler in front of it) is
+flattened into one node table for all trees: split feature and threshold
+per node and the path length credited when a row ends in a leaf.
+Scoring walks every tree for a whole batch at once, one vectorized step per
+tree level, with no per-call validation or per-tree Python loop, and
+reproduces IsolationForest.score_samples.
+
+    python -m services.forest_compiler export anomaly_detector.pkl scaler.pkl forest.npz
+    python -m services.forest_compiler check forest.npz anomaly_detector.pkl scaler.pkl
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+# Padded trees double in size per level; IsolationForest's default depth is 8
+MAX_DEPTH = 16
+# Rows scored per pass, bounds the (rows, trees) working arrays
+CHUNK_ROWS = 4096
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Average path length of an unsuccessful BST search over n samples, as in sklearn"""
+    n = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n)
+    result[n == 2] = 1.0
+    many = n > 2
+    result[many] = 2.0 * (np.log(n[many] - 1.0) + np.euler_gamma) - 2.0 * (n[many] - 1.0) / n[many]
+    return result
+
+def _float32_floor(values: np.ndarray) -> np.ndarray:
+    """
+    Largest float32 not above each value: for a float32 x,
+    x <= t holds exactly when x <= _float32_floor(t), so splits can be
+    compared in float32 like sklearn's float32 inputs against float64 thresholds
+    """
+    rounded = values.astype(np.float32)
+    over = rounded.astype(np.float64) > values
+    rounded[over] = np.nextafter(rounded[over], np.float32(-np.inf))
+    return rounded
+
+class CompiledForest:
+    """
+    Array form of a fitted IsolationForest plus its scaler. Every tree is
+    padded to a complete binary tree of the forest's depth (a leaf above the
+    last level becomes a chain of always-left splits), stored heap-ordered,
+    so a step is node = 2 * node + 1 + (x > threshold) with no child lookup
+    """
+
+    ARRAYS = ('feature', 'threshold', 'value', 'mean', 'scale')
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict):
+        # (n_trees * internal) split feature and float32 threshold, heap order per tree
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        # (n_trees * leaves) path length credited for ending in each last-level slot
+        self.value = arrays['value']
+        self.mean = arrays['mean']
+        self.scale = arrays['scale']
+        self.meta = meta
+        self.n_features = meta['n_features']
+        self.n_trees = meta['n_trees']
+        self.depth = meta['depth']
+        self.offset = meta['offset']
+        self.denominator = meta['denominator']
+
+        internal = (1 << self.depth) - 1
+        trees = np.arange(self.n_trees, dtype=np.int32)[None, :]
+        self._roots = trees * internal
+        # Keeps node global across a step: 2 * (t * internal + s) + step = t * internal + (2s + 1)
+        self._step = 1 - trees * internal
+        self._leaf_base = (trees << self.depth) - trees * internal - internal
+
+    @classmethod
+    def from_model(cls, model, scaler=None) -> 'CompiledForest':
+        """Flatten a fitted IsolationForest; scaler must be a StandardScaler or None"""
+        n_features = int(model.n_features_in_)
+        if scaler is None:
+            mean, scale = np.zeros(n_features), np.ones(n_features)
+        elif hasattr(scaler, 'with_mean') and hasattr(scaler, 'with_std'):
+            mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+            scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+        else:
+            raise ValueError(f"cannot compile scaler {type(scaler).__name__}, only StandardScaler")
+        depth = max(1, max(tree.tree_.max_depth for tree in model.estimators_))
+        if depth > MAX_DEPTH:
+            raise ValueError(f"trees of depth {depth} are too deep to pad, at most {MAX_DEPTH}")
+        # Trees only see a column subset when features were subsampled
+        subsample = getattr(model, '_max_features', n_features) != n_features
+
+        internal = (1 << depth) - 1
+        n_trees = len(model.estimators_)
+        feature = np.zeros((n_trees, internal), dtype=np.int32)
+        threshold = np.full((n_trees, internal), np.inf)
+        value = np.zeros((n_trees, 1 << depth))
+        for t, (tree, columns) in enumerate(zip(model.estimators_, model.estimators_features_)):
+            tree = tree.tree_
+            left, right = tree.children_left, tree.children_right
+            split_feature = np.asarray(columns)[tree.feature] if subsample else tree.feature
+            # Original node and its depth for every slot of the current level
+            nodes = np.zeros(1, dtype=np.int64)
+            depths = np.zeros(1, dtype=np.int64)
+            for level in range(depth):
+                leaf = left[nodes] == -1
+                slots = slice((1 << level) - 1, (1 << (level + 1)) - 1)
+                feature[t, slots] = np.where(leaf, 0, split_feature[nodes])
+                threshold[t, slots] = np.where(leaf, np.inf, tree.threshold[nodes])
+                nodes = np.stack([np.where(leaf, nodes, left[nodes]), np.where(leaf, nodes, right[nodes])], axis=1).ravel()
+                depths = np.repeat(np.where(leaf, depths, depths + 1), 2)
+            value[t] = depths + _average_path_length(tree.n_node_samples[nodes])
+
+        arrays = {
+            'feature': feature.ravel(),
+            'threshold': _float32_floor(threshold.ravel()),
+            'value': value.ravel(),
+            'mean': np.asarray(mean, dtype=np.float64),
+            'scale': np.asarray(scale, dtype=np.float64),
+        }
+        meta = {
+            'format': FORMAT_VERSION,
+            'n_features': n_features,
+            'n_trees': n_trees,
+            'depth': depth,
+            'offset': float(model.offset_),
+            'denominator': float(n_trees * _average_path_length([model.max_samples_])[0]),
+        }
+        return cls(arrays, meta)
+
+    def save(self, path: str):
+        """Write the arrays and metadata as one uncompressed .npz"""
+        with open(path, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(self.meta)), **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path: str) -> 'CompiledForest':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('format') != FORMAT_VERSION:
+                raise ValueError(f"unsupported compiled forest format {meta.get('format')}")
+            return cls({name: data[name] for name in cls.ARRAYS}, meta)
+
+    def score_samples(self, matrix: np.ndarray) -> np.ndarray:
+        """Same as model.score_samples(scaler.transform(matrix[:, :n_features]))"""
+        if len(matrix) > CHUNK_ROWS:
+            return np.concatenate([
+                self.score_samples(matrix[i:i + CHUNK_ROWS]) for i in range(0, len(matrix), CHUNK_ROWS)
+            ])
+        rows = len(matrix)
+        # Scale in float64 like the scaler, then round to float32 like sklearn's tree input
+        scaled = ((matrix[:, :self.n_features] - self.mean) / self.scale).astype(np.float32).ravel()
+        row_base = np.arange(0, rows * self.n_features, self.n_features, dtype=np.int32)[:, None]
+
+        # Indexes are in range by construction, mode='clip' skips numpy's bounds checks
+        node = np.repeat(self._roots, rows, axis=0)
+        column = np.empty(node.shape, dtype=np.int32)
+        x = np.empty(node.shape, dtype=np.float32)
+        split = np.empty(node.shape, dtype=np.float32)
+        goes_right = np.empty(node.shape, dtype=bool)
+        for _ in range(self.depth):
+            np.take(self.feature, node, out=column, mode='clip')
+            column += row_base
+            np.take(scaled, column, out=x, mode='clip')
+            np.take(self.threshold, node, out=split, mode='clip')
+            np.greater(x, split, out=goes_right)
+            node *= 2
+            node += self._step
+            node += goes_right
+
+        node += self._leaf_base
+        depths = np.take(self.value, node, mode='clip').sum(axis=1)
+        if self.denominator == 0:
+            return -np.ones(rows)
+        return -(2 ** (-depths / self.denominator))
+
+    def predict(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(is_anomaly, score) per row, flagged like IsolationForest.predict"""
+        scores = self.score_samples(matrix)
+        return scores < self.offset, scores
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile an IsolationForest into NumPy arrays")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    export = subcommands.add_parser("export", help="Compile a model and scaler into an .npz file")
+    export.add_argument("model")
+    export.add_argument("scaler")
+    export.add_argument("output")
+
+    check = subcommands.add_parser("check", help="Compare a compiled forest with the sklearn model on random rows")
+    check.add_argument("forest")
+    check.add_argument("model")
+    check.add_argument("scaler")
+    check.add_argument("--rows", type=int, default=10000)
+
+    args = parser.parse_args()
+    import joblib
+    model, scaler = joblib.load(args.model), joblib.load(args.scaler)
+    if args.command == "export":
+        forest = CompiledForest.from_model(model, scaler)
+        forest.save(args.output)
+        print(json.dumps(forest.meta, indent=2))
+        return
+
+    forest = CompiledForest.load(args.forest)
+    matrix = np.random.default_rng(0).normal(forest.mean, forest.scale * 2, (args.rows, forest.n_features))
+    expected = model.score_samples(scaler.transform(matrix))
+    difference = float(np.abs(forest.score_samples(matrix) - expected).max())
+    print(json.dumps({'rows': args.rows, 'max_abs_difference': difference}))
+    if difference > 1e-9:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
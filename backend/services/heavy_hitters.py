@@ -0,0 +1,269 @@
+import heapq
+import json
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Counters per sketch: a reported count overshoots by at most (logs in the window) / capacity
+HEAVY_HITTERS_CAPACITY = int(os.getenv("HEAVY_HITTERS_CAPACITY", "1000"))
+# Length of each tumbling window in seconds and how many past windows are kept
+HEAVY_HITTERS_WINDOW = int(os.getenv("HEAVY_HITTERS_WINDOW", "60"))
+HEAVY_HITTERS_RETAIN = int(os.getenv("HEAVY_HITTERS_RETAIN", "15"))
+# memory: this process only, redis: every API worker publishes its sketches and reads merge them all
+HEAVY_HITTERS_BACKEND = os.getenv("HEAVY_HITTERS_BACKEND", "memory")
+# Seconds between publishes of this worker's sketches to Redis
+HEAVY_HITTERS_SYNC_INTERVAL = float(os.getenv("HEAVY_HITTERS_SYNC_INTERVAL", "5"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+DIMENSIONS = ('source_ip', 'destination_ip', 'log_type')
+SCOPES = ('all', 'anomalies')
+
+class SpaceSaving:
+    """
+    Space-Saving top-k summary with a fixed number of counters. Each
+    counter holds (count, error): count overestimates the true frequency by
+    at most error, and error is at most total / capacity. Summaries merge
+    (Agarwal et al.), so per-worker and per-window sketches can be combined
+    """
+
+    def __init__(self, capacity: int = HEAVY_HITTERS_CAPACITY):
+        self.capacity = capacity
+        self.total = 0
+        self.counters: Dict[str, List[int]] = {}
+        # One (count when pushed, key) per counter; entries go stale as counts grow
+        self._heap: List[Tuple[int, str]] = []
+
+    def update(self, key: str, weight: int = 1):
+        self.total += weight
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[key] = [weight, 0]
+            heapq.heappush(self._heap, (weight, key))
+            return
+        # Take over the smallest counter, inheriting its count as the error
+        smallest, evicted = self._pop_min()
+        del self.counters[evicted]
+        self.counters[key] = [smallest + weight, smallest]
+        heapq.heappush(self._heap, (smallest + weight, key))
+
+    def _pop_min(self) -> Tuple[int, str]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            current = self.counters[key][0]
+            if current == count:
+                return count, key
+            heapq.heappush(self._heap, (current, key))
+
+    def min_count(self) -> int:
+        """Count any key missing from a full summary may have had (0 if not full)"""
+        if len(self.counters) < self.capacity:
+            return 0
+        count, key = self._pop_min()
+        heapq.heappush(self._heap, (count, key))
+        return count
+
+    def top(self, k: int) -> List[Dict]:
+        ranked = heapq.nlargest(k, self.counters.items(), key=lambda item: item[1][0])
+        return [
+            {'value': key, 'count': count, 'error': error, 'guaranteed': count - error}
+            for key, (count, error) in ranked
+        ]
+
+    def to_dict(self) -> Dict:
+        return {'capacity': self.capacity, 'total': self.total, 'counters': self.counters}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SpaceSaving':
+        summary = cls(data['capacity'])
+        summary.total = data['total']
+        summary.counters = {key: list(counter) for key, counter in data['counters'].items()}
+        summary._heap = [(count, key) for key, (count, _) in summary.counters.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+    @classmethod
+    def merge(cls, summaries: Iterable['SpaceSaving'], capacity: int = HEAVY_HITTERS_CAPACITY) -> 'SpaceSaving':
+        """
+        Combine summaries: a key missing from a full summary is charged that
+        summary's smallest count (as both count and error), then the largest
+        `capacity` counters are kept
+        """
+        summaries = list(summaries)
+        merged = cls(capacity)
+        floors = [summary.min_count() for summary in summaries]
+        floor_total = sum(floors)
+        combined: Dict[str, List[int]] = {}
+        for summary, floor in zip(summaries, floors):
+            merged.total += summary.total
+            for key, (count, error) in summary.counters.items():
+                counter = combined.setdefault(key, [floor_total, floor_total])
+                counter[0] += count - floor
+                counter[1] += error - floor
+        kept = heapq.nlargest(capacity, combined.items(), key=lambda item: item[1][0])
+        merged.counters = dict(kept)
+        merged._heap = [(count, key) for key, (count, _) in merged.counters.items()]
+        heapq.heapify(merged._heap)
+        return merged
+
+class HeavyHitters:
+    """
+    Top talkers per dimension (source IP, destination IP, log type) over
+    all logs and over anomalies only, in tumbling windows of
+    HEAVY_HITTERS_WINDOW seconds. Updated on every ingest; queries merge
+    the requested windows and, with the Redis backend, every worker's
+    published sketches
+    """
+
+    def __init__(
+        self,
+        capacity: int = HEAVY_HITTERS_CAPACITY,
+        window: int = HEAVY_HITTERS_WINDOW,
+        retain: int = HEAVY_HITTERS_RETAIN,
+        redis_url: Optional[str] = None,
+        sync_interval: float = HEAVY_HITTERS_SYNC_INTERVAL,
+        prefix: str = "securewatch:heavy-hitters"
+    ):
+        self.capacity = capacity
+        self.window = window
+        self.retain = retain
+        self.sync_interval = sync_interval
+        self.prefix = prefix
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        # window start -> {(dimension, scope): SpaceSaving}
+        self._windows: Dict[int, Dict[Tuple[str, str], SpaceSaving]] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._thread = None
+        if redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url)
+
+    def window_start(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        return int(now // self.window) * self.window
+
+    def observe(self, records: List[Dict], now: Optional[float] = None):
+        """Count a batch of stored log records (needs source_ip, destination_ip, log_type, is_anomaly)"""
+        if not records:
+            return
+        # Aggregate the batch first so each distinct value is one weighted update
+        counts = Counter()
+        for record in records:
+            scopes = SCOPES if record.get('is_anomaly') else SCOPES[:1]
+            for dimension in DIMENSIONS:
+                value = record.get(dimension) or 'unknown'
+                for scope in scopes:
+                    counts[(dimension, scope, value)] += 1
+
+        start = self.window_start(now)
+        with self._lock:
+            sketches = self._windows.get(start)
+            if sketches is None:
+                sketches = self._windows[start] = {
+                    (dimension, scope): SpaceSaving(self.capacity) for dimension in DIMENSIONS for scope in SCOPES
+                }
+                for old in sorted(self._windows)[:-self.retain]:
+                    del self._windows[old]
+            for (dimension, scope, value), count in counts.items():
+                sketches[(dimension, scope)].update(value, count)
+            self._dirty.add(start)
+
+        if self._redis is not None and self._thread is None:
+            self._start_sync()
+
+    def top(self, k: int = 10, windows: int = 2, anomalies: bool = False, dimensions: Iterable[str] = DIMENSIONS, now: Optional[float] = None) -> Dict:
+        """Top k values per dimension over the last `windows` windows (the current one included)"""
+        scope = 'anomalies' if anomalies else 'all'
+        current = self.window_start(now)
+        starts = [current - i * self.window for i in range(min(windows, self.retain))]
+        remote, workers = self._read_shared(starts, scope) if self._redis is not None else ({}, 1)
+
+        result = {
+            'since': starts[-1],
+            'until': current + self.window,
+            'workers': workers,
+            'dimensions': {}
+        }
+        with self._lock:
+            for dimension in dimensions:
+                parts = [
+                    self._windows[start][(dimension, scope)]
+                    for start in starts if start in self._windows
+                ] + remote.get(dimension, [])
+                merged = SpaceSaving.merge(parts, self.capacity)
+                result['dimensions'][dimension] = {
+                    'total': merged.total,
+                    # Space-Saving guarantee for the merged summary
+                    'error_bound': merged.total // self.capacity,
+                    'items': merged.top(k)
+                }
+        return result
+
+    def _start_sync(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._sync_loop, name="heavy-hitters-sync", daemon=True)
+            self._thread.start()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"Heavy hitters Redis sync error: {e}")
+
+    def publish(self):
+        """Write this worker's changed windows to Redis, one hash field per worker"""
+        with self._lock:
+            snapshot = {
+                start: {key: json.dumps(sketch.to_dict()) for key, sketch in self._windows[start].items()}
+                for start in self._dirty if start in self._windows
+            }
+            self._dirty.clear()
+        if not snapshot:
+            return
+        pipe = self._redis.pipeline()
+        for start, sketches in snapshot.items():
+            for (dimension, scope), payload in sketches.items():
+                name = f"{self.prefix}:{start}:{dimension}:{scope}"
+                pipe.hset(name, self.worker_id, payload)
+                pipe.expire(name, self.window * (self.retain + 1))
+        pipe.execute()
+
+    def _read_shared(self, starts: List[int], scope: str) -> Tuple[Dict[str, List[SpaceSaving]], int]:
+        """Other workers' sketches for the given windows; this worker's own come from memory"""
+        shared: Dict[str, List[SpaceSaving]] = {}
+        workers = {self.worker_id}
+        try:
+            pipe = self._redis.pipeline()
+            names = [(dimension, f"{self.prefix}:{start}:{dimension}:{scope}") for start in starts for dimension in DIMENSIONS]
+            for _, name in names:
+                pipe.hgetall(name)
+            for (dimension, _), fields in zip(names, pipe.execute()):
+                for worker, payload in fields.items():
+                    worker = worker.decode()
+                    if worker == self.worker_id:
+                        continue
+                    workers.add(worker)
+                    shared.setdefault(dimension, []).append(SpaceSaving.from_dict(json.loads(payload)))
+        except Exception as e:
+            print(f"Heavy hitters Redis read error: {e}")
+        return shared, len(workers)
+
+def create_heavy_hitters() -> HeavyHitters:
+    """Build the tracker for HEAVY_HITTERS_BACKEND"""
+    return HeavyHitters(redis_url=REDIS_URL if HEAVY_HITTERS_BACKEND == "redis" else None)
+
+heavy_hitters = create_heavy_hitters()
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from services.ingest_service import ingest_in_session, log_event
+from services.metrics import PIPELINE_LAG_SECONDS, registry, stage_timers
+
+# Maximum number of logs written per group commit
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+# How long the worker waits for a batch to fill before flushing it
+INGEST_FLUSH_INTERVAL_MS = float(os.getenv("INGEST_FLUSH_INTERVAL_MS", "5"))
+# Logs buffered in memory before the async endpoint starts rejecting
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+
+STAGES = stage_timers('batch')
+
+class IngestPipeline:
+    """
+    In-process ingest pipeline: HTTP handlers enqueue logs and return, a
+    background worker drains the queue in micro-batches (by size or flush
+    deadline) and runs scoring, the group-commit DB write, ES indexing and
+    alert dispatch off the event loop, then broadcasts the results
+    """
+
+    def __init__(
+        self,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval_ms: float = INGEST_FLUSH_INTERVAL_MS,
+        queue_size: int = INGEST_QUEUE_SIZE
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._broadcast: Optional[Callable[[Dict], Awaitable]] = None
+
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.batch_errors = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._total_lag_ms = 0.0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self, broadcast: Optional[Callable[[Dict], Awaitable]] = None):
+        """Start the background worker on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._broadcast = broadcast
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the worker"""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    def submit(self, log: Dict) -> bool:
+        """Enqueue a log for processing, returns False when the queue is full"""
+        if not self.running:
+            raise RuntimeError("Ingest pipeline is not running")
+        try:
+            self._queue.put_nowait((time.monotonic(), log))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def _next_batch(self) -> List:
+        """Wait for one log, then collect more until the batch is full or the deadline passes"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._process(batch)
+            except Exception as e:
+                # A failure after the logs were stored (e.g. in broadcast) must not stop the worker
+                self.batch_errors += 1
+                print(f"Ingest pipeline worker error: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process(self, batch: List):
+        started = time.monotonic()
+        oldest_lag_ms = (started - batch[0][0]) * 1000
+        self.last_lag_ms = oldest_lag_ms
+        self.max_lag_ms = max(self.max_lag_ms, oldest_lag_ms)
+        self._total_lag_ms += sum((started - enqueued_at) * 1000 for enqueued_at, _ in batch)
+        PIPELINE_LAG_SECONDS.observe(oldest_lag_ms / 1000)
+
+        logs = [log for _, log in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            records = await loop.run_in_executor(None, ingest_in_session, logs)
+        except Exception as e:
+            self.failed += len(logs)
+            print(f"Ingest pipeline batch error: {e}")
+            return
+
+        self.batches += 1
+        self.processed += len(records)
+        self.last_batch_size = len(records)
+        self.last_flush_ms = (time.monotonic() - started) * 1000
+
+        if self._broadcast:
+            with STAGES['broadcast'].time():
+                for record in records:
+                    await self._broadcast(log_event(record))
+        STAGES['total'].observe(time.monotonic() - started)
+
+    def stats(self) -> Dict:
+        """Queue and throughput metrics for monitoring"""
+        handled = self.processed + self.failed
+        return {
+            'running': self.running,
+            'queue_depth': self.queue_depth(),
+            'queue_capacity': self.queue_size,
+            'batch_size': self.batch_size,
+            'flush_interval_ms': self.flush_interval * 1000,
+            'enqueued': self.enqueued,
+            'rejected': self.rejected,
+            'processed': self.processed,
+            'failed': self.failed,
+            'batch_errors': self.batch_errors,
+            'batches': self.batches,
+            'last_batch_size': self.last_batch_size,
+            'avg_batch_size': self.processed / self.batches if self.batches else 0.0,
+            'last_flush_ms': self.last_flush_ms,
+            'last_lag_ms': self.last_lag_ms,
+            'max_lag_ms': self.max_lag_ms,
+            'avg_lag_ms': self._total_lag_ms / handled if handled else 0.0,
+        }
+
+ingest_pipeline = IngestPipeline()
+
+registry.gauge_callback("securewatch_ingest_pipeline_queue_depth", "Logs waiting in the async ingest queue", ingest_pipeline.queue_depth)
+registry.counter_callback(
+    "securewatch_ingest_pipeline_rejected_total", "Logs refused because the async ingest queue was full",
+    lambda: ingest_pipeline.rejected
+)
+registry.counter_callback(
+    "securewatch_ingest_pipeline_batch_errors_total", "Async ingest batches whose processing raised outside the ingest step",
+    lambda: ingest_pipeline.batch_errors
+)
@@ -0,0 +1,168 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import LogEntry, SeverityLevel
+from services.behavior_store import BEHAVIOR_FEATURE_NAMES
+from services.elasticsearch_service import bulk_index_logs
+from services.heavy_hitters import heavy_hitters
+from services.metrics import ANOMALIES, INGEST_ERRORS, LOGS_INGESTED, stage_timers
+from services.ml_service import MODEL_FEATURE_NAMES, detector, extract_row
+from services.rollup_service import apply_rollups
+from tasks.alert_tasks import queue_alert_analysis
+
+STAGES = stage_timers('batch')
+
+def severity_for_prediction(prediction: Dict) -> SeverityLevel:
+    """Map an anomaly prediction to a log severity level"""
+    if not prediction['is_anomaly']:
+        return SeverityLevel.LOW
+
+    confidence = prediction['confidence']
+    if confidence > 0.8:
+        return SeverityLevel.CRITICAL
+    elif confidence > 0.6:
+        return SeverityLevel.HIGH
+    elif confidence > 0.4:
+        return SeverityLevel.MEDIUM
+    return SeverityLevel.LOW
+
+def score_logs(logs: List[Dict], timestamp: datetime) -> List[Dict]:
+    """Extract features and run anomaly detection for a batch of logs"""
+    with STAGES['extract_features'].time():
+        rows = [
+            extract_row({
+                'timestamp': timestamp,
+                'source_ip': log['source_ip'],
+                'destination_ip': log['destination_ip'],
+                'raw_log': log['raw_log']
+            })
+            for log in logs
+        ]
+        matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(MODEL_FEATURE_NAMES))
+    with STAGES['predict'].time():
+        predictions = detector.predict_batch(matrix)
+    return [
+        {'features': dict(zip(MODEL_FEATURE_NAMES, row)), 'prediction': p}
+        for row, p in zip(rows, predictions)
+    ]
+
+def store_logs(db: Session, logs: List[Dict], scored: List[Dict], timestamp: datetime) -> List[Dict]:
+    """Bulk insert scored logs in a single transaction, returns one record per log"""
+    records = []
+    for log, result in zip(logs, scored):
+        prediction = result['prediction']
+        records.append({
+            'source_ip': log['source_ip'],
+            'destination_ip': log['destination_ip'],
+            'timestamp': timestamp,
+            'log_type': log['log_type'],
+            'raw_log': log['raw_log'],
+            'message': log.get('message') or log['raw_log'],
+            'severity': severity_for_prediction(prediction),
+            'is_anomaly': bool(prediction['is_anomaly']),
+            'anomaly_score': str(prediction['anomaly_score']),
+            'parsed_data': result
+        })
+
+    with STAGES['db_commit'].time():
+        ids = db.scalars(
+            insert(LogEntry).returning(LogEntry.id, sort_by_parameter_order=True),
+            records
+        ).all()
+        apply_rollups(db, records)
+        db.commit()
+
+    for record, log_id in zip(records, ids):
+        record['id'] = log_id
+    return records
+
+def index_records(records: List[Dict]) -> int:
+    """Index stored log records in Elasticsearch"""
+    with STAGES['index'].time():
+        return bulk_index_logs([
+            {
+                'timestamp': record['timestamp'].isoformat(),
+                'source_ip': record['source_ip'],
+                'destination_ip': record['destination_ip'],
+                'log_type': record['log_type'],
+                'raw_log': record['raw_log'],
+                'message': record['message'],
+                'severity': record['severity'].value
+            }
+            for record in records
+        ])
+
+def dispatch_alerts(records: List[Dict]) -> int:
+    """Queue alert analysis for every anomalous record"""
+    payloads = []
+    for record in records:
+        if not record['is_anomaly']:
+            continue
+        prediction = record['parsed_data']['prediction']
+        payloads.append({
+            'log_id': record['id'],
+            'source_ip': record['source_ip'],
+            'destination_ip': record['destination_ip'],
+            'raw_log': record['raw_log'],
+            'log_type': record['log_type'],
+            'anomaly_score': prediction['anomaly_score'],
+            'confidence': prediction['confidence'],
+            'behavior': {name: record['parsed_data']['features'][name] for name in BEHAVIOR_FEATURE_NAMES}
+        })
+    with STAGES['alert_publish'].time():
+        return queue_alert_analysis(payloads)
+
+def log_event(record: Dict) -> Dict:
+    """Build the WebSocket event for a stored log record"""
+    return {
+        'type': 'new_log',
+        'data': {
+            'id': record['id'],
+            'source_ip': record['source_ip'],
+            'destination_ip': record['destination_ip'],
+            'log_type': record['log_type'],
+            'message': record['message'],
+            'severity': record['severity'].value,
+            'is_anomaly': record['is_anomaly'],
+            'timestamp': record['timestamp'].isoformat()
+        }
+    }
+
+def ingest_batch(db: Session, logs: List[Dict]) -> List[Dict]:
+    """Score, store, index and dispatch alerts for a batch of logs"""
+    timestamp = datetime.utcnow()
+    try:
+        scored = score_logs(logs, timestamp)
+        records = store_logs(db, logs, scored, timestamp)
+    except Exception:
+        INGEST_ERRORS.labels('batch').inc()
+        raise
+    LOGS_INGESTED.labels('batch').inc(len(records))
+    ANOMALIES.inc(sum(1 for record in records if record['is_anomaly']))
+    heavy_hitters.observe(records)
+
+    try:
+        index_records(records)
+    except Exception as e:
+        print(f"Elasticsearch indexing error: {e}")
+
+    try:
+        dispatch_alerts(records)
+    except Exception as e:
+        print(f"Alert dispatch error: {e}")
+    return records
+
+def ingest_in_session(logs: List[Dict]) -> List[Dict]:
+    """Run a batch through ingest_batch with its own database session, for use from a thread"""
+    db = SessionLocal()
+    try:
+        return ingest_batch(db, logs)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
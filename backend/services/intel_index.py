@@ -0,0 +1,430 @@
+"""
+Offline IP reputation and GeoIP index
+
+Blocklists (one CIDR or IP per line, optional score, '#' comments) and an
+IP range CSV (start_ip,end_ip,country,asn,as_org or network,country,asn,as_org)
+are compiled into one file of sorted, non-overlapping ranges. Workers
+memory-map the file, so every process shares the same pages, and look an
+IP up with a binary search. Rebuilds are written next to the live file and
+renamed over it, and readers pick up the new file on their next check.
+
+    python -m services.intel_index build --blocklist lists/*.txt --geo geo.csv
+    python -m services.intel_index lookup 203.0.113.7
+"""
+import argparse
+import csv
+import ipaddress
+import json
+import mmap
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Compiled index file shared by all workers
+INTEL_INDEX_PATH = os.getenv(
+    "INTEL_INDEX_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'intel_index.bin')
+)
+# Seconds between checks for a rebuilt index file
+INTEL_INDEX_CHECK_INTERVAL = float(os.getenv("INTEL_INDEX_CHECK_INTERVAL", "5"))
+
+MAGIC = b"SWINTEL1"
+DEFAULT_SCORE = 100
+V4_MAPPED = 0xFFFF << 32
+U64 = (1 << 64) - 1
+
+# Sections: name -> dtype, stored 8-byte aligned after the JSON header
+SECTIONS = {
+    "v4_start": np.uint32, "v4_end": np.uint32, "v4_value": np.uint32,
+    "v6_start_hi": np.uint64, "v6_start_lo": np.uint64,
+    "v6_end_hi": np.uint64, "v6_end_lo": np.uint64, "v6_value": np.uint32,
+}
+
+Range = Tuple[int, int, int]  # (start, end, value index) on the 128-bit line
+
+def _address_range(spec: str) -> Tuple[int, int]:
+    """(first, last) as 128-bit ints (IPv4 mapped into ::ffff:0:0/96)"""
+    network = ipaddress.ip_network(spec.strip(), strict=False)
+    offset = V4_MAPPED if network.version == 4 else 0
+    return offset + int(network.network_address), offset + int(network.broadcast_address)
+
+def _address(ip: str) -> int:
+    address = ipaddress.ip_address(ip.strip())
+    return (V4_MAPPED if address.version == 4 else 0) + int(address)
+
+def read_blocklist(path: str) -> List[Tuple[int, int, int]]:
+    """(start, end, score) per listed network"""
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            parts = line.replace(',', ' ').split()
+            try:
+                start, end = _address_range(parts[0])
+                score = int(parts[1]) if len(parts) > 1 else DEFAULT_SCORE
+            except ValueError:
+                print(f"Skipping invalid blocklist line in {path}: {line}")
+                continue
+            entries.append((start, end, score))
+    return entries
+
+def _parse_asn(value: str) -> Optional[int]:
+    """ASN from '13335' or 'AS13335'"""
+    value = value.strip().upper()
+    if value.startswith('AS'):
+        value = value[2:]
+    return int(value) if value.isdigit() else None
+
+def read_geo(path: str) -> List[Tuple[int, int, Dict]]:
+    """(start, end, {country, asn, as_org}) per CSV row"""
+    rows = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            try:
+                if '/' in row[0]:
+                    start, end = _address_range(row[0])
+                    rest = row[1:]
+                else:
+                    start, end = _address(row[0]), _address(row[1])
+                    rest = row[2:]
+            except ValueError:
+                # Header row or garbage
+                continue
+            rest += [''] * (3 - len(rest))
+            rows.append((start, end, {
+                'country': rest[0] or 'Unknown',
+                'asn': _parse_asn(rest[1]),
+                'as_org': rest[2] or None
+            }))
+    return rows
+
+def flatten_blocklists(lists: Dict[str, List[Tuple[int, int, int]]]):
+    """
+    Overlapping networks from any number of lists become disjoint ranges,
+    each labelled with every list covering it and the highest score
+    """
+    events = []
+    for name, entries in lists.items():
+        for start, end, score in entries:
+            events.append((start, 1, name, score))
+            events.append((end + 1, -1, name, score))
+    events.sort(key=lambda event: event[0])
+
+    values: List[Dict] = []
+    value_ids: Dict[tuple, int] = {}
+    ranges: List[Range] = []
+    active: Dict[tuple, int] = {}
+    i = 0
+    while i < len(events):
+        point = events[i][0]
+        while i < len(events) and events[i][0] == point:
+            _, delta, name, score = events[i]
+            active[(name, score)] = active.get((name, score), 0) + delta
+            if not active[(name, score)]:
+                del active[(name, score)]
+            i += 1
+        if not active or i == len(events):
+            continue
+        label = (tuple(sorted({name for name, _ in active})), max(score for _, score in active))
+        if label not in value_ids:
+            value_ids[label] = len(values)
+            values.append({'lists': list(label[0]), 'score': label[1]})
+        end = events[i][0] - 1
+        value = value_ids[label]
+        if ranges and ranges[-1][2] == value and ranges[-1][1] + 1 == point:
+            ranges[-1] = (ranges[-1][0], end, value)
+        else:
+            ranges.append((point, end, value))
+    return ranges, values
+
+def flatten_geo(rows: List[Tuple[int, int, Dict]]):
+    """Sorted geo ranges, dropping rows that overlap an earlier one"""
+    values: List[Dict] = []
+    value_ids: Dict[tuple, int] = {}
+    ranges: List[Range] = []
+    skipped = 0
+    for start, end, info in sorted(rows, key=lambda row: row[0]):
+        if ranges and start <= ranges[-1][1]:
+            skipped += 1
+            continue
+        key = (info['country'], info['asn'], info['as_org'])
+        if key not in value_ids:
+            value_ids[key] = len(values)
+            values.append(info)
+        ranges.append((start, end, value_ids[key]))
+    if skipped:
+        print(f"Skipped {skipped} overlapping geo ranges")
+    return ranges, values
+
+def _split_families(ranges: List[Range]) -> Dict[str, np.ndarray]:
+    """
+    Section arrays for one dataset. A range that overlaps ::ffff:0:0/96
+    (e.g. ::/0) is split: the overlap goes to the IPv4 table, which is where
+    IPv4 and mapped addresses are looked up, and the rest to the IPv6 table
+    """
+    v4_first, v4_last = V4_MAPPED, V4_MAPPED + 0xFFFFFFFF
+    v4, v6 = [], []
+    for start, end, value in ranges:
+        if start < v4_first:
+            v6.append((start, min(end, v4_first - 1), value))
+        if start <= v4_last and end >= v4_first:
+            v4.append((max(start, v4_first), min(end, v4_last), value))
+        if end > v4_last:
+            v6.append((max(start, v4_last + 1), end, value))
+    return {
+        "v4_start": np.array([r[0] - V4_MAPPED for r in v4], dtype=np.uint32),
+        "v4_end": np.array([r[1] - V4_MAPPED for r in v4], dtype=np.uint32),
+        "v4_value": np.array([r[2] for r in v4], dtype=np.uint32),
+        "v6_start_hi": np.array([r[0] >> 64 for r in v6], dtype=np.uint64),
+        "v6_start_lo": np.array([r[0] & U64 for r in v6], dtype=np.uint64),
+        "v6_end_hi": np.array([r[1] >> 64 for r in v6], dtype=np.uint64),
+        "v6_end_lo": np.array([r[1] & U64 for r in v6], dtype=np.uint64),
+        "v6_value": np.array([r[2] for r in v6], dtype=np.uint32),
+    }
+
+def build_index(blocklists: List[str], geo: Optional[str], output: str = INTEL_INDEX_PATH) -> Dict:
+    """Compile sources into an index file, replacing any existing one atomically"""
+    reputation_ranges, reputation_values = flatten_blocklists({
+        os.path.splitext(os.path.basename(path))[0]: read_blocklist(path)
+        for path in blocklists
+    })
+    geo_ranges, geo_values = flatten_geo(read_geo(geo)) if geo else ([], [])
+
+    arrays = {}
+    for dataset, ranges in (("reputation", reputation_ranges), ("geo", geo_ranges)):
+        for name, array in _split_families(ranges).items():
+            arrays[f"{dataset}.{name}"] = array
+
+    header = {
+        'built_at': datetime.utcnow().isoformat(),
+        'sources': {'blocklists': [os.path.basename(path) for path in blocklists], 'geo': os.path.basename(geo) if geo else None},
+        'values': {'reputation': reputation_values, 'geo': geo_values},
+        'sections': {},
+    }
+    # Offsets depend on the header length, so lay sections out relative to the data start
+    offset = 0
+    for name, array in arrays.items():
+        header['sections'][name] = [offset, len(array)]
+        offset += (array.nbytes + 7) // 8 * 8
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    header_bytes += b' ' * (-(len(MAGIC) + 8 + len(header_bytes)) % 8)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    tmp_path = f"{output}.tmp-{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for array in arrays.values():
+            data = array.astype(array.dtype.newbyteorder('<'), copy=False).tobytes()
+            f.write(data + b'\0' * (-len(data) % 8))
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers holding the old file keep their mapping, new opens see the new file
+    os.replace(tmp_path, output)
+
+    return {
+        'path': output,
+        'reputation_ranges': len(reputation_ranges),
+        'geo_ranges': len(geo_ranges),
+        'bytes': os.path.getsize(output),
+    }
+
+class _Dataset:
+    """One set of disjoint ranges (reputation or geo) over the mapped file"""
+
+    def __init__(self, sections: Dict[str, Sequence[int]], values: List[Dict]):
+        self.values = values
+        self.v4_start = sections["v4_start"]
+        self.v4_end = sections["v4_end"]
+        self.v4_value = sections["v4_value"]
+        self.v6_start_hi = sections["v6_start_hi"]
+        self.v6_start_lo = sections["v6_start_lo"]
+        self.v6_end_hi = sections["v6_end_hi"]
+        self.v6_end_lo = sections["v6_end_lo"]
+        self.v6_value = sections["v6_value"]
+
+    def lookup_v4(self, address: int) -> Optional[Dict]:
+        # Last range starting at or before the address
+        i = bisect_right(self.v4_start, address) - 1
+        if i >= 0 and address <= self.v4_end[i]:
+            return self.values[self.v4_value[i]]
+        return None
+
+    def lookup_v6(self, address: int) -> Optional[Dict]:
+        hi, lo = address >> 64, address & U64
+        left = bisect_left(self.v6_start_hi, hi)
+        right = bisect_right(self.v6_start_hi, hi, left)
+        i = bisect_right(self.v6_start_lo, lo, left, right) - 1
+        if i < left:
+            i = left - 1
+        if i < 0:
+            return None
+        if address <= (self.v6_end_hi[i] << 64) | self.v6_end_lo[i]:
+            return self.values[self.v6_value[i]]
+        return None
+
+def _parse(ip: str):
+    """(version, int) for an IP string, None when it is not an IP"""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+    except (OSError, ValueError):
+        pass
+    try:
+        address = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), 'big')
+    except (OSError, ValueError):
+        return None
+    if address >> 32 == 0xFFFF:
+        return 4, address & 0xFFFFFFFF
+    return 6, address
+
+class IntelIndexReader:
+    """Read-only view of one index file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an intel index")
+        header_len, = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        data_start = len(MAGIC) + 8 + header_len
+        self.header = json.loads(self._mmap[len(MAGIC) + 8:data_start])
+
+        datasets = {}
+        for dataset in ("reputation", "geo"):
+            sections = {}
+            for name, dtype in SECTIONS.items():
+                offset, count = self.header['sections'][f"{dataset}.{name}"]
+                start = data_start + offset
+                if sys.byteorder == 'little':
+                    # Zero-copy views over the shared pages; bisect on them runs in C
+                    sections[name] = memoryview(self._mmap)[start:start + count * np.dtype(dtype).itemsize].cast(
+                        'I' if dtype == np.uint32 else 'Q'
+                    )
+                else:
+                    sections[name] = np.frombuffer(self._mmap, dtype=np.dtype(dtype).newbyteorder('<'), count=count, offset=start).tolist()
+            datasets[dataset] = _Dataset(sections, self.header['values'][dataset])
+        self.reputation = datasets["reputation"]
+        self.geo = datasets["geo"]
+
+    def lookup(self, ip: str) -> Optional[Dict]:
+        """Reputation and geo data for an IP, None when the IP is not valid"""
+        parsed = _parse(ip)
+        if parsed is None:
+            return None
+        version, address = parsed
+        if version == 4:
+            reputation = self.reputation.lookup_v4(address)
+            geo = self.geo.lookup_v4(address)
+        else:
+            reputation = self.reputation.lookup_v6(address)
+            geo = self.geo.lookup_v6(address)
+        return {'reputation': reputation, 'geo': geo}
+
+class IntelIndex:
+    """
+    Process-wide handle on the index file. Lookups use the current reader;
+    every INTEL_INDEX_CHECK_INTERVAL seconds the file is stat'ed and, if it
+    was replaced, a new reader is opened and swapped in with a single
+    reference assignment, so lookups never see a half-loaded index
+    """
+
+    def __init__(self, path: str = INTEL_INDEX_PATH, check_interval: float = INTEL_INDEX_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._reader: Optional[IntelIndexReader] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    @property
+    def available(self) -> bool:
+        return self._current() is not None
+
+    def _current(self) -> Optional[IntelIndexReader]:
+        now = time.monotonic()
+        if now >= self._next_check and self._lock.acquire(blocking=False):
+            try:
+                self._next_check = now + self.check_interval
+                self._reload_if_changed()
+            finally:
+                self._lock.release()
+        return self._reader
+
+    def _reload_if_changed(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        reader = self._reader
+        if reader is not None and reader.identity == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            return
+        try:
+            self._reader = IntelIndexReader(self.path)
+            self.reloads += 1
+        except Exception as e:
+            print(f"Failed to load intel index {self.path}: {e}")
+
+    def lookup(self, ip: str) -> Optional[Dict]:
+        reader = self._current()
+        if reader is None:
+            return None
+        return reader.lookup(ip)
+
+    def info(self) -> Dict:
+        reader = self._current()
+        if reader is None:
+            return {'available': False, 'path': self.path}
+        return {
+            'available': True,
+            'path': self.path,
+            'built_at': reader.header['built_at'],
+            'sources': reader.header['sources'],
+            'reloads': self.reloads,
+        }
+
+intel_index = IntelIndex()
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the offline IP intel index")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    build = subcommands.add_parser("build", help="Compile blocklists and a geo CSV into the index")
+    build.add_argument("--blocklist", nargs="*", default=[], help="Blocklist files, the file name is the list name")
+    build.add_argument("--geo", help="IP range to country/ASN CSV")
+    build.add_argument("--output", default=INTEL_INDEX_PATH)
+
+    lookup = subcommands.add_parser("lookup", help="Look IPs up in the index")
+    lookup.add_argument("ips", nargs="+")
+    lookup.add_argument("--index", default=INTEL_INDEX_PATH)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        print(json.dumps(build_index(args.blocklist, args.geo, args.output), indent=2))
+    else:
+        reader = IntelIndexReader(args.index)
+        for ip in args.ips:
+            print(ip, json.dumps(reader.lookup(ip)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+In-process metrics in the Prometheus text format
+
+Counters, gauges and histograms are plain Python objects updated under a
+per-series lock. Gauges backed by a callback (connection count, queue
+depths) are only evaluated when GET /metrics renders the text exposition
+format. With METRICS_ENABLED=false every metric is one shared no-op object,
+so instrumented code pays a method call and nothing else.
+
+Celery tasks run in other processes, so workers push a snapshot of their
+metrics to a Redis hash every METRICS_PUSH_INTERVAL seconds and the API
+renders those series too, with a worker label.
+"""
+import json
+import math
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Seconds between pushes of a Celery worker's metrics to Redis; snapshots older than 3 intervals are ignored
+METRICS_PUSH_INTERVAL = float(os.getenv("METRICS_PUSH_INTERVAL", "15"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from a compiled-forest prediction (~0.1 ms) to a stalled commit
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Noop:
+    """Stands in for every metric, series and timer when metrics are disabled"""
+
+    def labels(self, *values):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NOOP = _Noop()
+
+class _Timer:
+    """Observes the seconds spent in a with block"""
+    __slots__ = ('series', 'started')
+
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe(time.perf_counter() - self.started)
+        return False
+
+class _Value:
+    """One counter or gauge series"""
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+class _Buckets:
+    """One histogram series: per-bucket counts (the last one is +Inf), sum and count"""
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return [list(self.counts), self.sum]
+
+class Metric:
+    """A metric family; labels(*values) returns the series for those label values"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_series(self):
+        return _Value()
+
+    def labels(self, *values):
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                series = self._series.setdefault(values, self._new_series())
+        return series
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], object]]:
+        """(label values, value) per series, histograms give [counts, sum]"""
+        return [(values, series.snapshot()) for values, series in list(self._series.items())]
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float):
+        self._default.set(value)
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_series(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+class CallbackMetric(Metric):
+    """
+    Gauge or counter read at scrape time, for values something else already
+    keeps: fn returns a number, or {label values: number} when labelled
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable, labelnames: Sequence[str] = (), kind: str = 'gauge'):
+        self.fn = fn
+        self.kind = kind
+        super().__init__(name, help, labelnames)
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Metrics: {self.name} callback failed: {e}")
+            return []
+        if value is None:
+            return []
+        if self.labelnames:
+            return list(value.items())
+        return [((), value)]
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+def _label_text(pairs: Sequence[Tuple[str, object]]) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.metrics: Dict[str, Metric] = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._redis = None
+        self._next_push = 0.0
+
+    def _add(self, metric: Metric):
+        if not self.enabled:
+            return NOOP
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge_callback(self, name: str, help: str, fn: Callable, labelnames: Sequence[str] = ()):
+        return self._add(CallbackMetric(name, help, fn, labelnames))
+
+    def counter_callback(self, name: str, help: str, fn: Callable, labelnames: Sequence[str] = ()):
+        return self._add(CallbackMetric(name, help, fn, labelnames, kind='counter'))
+
+    def snapshot(self) -> Dict:
+        """Counter and histogram series of this process, JSON-serializable (no gauges, they are per process)"""
+        return {
+            name: {
+                'kind': metric.kind,
+                'help': metric.help,
+                'labelnames': metric.labelnames,
+                'buckets': getattr(metric, 'buckets', None),
+                'samples': metric.samples(),
+            }
+            for name, metric in self.metrics.items() if isinstance(metric, (Counter, Histogram))
+        }
+
+    def render(self, workers: Optional[Dict[str, Dict]] = None) -> str:
+        """Text exposition of this process's metrics plus pushed worker snapshots"""
+        families: Dict[str, Dict] = {}
+        for name, metric in self.metrics.items():
+            families[name] = {
+                'kind': metric.kind, 'help': metric.help, 'labelnames': metric.labelnames,
+                'buckets': getattr(metric, 'buckets', None), 'series': [((), metric.samples())]
+            }
+        for worker, snapshot in (workers or {}).items():
+            for name, family in snapshot.items():
+                entry = families.setdefault(name, {**family, 'series': []})
+                entry['series'].append(((('worker', worker),), family['samples']))
+
+        lines = []
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {_escape(family['help'])}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            for extra, samples in family['series']:
+                for values, value in samples:
+                    pairs = list(zip(family['labelnames'], values)) + list(extra)
+                    if family['kind'] != 'histogram':
+                        lines.append(f"{name}{_label_text(pairs)} {_number(value)}")
+                        continue
+                    counts, total = value
+                    cumulative = 0
+                    for bound, count in zip(list(family['buckets']) + [math.inf], counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_label_text(pairs + [('le', _number(float(bound)))])} {cumulative}")
+                    lines.append(f"{name}_sum{_label_text(pairs)} {_number(total)}")
+                    lines.append(f"{name}_count{_label_text(pairs)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+    def _client(self):
+        if self._redis is None:
+            import redis
+            # A scrape should not hang on an unreachable Redis
+            self._redis = redis.Redis.from_url(REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+        return self._redis
+
+    def maybe_push(self, key: str = "securewatch:metrics"):
+        """Push this process's snapshot to Redis if METRICS_PUSH_INTERVAL has passed (Celery workers)"""
+        now = time.monotonic()
+        if not self.enabled or now < self._next_push:
+            return
+        self._next_push = now + METRICS_PUSH_INTERVAL
+        try:
+            payload = json.dumps({'at': time.time(), 'metrics': self.snapshot()})
+            self._client().hset(key, self.worker_id, payload)
+        except Exception as e:
+            print(f"Metrics push error: {e}")
+
+    def read_workers(self, key: str = "securewatch:metrics") -> Dict[str, Dict]:
+        """Fresh worker snapshots from Redis; stale ones (dead workers) are deleted"""
+        if not self.enabled:
+            return {}
+        workers = {}
+        try:
+            client = self._client()
+            cutoff = time.time() - 3 * METRICS_PUSH_INTERVAL
+            for worker, payload in client.hgetall(key).items():
+                worker = worker.decode()
+                data = json.loads(payload)
+                if data['at'] < cutoff:
+                    client.hdel(key, worker)
+                elif worker != self.worker_id:
+                    workers[worker] = data['metrics']
+        except Exception as e:
+            print(f"Metrics read error: {e}")
+        return workers
+
+registry = MetricsRegistry()
+
+# SecureWatch metrics. Ingest mode is single (/ingest) or batch (/ingest/batch
+# and the async pipeline); batch stages time the whole batch
+INGEST_STAGES = ('extract_features', 'predict', 'db_commit', 'index', 'alert_publish', 'broadcast', 'total')
+INGEST_STAGE_SECONDS = registry.histogram(
+    "securewatch_ingest_stage_seconds", "Time spent in each ingest stage", ("mode", "stage")
+)
+
+def stage_timers(mode: str) -> Dict:
+    """The stage histogram series of an ingest mode, by stage name"""
+    return {stage: INGEST_STAGE_SECONDS.labels(mode, stage) for stage in INGEST_STAGES}
+
+LOGS_INGESTED = registry.counter("securewatch_logs_ingested_total", "Logs stored", ("mode",))
+INGEST_ERRORS = registry.counter("securewatch_ingest_errors_total", "Ingest requests or batches that failed", ("mode",))
+ANOMALIES = registry.counter("securewatch_anomalies_total", "Stored logs flagged as anomalous")
+ML_FALLBACKS = registry.counter(
+    "securewatch_ml_fallbacks_total", "Rows scored by the rule-based fallback instead of the model", ("reason",)
+)
+ES_FAILURES = registry.counter(
+    "securewatch_es_failures_total", "Elasticsearch calls that failed or were skipped while it is unreachable", ("operation",)
+)
+PIPELINE_LAG_SECONDS = registry.histogram(
+    "securewatch_ingest_pipeline_lag_seconds", "Queueing delay of the oldest log in each async pipeline batch"
+)
+TASK_SECONDS = registry.histogram("securewatch_task_seconds", "Celery task run time", ("task", "state"))
@@ -1,143 +1,345 @@
 import numpy as np
-from typing import Dict
-from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+import importlib.util
 import os
+import threading
+import time
 
-# Try to load the ML model, but handle gracefully if not available
-try:
-    import joblib
-    
-    MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'ml-engine', 'anomaly_detector.pkl')
-    SCALER_PATH = os.path.join(os.path.dirname(__file__), '..', 'ml-engine', 'scaler.pkl')
-    
-    if os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH):
-        model = joblib.load(MODEL_PATH)
-        scaler = joblib.load(SCALER_PATH)
-        MODEL_AVAILABLE = True
-    else:
-        MODEL_AVAILABLE = False
-        print("Warning: ML model files not found. Using rule-based detection.")
-except ImportError:
-    MODEL_AVAILABLE = False
+from services.behavior_store import BEHAVIOR_FEATURE_NAMES, behavior_features
+from services.feature_extractor import FEATURE_NAMES, feature_extractor, ip_to_int
+from services.forest_compiler import CompiledForest
+from services.metrics import ML_FALLBACKS
+from services.model_registry import MODEL_REGISTRY_DIR, MANIFEST, read_manifest, version_paths
+from services.warmup import LazyResource, warmup
+
+# joblib (and sklearn, which unpickling pulls in) is only imported when a model is loaded
+JOBLIB_AVAILABLE = importlib.util.find_spec("joblib") is not None
+if not JOBLIB_AVAILABLE:
     print("Warning: joblib not available. Using rule-based detection.")
 
-def ip_to_int(ip: str) -> int:
-    """Convert IP address to integer"""
-    try:
-        parts = ip.split('.')
-        if len(parts) != 4:
-            return 0
-        return sum(int(part) * (256 ** (3 - i)) for i, part in enumerate(parts))
-    except:
-        return 0
+# Unversioned model files, used when the registry has no active version
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'ml-engine', 'anomaly_detector.pkl')
+SCALER_PATH = os.path.join(os.path.dirname(__file__), '..', 'ml-engine', 'scaler.pkl')
+
+# Seconds between checks of the registry manifest for a newly activated version
+MODEL_REGISTRY_CHECK_INTERVAL = float(os.getenv("MODEL_REGISTRY_CHECK_INTERVAL", "10"))
+# Rows scored by a freshly loaded model before it replaces the current one
+MODEL_WARMUP_ROWS = int(os.getenv("MODEL_WARMUP_ROWS", "256"))
+# Score with the array-compiled forest instead of sklearn (checked against sklearn at warm-up)
+MODEL_COMPILED_SCORER = os.getenv("MODEL_COMPILED_SCORER", "true").lower() == "true"
+
+# Per-log features followed by the per-source behavioral ones; models trained on
+# fewer columns (the original 8) are fed the leading columns only
+MODEL_FEATURE_NAMES = FEATURE_NAMES + BEHAVIOR_FEATURE_NAMES
+
+# Behavioral thresholds used by the rule-based fallback and alert classification
+BEHAVIOR_FAILED_LOGIN_THRESHOLD = int(os.getenv("BEHAVIOR_FAILED_LOGIN_THRESHOLD", "10"))
+BEHAVIOR_DISTINCT_DESTINATION_THRESHOLD = int(os.getenv("BEHAVIOR_DISTINCT_DESTINATION_THRESHOLD", "50"))
+
+def features_to_matrix(features_list: List[Dict]) -> np.ndarray:
+    """Stack feature dicts into an (N, len(MODEL_FEATURE_NAMES)) matrix, missing behavioral features are 0"""
+    return np.array(
+        [[features.get(name, 0) for name in MODEL_FEATURE_NAMES] for features in features_list],
+        dtype=np.float64
+    ).reshape(len(features_list), len(MODEL_FEATURE_NAMES))
+
+def extract_row(log_entry: Dict) -> tuple:
+    """
+    Per-log and behavioral features in MODEL_FEATURE_NAMES order. Counts the
+    entry as one event of its source, so call it once per log
+    """
+    row = feature_extractor.extract_row(log_entry)
+    return row + behavior_features(
+        log_entry.get('source_ip'),
+        log_entry.get('destination_ip'),
+        log_entry.get('raw_log', ''),
+        bool(row[FEATURE_NAMES.index('failed_login')])
+    )
 
 def extract_features(log_entry: Dict) -> Dict:
     """Extract features from log entry for ML analysis"""
-    timestamp = log_entry.get('timestamp')
-    if isinstance(timestamp, str):
-        try:
-            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-        except:
-            timestamp = datetime.utcnow()
-    elif not isinstance(timestamp, datetime):
-        timestamp = datetime.utcnow()
-    
-    raw_log = log_entry.get('raw_log', '').lower()
-    
-    features = {
-        'hour': timestamp.hour,
-        'day_of_week': timestamp.weekday(),
-        'source_ip_int': ip_to_int(log_entry.get('source_ip', '0.0.0.0')),
-        'dest_ip_int': ip_to_int(log_entry.get('destination_ip', '0.0.0.0')),
-        'log_length': len(log_entry.get('raw_log', '')),
-        'has_sql_keywords': int(any(kw in raw_log for kw in ['select', 'union', 'drop', 'delete', 'insert', 'update', "' or '1'='1", '--'])),
-        'has_script_tags': int('<script>' in raw_log or 'javascript:' in raw_log),
-        'failed_login': int('failed login' in raw_log or 'authentication failed' in raw_log or 'unauthorized' in raw_log),
-    }
-    return features
+    return dict(zip(MODEL_FEATURE_NAMES, extract_row(log_entry)))
+
+class ModelBundle:
+    """A loaded model and scaler, their compiled forest and the version they were published as"""
+
+    def __init__(self, version: str, model, scaler, forest: Optional[CompiledForest] = None):
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        self.n_features = getattr(scaler, 'n_features_in_', len(FEATURE_NAMES))
+        self.forest = forest
+        if forest is None and MODEL_COMPILED_SCORER:
+            try:
+                self.forest = CompiledForest.from_model(model, scaler)
+            except Exception as e:
+                print(f"Model {version} not compiled ({e}), scoring with sklearn")
+
+    @classmethod
+    def load(cls, version: str, model_path: str, scaler_path: str, forest_path: Optional[str] = None) -> 'ModelBundle':
+        import joblib
+        forest = None
+        if MODEL_COMPILED_SCORER and forest_path and os.path.exists(forest_path):
+            forest = CompiledForest.load(forest_path)
+        return cls(version, joblib.load(model_path), joblib.load(scaler_path), forest)
+
+    def score(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(is_anomaly, score) per row"""
+        if self.forest is not None:
+            return self.forest.predict(matrix)
+        return self._score_sklearn(matrix)
+
+    def _score_sklearn(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        scaled_features = self.scaler.transform(matrix[:, :self.n_features])
+        # One forest pass; IsolationForest.predict flags rows whose
+        # score falls below the fitted offset
+        scores = self.model.score_samples(scaled_features)
+        return scores < self.model.offset_, scores
+
+    def warm_up(self, rows: int = MODEL_WARMUP_ROWS):
+        """
+        Score synthetic rows drawn around the scaler's training mean, raises
+        if the bundle is unusable and drops the compiled forest if it
+        disagrees with sklearn
+        """
+        if self.n_features > len(MODEL_FEATURE_NAMES):
+            raise ValueError(f"model {self.version} expects {self.n_features} features, only {len(MODEL_FEATURE_NAMES)} are extracted")
+        matrix = np.zeros((rows, len(MODEL_FEATURE_NAMES)))
+        mean = getattr(self.scaler, 'mean_', None)
+        scale = getattr(self.scaler, 'scale_', None)
+        if mean is not None and scale is not None:
+            matrix[:, :self.n_features] = np.random.default_rng(0).normal(mean, scale, (rows, self.n_features))
+        _, scores = self._score_sklearn(matrix)
+        if not np.all(np.isfinite(scores)):
+            raise ValueError(f"model {self.version} produced non-finite scores during warm-up")
+        if self.forest is not None:
+            try:
+                difference = np.abs(self.forest.score_samples(matrix) - scores).max()
+            except Exception as e:
+                difference = e
+            if not difference <= 1e-9:
+                print(f"Compiled forest for model {self.version} disagrees with sklearn ({difference}), scoring with sklearn")
+                self.forest = None
 
 class AnomalyDetector:
-    def __init__(self):
-        self.model_available = MODEL_AVAILABLE
-        if MODEL_AVAILABLE:
-            self.model = model
-            self.scaler = scaler
+    """
+    Scores logs with the registry's active model version. Every
+    MODEL_REGISTRY_CHECK_INTERVAL seconds a prediction call stats the
+    manifest; when another version was activated it is loaded and warmed up
+    on a background thread and swapped in with a single reference
+    assignment, so in-flight batches finish on the version they started with.
+    Nothing is loaded at import: the first prediction or the API warm-up
+    loads the initial version
+    """
+
+    def __init__(self, registry: str = MODEL_REGISTRY_DIR, check_interval: float = MODEL_REGISTRY_CHECK_INTERVAL):
+        self.registry = registry
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._bundle: Optional[ModelBundle] = None
+        self._manifest_identity = None
+        self._next_check = time.monotonic() + check_interval
+        self._lock = threading.Lock()
+        self._swap_thread: Optional[threading.Thread] = None
+        self.loader = LazyResource('model', self._load_initial)
+
+    @property
+    def model_available(self) -> bool:
+        return self._bundle is not None
+
+    @property
+    def model_version(self) -> str:
+        bundle = self._bundle
+        return bundle.version if bundle is not None else 'rules'
+
+    def _load_initial(self):
+        """Load the active registry version, or the unversioned files when the registry is empty"""
+        if not JOBLIB_AVAILABLE:
+            return
+        self._manifest_identity = self._stat_manifest()
+        manifest = read_manifest(self.registry)
+        if manifest and manifest.get('active'):
+            try:
+                self._bundle = self._load_version(manifest['active'])
+                return
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Failed to load model {manifest['active']}: {e}, trying {MODEL_PATH}")
+        if os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH):
+            bundle = ModelBundle.load('unversioned', MODEL_PATH, SCALER_PATH)
+            bundle.warm_up()
+            self._bundle = bundle
+        else:
+            print("Warning: ML model files not found. Using rule-based detection.")
+
+    def _load_version(self, version: str) -> ModelBundle:
+        paths = version_paths(version, self.registry)
+        bundle = ModelBundle.load(version, paths['model'], paths['scaler'], paths['forest'])
+        bundle.warm_up()
+        return bundle
+
+    def _stat_manifest(self):
+        try:
+            stat = os.stat(os.path.join(self.registry, MANIFEST))
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _check_registry(self):
+        """Start loading a newly activated version, without blocking the caller"""
+        now = time.monotonic()
+        if not JOBLIB_AVAILABLE or now < self._next_check or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = now + self.check_interval
+            if self._swap_thread is not None and self._swap_thread.is_alive():
+                return
+            identity = self._stat_manifest()
+            if identity is None or identity == self._manifest_identity:
+                return
+            self._manifest_identity = identity
+            manifest = read_manifest(self.registry)
+            version = manifest.get('active') if manifest else None
+            if version and version != self.model_version:
+                self._swap_thread = threading.Thread(target=self._swap, args=(version,), name="model-loader", daemon=True)
+                self._swap_thread.start()
+        except Exception as e:
+            print(f"Model registry check error: {e}")
+        finally:
+            self._lock.release()
+
+    def _swap(self, version: str):
+        try:
+            bundle = self._load_version(version)
+        except Exception as e:
+            # Not retried until the manifest changes again
+            self.last_error = f"{version}: {e}"
+            print(f"Failed to load model {version}: {e}, keeping {self.model_version}")
+            return
+        previous = self.model_version
+        self._bundle = bundle
+        self.reloads += 1
+        self.last_error = None
+        print(f"Anomaly detector switched from model {previous} to {version}")
+
+    def info(self) -> Dict:
+        manifest = read_manifest(self.registry) or {}
+        return {
+            'state': self.loader.state,
+            'model_version': self.model_version,
+            'compiled': self._bundle is not None and self._bundle.forest is not None,
+            'active_version': manifest.get('active'),
+            'registry': os.path.abspath(self.registry),
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+        }
     
-    def predict(self, features: Dict) -> Dict:
+    def predict(self, features: Dict, wait: bool = True) -> Dict:
         """
         Predict if log entry is anomalous
         Returns: {
             'is_anomaly': bool,
             'anomaly_score': float,
-            'confidence': float
+            'confidence': float,
+            'model_version': str
         }
         """
-        if self.model_available:
+        return self.predict_batch([features], wait)[0]
+    
+    def predict_batch(self, features: Union[List[Dict], np.ndarray], wait: bool = True) -> List[Dict]:
+        """
+        Predict anomalies for many log entries at once
+        Accepts a list of feature dicts or an (N, len(FEATURE_NAMES)) or
+        (N, len(MODEL_FEATURE_NAMES)) matrix
+        and returns one prediction dict per row, in order, each tagged with
+        the model version that scored it ('rules' for the fallback).
+        Without wait, rows are scored by the rules while the model is still
+        loading instead of blocking the caller (the event loop, for the API)
+        """
+        matrix = features if isinstance(features, np.ndarray) else features_to_matrix(features)
+        if len(matrix) == 0:
+            return []
+        
+        if not self.loader.ready:
+            self.loader.get(wait)
+        if not self.loader.ready:
+            ML_FALLBACKS.labels('no_model' if self.loader.state == 'failed' else 'loading').inc(len(matrix))
+            return self._rule_based_detection_batch(matrix)
+        self._check_registry()
+        bundle = self._bundle
+        if bundle is not None:
             try:
-                feature_vector = np.array([[
-                    features['hour'],
-                    features['day_of_week'],
-                    features['source_ip_int'],
-                    features['dest_ip_int'],
-                    features['log_length'],
-                    features['has_sql_keywords'],
-                    features['has_script_tags'],
-                    features['failed_login']
-                ]])
-                
-                scaled_features = self.scaler.transform(feature_vector)
-                prediction = self.model.predict(scaled_features)[0]
-                score = self.model.score_samples(scaled_features)[0]
-                
-                return {
-                    'is_anomaly': prediction == -1,
-                    'anomaly_score': float(score),
-                    'confidence': abs(float(score))
-                }
+                is_anomaly, scores = bundle.score(matrix)
+                return _format_predictions(is_anomaly, scores, np.abs(scores), bundle.version)
             except Exception as e:
                 print(f"ML prediction error: {e}, falling back to rule-based")
+                ML_FALLBACKS.labels('error').inc(len(matrix))
+        else:
+            ML_FALLBACKS.labels('no_model').inc(len(matrix))
         
         # Rule-based fallback detection
-        return self._rule_based_detection(features)
+        return self._rule_based_detection_batch(matrix)
     
     def _rule_based_detection(self, features: Dict) -> Dict:
         """Rule-based anomaly detection as fallback"""
-        score = 0.0
-        confidence = 0.0
+        return self._rule_based_detection_batch(features_to_matrix([features]))[0]
+    
+    def _rule_based_detection_batch(self, matrix: np.ndarray) -> List[Dict]:
+        """Vectorized rule-based anomaly detection over a feature matrix"""
+        column = {name: matrix[:, i] for i, name in enumerate(MODEL_FEATURE_NAMES[:matrix.shape[1]])}
+        score = np.zeros(len(matrix))
+        confidence = np.zeros(len(matrix))
         
         # SQL injection indicators
-        if features['has_sql_keywords']:
-            score -= 0.5
-            confidence += 0.6
+        sql = column['has_sql_keywords'] != 0
+        score[sql] -= 0.5
+        confidence[sql] += 0.6
         
         # Script injection
-        if features['has_script_tags']:
-            score -= 0.4
-            confidence += 0.5
+        script = column['has_script_tags'] != 0
+        score[script] -= 0.4
+        confidence[script] += 0.5
         
         # Failed login attempts
-        if features['failed_login']:
-            score -= 0.3
-            confidence += 0.4
+        failed_login = column['failed_login'] != 0
+        score[failed_login] -= 0.3
+        confidence[failed_login] += 0.4
         
         # Unusual log length
-        if features['log_length'] > 500:
-            score -= 0.2
-            confidence += 0.3
+        long_log = column['log_length'] > 500
+        score[long_log] -= 0.2
+        confidence[long_log] += 0.3
+        
+        # Many failed logins from one source in the behavior window (brute force)
+        if 'src_failed_logins' in column:
+            brute_force = column['src_failed_logins'] >= BEHAVIOR_FAILED_LOGIN_THRESHOLD
+            score[brute_force] -= 0.3
+            confidence[brute_force] += 0.4
+        
+        # One source touching many destinations (scan)
+        if 'src_distinct_destinations' in column:
+            scan = column['src_distinct_destinations'] >= BEHAVIOR_DISTINCT_DESTINATION_THRESHOLD
+            score[scan] -= 0.4
+            confidence[scan] += 0.5
         
         # Unusual hour (3-5 AM)
-        if 3 <= features['hour'] <= 5:
-            score -= 0.1
-            confidence += 0.2
+        night = (column['hour'] >= 3) & (column['hour'] <= 5)
+        score[night] -= 0.1
+        confidence[night] += 0.2
         
-        is_anomaly = score < -0.3 or confidence > 0.5
+        is_anomaly = (score < -0.3) | (confidence > 0.5)
         
-        return {
-            'is_anomaly': is_anomaly,
-            'anomaly_score': score,
-            'confidence': min(confidence, 1.0)
-        }
+        return _format_predictions(is_anomaly, score, np.minimum(confidence, 1.0), 'rules')
+
+def _format_predictions(is_anomaly: np.ndarray, scores: np.ndarray, confidence: np.ndarray, model_version: str) -> List[Dict]:
+    """Convert prediction arrays into JSON-serializable dicts"""
+    return [
+        {'is_anomaly': a, 'anomaly_score': s, 'confidence': c, 'model_version': model_version}
+        for a, s, c in zip(is_anomaly.tolist(), scores.tolist(), confidence.tolist())
+    ]
 
-# Create global detector instance
+# Create global detector instance, loaded on first use or by the API warm-up
 detector = AnomalyDetector()
+warmup.add(detector.loader)
 
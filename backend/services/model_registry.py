@@ -0,0 +1,206 @@
+"""
+Versioned registry for the anomaly detector
+
+Each version is a directory holding the model and scaler pickles, the
+compiled forest (see services/forest_compiler.py) and a meta.json;
+manifest.json names the active version and the activation history.
+Publishing copies the bundle into a temporary directory that is renamed
+into place, and the manifest is rewritten and renamed over the old one, so
+readers only ever see complete versions. Running detectors poll the
+manifest and swap to the active version in the background.
+
+    python -m services.model_registry publish ../ml-engine/anomaly_detector.pkl ../ml-engine/scaler.pkl
+    python -m services.model_registry list
+    python -m services.model_registry activate 20261018-120000
+    python -m services.model_registry rollback
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Directory holding manifest.json and one subdirectory per model version
+MODEL_REGISTRY_DIR = os.getenv(
+    "MODEL_REGISTRY_DIR",
+    os.path.join(os.path.dirname(__file__), '..', 'ml-engine', 'registry')
+)
+
+MANIFEST = "manifest.json"
+MODEL_FILE = "anomaly_detector.pkl"
+SCALER_FILE = "scaler.pkl"
+META_FILE = "meta.json"
+FOREST_FILE = "forest.npz"
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _write_json(path: str, data: Dict):
+    """Write JSON next to the target and rename it over, readers never see a partial file"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+def read_manifest(registry: str = MODEL_REGISTRY_DIR) -> Optional[Dict]:
+    """The registry manifest, None when the registry has not been created"""
+    try:
+        with open(os.path.join(registry, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def version_paths(version: str, registry: str = MODEL_REGISTRY_DIR) -> Dict[str, str]:
+    directory = os.path.join(registry, version)
+    return {
+        'model': os.path.join(directory, MODEL_FILE),
+        'scaler': os.path.join(directory, SCALER_FILE),
+        'meta': os.path.join(directory, META_FILE),
+        'forest': os.path.join(directory, FOREST_FILE),
+    }
+
+def list_versions(registry: str = MODEL_REGISTRY_DIR) -> List[Dict]:
+    """Metadata of every published version, oldest first"""
+    versions = []
+    if not os.path.isdir(registry):
+        return versions
+    for name in sorted(os.listdir(registry)):
+        meta_path = version_paths(name, registry)['meta']
+        if name.startswith('.') or not os.path.exists(meta_path):
+            continue
+        with open(meta_path) as f:
+            versions.append(json.load(f))
+    return versions
+
+def publish(
+    model_path: str,
+    scaler_path: str,
+    version: Optional[str] = None,
+    activate_version: bool = True,
+    description: str = "",
+    registry: str = MODEL_REGISTRY_DIR
+) -> Dict:
+    """Copy a model and scaler into the registry as a new version and, by default, activate it"""
+    import joblib
+    from services.forest_compiler import CompiledForest
+
+    version = version or datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    if version.startswith('.') or os.sep in version:
+        raise ValueError(f"Invalid version name: {version}")
+    os.makedirs(registry, exist_ok=True)
+    target = os.path.join(registry, version)
+    if os.path.exists(target):
+        raise ValueError(f"Version {version} already exists")
+
+    # Load once so a broken bundle never makes it into the registry
+    scaler = joblib.load(scaler_path)
+    model = joblib.load(model_path)
+
+    staging = tempfile.mkdtemp(dir=registry, prefix=f".{version}-")
+    try:
+        shutil.copyfile(model_path, os.path.join(staging, MODEL_FILE))
+        shutil.copyfile(scaler_path, os.path.join(staging, SCALER_FILE))
+        try:
+            CompiledForest.from_model(model, scaler).save(os.path.join(staging, FOREST_FILE))
+            compiled = True
+        except ValueError as e:
+            print(f"Warning: model not compiled ({e}), workers will score it with sklearn")
+            compiled = False
+        meta = {
+            'version': version,
+            'created_at': datetime.utcnow().isoformat(),
+            'description': description,
+            'n_features': int(getattr(scaler, 'n_features_in_', 0)) or None,
+            'compiled': compiled,
+            'model_sha256': _sha256(os.path.join(staging, MODEL_FILE)),
+            'scaler_sha256': _sha256(os.path.join(staging, SCALER_FILE)),
+        }
+        _write_json(os.path.join(staging, META_FILE), meta)
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate_version:
+        activate(version, registry)
+    return meta
+
+def activate(version: str, registry: str = MODEL_REGISTRY_DIR) -> Dict:
+    """Make a published version the active one, running detectors pick it up on their next check"""
+    if not os.path.exists(version_paths(version, registry)['meta']):
+        raise ValueError(f"Unknown version: {version}")
+    manifest = read_manifest(registry) or {'active': None, 'history': []}
+    if manifest['active'] != version:
+        manifest['history'].append(version)
+        manifest['history'] = manifest['history'][-50:]
+    manifest['active'] = version
+    manifest['updated_at'] = datetime.utcnow().isoformat()
+    _write_json(os.path.join(registry, MANIFEST), manifest)
+    return manifest
+
+def rollback(registry: str = MODEL_REGISTRY_DIR) -> Dict:
+    """Reactivate the version that was active before the current one"""
+    manifest = read_manifest(registry)
+    if not manifest or len(manifest['history']) < 2:
+        raise ValueError("No previous version to roll back to")
+    manifest['history'].pop()
+    manifest['active'] = manifest['history'][-1]
+    manifest['updated_at'] = datetime.utcnow().isoformat()
+    _write_json(os.path.join(registry, MANIFEST), manifest)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage versioned anomaly detector models")
+    parser.add_argument("--registry", default=MODEL_REGISTRY_DIR)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    publish_cmd = subcommands.add_parser("publish", help="Add a model and scaler as a new version")
+    publish_cmd.add_argument("model")
+    publish_cmd.add_argument("scaler")
+    publish_cmd.add_argument("--version", help="Version name (default: UTC timestamp)")
+    publish_cmd.add_argument("--description", default="")
+    publish_cmd.add_argument("--no-activate", action="store_true", help="Publish without activating")
+
+    subcommands.add_parser("list", help="List versions and the active one")
+
+    activate_cmd = subcommands.add_parser("activate", help="Activate a published version")
+    activate_cmd.add_argument("version")
+
+    subcommands.add_parser("rollback", help="Reactivate the previously active version")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "publish":
+            result = publish(args.model, args.scaler, args.version, not args.no_activate, args.description, args.registry)
+        elif args.command == "activate":
+            result = activate(args.version, args.registry)
+        elif args.command == "rollback":
+            result = rollback(args.registry)
+        else:
+            manifest = read_manifest(args.registry) or {}
+            result = {'active': manifest.get('active'), 'versions': list_versions(args.registry)}
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import MetaData, PrimaryKeyConstraint, delete, inspect, text
+
+from database import engine
+from models import LogEntry
+
+load_dotenv()
+
+# Partition log_entries by time on PostgreSQL (other databases use a plain table)
+LOG_PARTITIONING = os.getenv("LOG_PARTITIONING", "true").lower() == "true"
+# Partition width: day or hour
+LOG_PARTITION_INTERVAL = os.getenv("LOG_PARTITION_INTERVAL", "day")
+# Partitions created ahead of the current one
+LOG_PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", "3"))
+# Logs older than this many days are dropped, 0 keeps everything
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "0"))
+
+INTERVALS = {
+    "day": (timedelta(days=1), "%Y%m%d"),
+    "hour": (timedelta(hours=1), "%Y%m%d%H"),
+}
+
+TABLE = LogEntry.__tablename__
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{8}}|\d{{10}})$")
+
+def partitioned_table():
+    """
+    Copy of the log_entries table partitioned by RANGE (timestamp). PostgreSQL
+    requires the partition key in the primary key, so the table key becomes
+    (id, timestamp) while the ORM keeps addressing rows by id alone
+    """
+    table = LogEntry.__table__.to_metadata(MetaData())
+    table.c.id.autoincrement = True
+    table.c.timestamp.nullable = False
+    table.c.timestamp.primary_key = True
+    table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.timestamp))
+    table.dialect_options["postgresql"]["partition_by"] = "RANGE (timestamp)"
+    return table
+
+class PartitionManager:
+    """
+    Keeps log_entries split into daily or hourly range partitions on
+    PostgreSQL: creates the table partitioned, creates partitions ahead of
+    time and enforces retention by dropping whole partitions. Queries
+    bounded on timestamp only touch the matching partitions. On SQLite, or
+    on a pre-existing unpartitioned table, retention falls back to DELETE
+    """
+
+    def __init__(
+        self,
+        engine,
+        interval: str = LOG_PARTITION_INTERVAL,
+        ahead: int = LOG_PARTITIONS_AHEAD,
+        retention_days: int = LOG_RETENTION_DAYS,
+        enabled: bool = LOG_PARTITIONING
+    ):
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown partition interval: {interval}")
+        self.engine = engine
+        self.interval = interval
+        self.step, self.name_format = INTERVALS[interval]
+        self.ahead = ahead
+        self.retention_days = retention_days
+        self.enabled = enabled and engine.dialect.name == "postgresql"
+
+    def period_start(self, moment: datetime) -> datetime:
+        if self.interval == "hour":
+            return moment.replace(minute=0, second=0, microsecond=0)
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def partition_name(self, start: datetime) -> str:
+        return f"{TABLE}_p{start.strftime(self.name_format)}"
+
+    def parse_partition(self, name: str) -> Optional[Tuple[datetime, datetime]]:
+        """(start, end) of the range a partition covers, None for other tables"""
+        match = PARTITION_NAME.match(name)
+        if not match:
+            return None
+        value = match.group(1)
+        # Names carry their own width, so changing the interval keeps old partitions manageable
+        interval = "hour" if len(value) == 10 else "day"
+        step, name_format = INTERVALS[interval]
+        start = datetime.strptime(value, name_format)
+        return start, start + step
+
+    def is_partitioned(self, conn) -> bool:
+        relkind = conn.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+            {"name": TABLE}
+        ).scalar()
+        return relkind == "p"
+
+    def create_table(self):
+        """Create log_entries as a partitioned table unless it already exists"""
+        if not self.enabled:
+            return
+        with self.engine.begin() as conn:
+            if inspect(conn).has_table(TABLE):
+                if not self.is_partitioned(conn):
+                    print(f"Warning: {TABLE} exists and is not partitioned, retention will use DELETE")
+                return
+            LogEntry.__table__.c.severity.type.create(conn, checkfirst=True)
+            partitioned_table().create(conn)
+            # Catches rows outside every range partition (clock skew, replays)
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+
+    def partitions(self, conn) -> List[str]:
+        return list(conn.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE pg_inherits.inhparent = to_regclass(:name)"
+        ), {"name": TABLE}).scalars())
+
+    def ensure_partitions(self, now: Optional[datetime] = None) -> List[str]:
+        """Create the current partition and the next `ahead` ones, returns those created"""
+        if not self.enabled:
+            return []
+        start = self.period_start(now or datetime.utcnow())
+        created = []
+        with self.engine.begin() as conn:
+            if not self.is_partitioned(conn):
+                return []
+            existing = set(self.partitions(conn))
+            for i in range(self.ahead + 1):
+                lower = start + i * self.step
+                name = self.partition_name(lower)
+                if name in existing:
+                    continue
+                try:
+                    with conn.begin_nested():
+                        conn.execute(text(
+                            f"CREATE TABLE {name} PARTITION OF {TABLE} "
+                            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{(lower + self.step).isoformat()}')"
+                        ))
+                    created.append(name)
+                except Exception as e:
+                    # Usually rows for this range already sit in the default partition
+                    print(f"Partition {name} not created: {e}")
+        return created
+
+    def drop_expired(self, now: Optional[datetime] = None) -> Dict:
+        """Apply LOG_RETENTION_DAYS by dropping partitions, or DELETE without partitioning"""
+        if self.retention_days <= 0:
+            return {"dropped": [], "deleted": 0}
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+
+        with self.engine.begin() as conn:
+            if not (self.enabled and self.is_partitioned(conn)):
+                result = conn.execute(delete(LogEntry.__table__).where(LogEntry.__table__.c.timestamp < cutoff))
+                return {"dropped": [], "deleted": result.rowcount}
+
+            dropped = []
+            deleted = 0
+            partitions = self.partitions(conn)
+            for name in partitions:
+                bounds = self.parse_partition(name)
+                if bounds and bounds[1] <= cutoff:
+                    conn.execute(text(f"DROP TABLE {name}"))
+                    dropped.append(name)
+            if DEFAULT_PARTITION in partitions:
+                # Stragglers in the default partition are few, a DELETE is cheap there
+                deleted = conn.execute(
+                    text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"),
+                    {"cutoff": cutoff}
+                ).rowcount
+            return {"dropped": dropped, "deleted": deleted}
+
+    def maintain(self, now: Optional[datetime] = None) -> Dict:
+        """Create upcoming partitions and enforce retention"""
+        created = self.ensure_partitions(now)
+        expired = self.drop_expired(now)
+        return {"created": created, **expired}
+
+partition_manager = PartitionManager(engine)
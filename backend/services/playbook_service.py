@@ -1,41 +1,255 @@
-from typing import Dict, List
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Threads shared by all playbook runs in this process; independent steps run concurrently
+PLAYBOOK_MAX_WORKERS = int(os.getenv("PLAYBOOK_MAX_WORKERS", "8"))
+# Seconds a step may run before it is reported as timed out (steps can override with 'timeout');
+# a step still waiting for a free thread after this long is cancelled and reported as not run
+PLAYBOOK_ACTION_TIMEOUT = float(os.getenv("PLAYBOOK_ACTION_TIMEOUT", "10"))
+# Seconds an idempotent action without a 'duration' param is considered applied
+PLAYBOOK_IDEMPOTENCY_TTL = float(os.getenv("PLAYBOOK_IDEMPOTENCY_TTL", "3600"))
+# memory: per worker process, redis: shared by all Celery workers
+PLAYBOOK_IDEMPOTENCY_BACKEND = os.getenv("PLAYBOOK_IDEMPOTENCY_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Actions whose effect lasts, so repeating them for the same target within the TTL is a no-op
+IDEMPOTENT_ACTIONS = {'block_ip', 'rate_limit_ip', 'isolate_host', 'enable_captcha', 'capture_traffic'}
+
+class MemoryActionLedger:
+    """Actions applied in this process, each claim expires after its TTL"""
 
-class PlaybookEngine:
     def __init__(self):
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, ttl: float) -> bool:
+        """True if the caller should apply the action, False if it is already in effect"""
+        with self._lock:
+            now = time.monotonic()
+            if self._expires.get(key, 0) > now:
+                return False
+            if len(self._expires) > 10000:
+                self._expires = {k: expires for k, expires in self._expires.items() if expires > now}
+            self._expires[key] = now + ttl
+            return True
+
+    def release(self, key: str):
+        """Forget a claim whose action failed so the next run retries it"""
+        with self._lock:
+            self._expires.pop(key, None)
+
+class RedisActionLedger:
+    """
+    One Redis key per action and target. A claim is a SET NX that expires
+    after the action's duration, so it lapses when the effect does, and a
+    failed action deletes it to allow a retry
+    """
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = "securewatch:playbook-action"):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def claim(self, key: str, ttl: float) -> bool:
+        return bool(self._redis.set(f"{self.prefix}:{key}", 1, nx=True, px=max(1, int(ttl * 1000))))
+
+    def release(self, key: str):
+        self._redis.delete(f"{self.prefix}:{key}")
+
+def create_action_ledger():
+    """Build the ledger selected by PLAYBOOK_IDEMPOTENCY_BACKEND"""
+    if PLAYBOOK_IDEMPOTENCY_BACKEND == "redis":
+        return RedisActionLedger()
+    return MemoryActionLedger()
+
+class PlaybookEngine:
+    def __init__(self, ledger=None, max_workers: int = PLAYBOOK_MAX_WORKERS, action_timeout: float = PLAYBOOK_ACTION_TIMEOUT):
+        # Steps run as soon as the steps listed in depends_on have succeeded
         self.playbooks = {
             'sql_injection': [
-                {'action': 'block_ip', 'params': {'duration': 3600}},
-                {'action': 'alert_admin', 'params': {'priority': 'high'}},
-                {'action': 'log_incident', 'params': {}},
+                {'id': 'block', 'action': 'block_ip', 'params': {'duration': 3600}},
+                {'id': 'notify', 'action': 'alert_admin', 'params': {'priority': 'high'}},
+                {'id': 'record', 'action': 'log_incident', 'params': {}, 'depends_on': ['block', 'notify']},
             ],
             'brute_force': [
-                {'action': 'rate_limit_ip', 'params': {'max_attempts': 3}},
-                {'action': 'enable_captcha', 'params': {}},
-                {'action': 'alert_admin', 'params': {'priority': 'medium'}},
+                {'id': 'rate_limit', 'action': 'rate_limit_ip', 'params': {'max_attempts': 3}},
+                {'id': 'captcha', 'action': 'enable_captcha', 'params': {}},
+                {'id': 'notify', 'action': 'alert_admin', 'params': {'priority': 'medium'}, 'depends_on': ['rate_limit']},
             ],
             'data_exfiltration': [
-                {'action': 'block_ip', 'params': {'duration': 7200}},
-                {'action': 'isolate_host', 'params': {}},
-                {'action': 'alert_admin', 'params': {'priority': 'critical'}},
-                {'action': 'capture_traffic', 'params': {'duration': 300}},
+                {'id': 'block', 'action': 'block_ip', 'params': {'duration': 7200}},
+                {'id': 'capture', 'action': 'capture_traffic', 'params': {'duration': 300}},
+                {'id': 'isolate', 'action': 'isolate_host', 'params': {}, 'depends_on': ['block']},
+                {'id': 'notify', 'action': 'alert_admin', 'params': {'priority': 'critical'}, 'depends_on': ['isolate']},
             ],
             'port_scan': [
-                {'action': 'block_ip', 'params': {'duration': 1800}},
-                {'action': 'alert_admin', 'params': {'priority': 'medium'}},
+                {'id': 'block', 'action': 'block_ip', 'params': {'duration': 1800}},
+                {'id': 'notify', 'action': 'alert_admin', 'params': {'priority': 'medium'}},
             ]
         }
+        self.ledger = ledger if ledger is not None else create_action_ledger()
+        self.action_timeout = action_timeout
+        self.max_workers = max_workers
+        self.pool_replacements = 0
+        self._pool_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="playbook")
+        # Threads of the current pool still busy with an action whose step timed out
+        self._abandoned = 0
     
     def execute_playbook(self, threat_type: str, context: Dict) -> Dict:
-        """Execute automated response playbook"""
+        """
+        Execute automated response playbook. Independent steps run
+        concurrently, a step whose dependency failed, timed out, did not run
+        or was skipped is skipped too, and each result carries its start
+        offset and duration in ms. A step's timeout counts from when it
+        starts running; one still queued for a thread at that point is
+        cancelled and reported as not_run. A step that times out keeps its
+        thread until the action returns, but the playbook does not wait for it
+        """
         if threat_type not in self.playbooks:
             return {'status': 'no_playbook_found', 'threat_type': threat_type}
         
-        results = []
-        for step in self.playbooks[threat_type]:
-            result = self._execute_action(step['action'], step['params'], context)
-            results.append(result)
+        steps = self.playbooks[threat_type]
+        started = time.perf_counter()
+        results: Dict[str, Dict] = {}
+        pending = {step.get('id', step['action']): step for step in steps}
+        running = {}
+        
+        while pending or running:
+            # Start every step whose dependencies are settled (skips can settle more)
+            progressed = True
+            while progressed:
+                progressed = False
+                for step_id, step in list(pending.items()):
+                    depends_on = step.get('depends_on', [])
+                    if any(dep not in results for dep in depends_on):
+                        continue
+                    del pending[step_id]
+                    progressed = True
+                    blocked = [dep for dep in depends_on if results[dep]['status'] in ('failed', 'timeout', 'not_run', 'skipped')]
+                    if blocked:
+                        results[step_id] = {'step': step_id, 'action': step['action'], 'status': 'skipped', 'reason': f"dependency {blocked[0]} {results[blocked[0]]['status']}"}
+                        continue
+                    run = {'submitted': time.perf_counter(), 'started': None, 'claimed': False, 'abandoned': False, 'lock': threading.Lock()}
+                    with self._pool_lock:
+                        executor = self._executor
+                        future = executor.submit(self._run_step, step, context, run)
+                    running[future] = (step_id, step, run, executor)
+            
+            if not running:
+                if pending:
+                    # Unknown or cyclic dependencies
+                    for step_id, step in pending.items():
+                        results[step_id] = {'step': step_id, 'action': step['action'], 'status': 'skipped', 'reason': 'unresolved dependency'}
+                    pending.clear()
+                continue
+            
+            now = time.perf_counter()
+            next_deadline = min(self._deadline(step, run) for _, step, run, _ in running.values())
+            done, _ = wait(running, timeout=max(0, next_deadline - now), return_when=FIRST_COMPLETED)
+            now = time.perf_counter()
+            for future in list(running):
+                step_id, step, run, executor = running[future]
+                if future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'action': step['action'], 'status': 'failed', 'error': str(e)}
+                elif now >= self._deadline(step, run):
+                    result = self._abandon(future, executor, step, context, run)
+                else:
+                    continue
+                del running[future]
+                offset = run['started'] if run['started'] is not None else now
+                result['step'] = step_id
+                result['started_ms'] = round((offset - started) * 1000, 3)
+                result['duration_ms'] = round((now - offset) * 1000, 3)
+                results[step_id] = result
         
-        return {'status': 'completed', 'results': results, 'threat_type': threat_type}
+        ordered = [results[step.get('id', step['action'])] for step in steps]
+        failed = any(result['status'] in ('failed', 'timeout', 'not_run') for result in ordered)
+        return {
+            'status': 'partial' if failed else 'completed',
+            'results': ordered,
+            'threat_type': threat_type,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
+    
+    def _idempotency_key(self, step: Dict, context: Dict) -> Optional[str]:
+        if step['action'] not in IDEMPOTENT_ACTIONS:
+            return None
+        return f"{step['action']}:{context.get('source_ip') or '*'}"
+    
+    def _deadline(self, step: Dict, run: Dict) -> float:
+        """When a running step times out, or when a queued one gives up waiting for a thread"""
+        started = run['started']
+        return (started if started is not None else run['submitted']) + step.get('timeout', self.action_timeout)
+    
+    def _abandon(self, future, executor: ThreadPoolExecutor, step: Dict, context: Dict, run: Dict) -> Dict:
+        """Settle a step past its deadline: cancel it if it never started, else leave its thread behind"""
+        if future.cancel():
+            return {'action': step['action'], 'status': 'not_run', 'reason': 'no free playbook thread before the timeout'}
+        with run['lock']:
+            run['abandoned'] = True
+            started, claimed = run['started'], run['claimed']
+        if started is None:
+            # Picked up by a thread just now, _run_step sees the flag and returns without acting
+            return {'action': step['action'], 'status': 'not_run', 'reason': 'no free playbook thread before the timeout'}
+        if claimed:
+            # The action may still land; release so a later run retries instead of trusting it
+            self.ledger.release(self._idempotency_key(step, context))
+        self._track_abandoned(future, executor)
+        return {'action': step['action'], 'status': 'timeout'}
+    
+    def _track_abandoned(self, future, executor: ThreadPoolExecutor):
+        """Count a thread stuck in a timed-out action; once all are stuck, start a fresh pool"""
+        with self._pool_lock:
+            if executor is not self._executor:
+                return
+            self._abandoned += 1
+            if self._abandoned >= self.max_workers:
+                print(f"[PLAYBOOK] All {self.max_workers} playbook threads are stuck in timed-out actions, starting a new pool")
+                executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="playbook")
+                self._abandoned = 0
+                self.pool_replacements += 1
+                return
+        future.add_done_callback(lambda _: self._reclaim(executor))
+    
+    def _reclaim(self, executor: ThreadPoolExecutor):
+        with self._pool_lock:
+            if executor is self._executor and self._abandoned:
+                self._abandoned -= 1
+    
+    def _run_step(self, step: Dict, context: Dict, run: Optional[Dict] = None) -> Dict:
+        """Run one step unless its effect is already in place for this target"""
+        run = run if run is not None else {'abandoned': False, 'lock': threading.Lock()}
+        key = self._idempotency_key(step, context)
+        with run['lock']:
+            if run['abandoned']:
+                return {'action': step['action'], 'status': 'not_run'}
+            # The step's timeout counts from here, not from when it was queued
+            run['started'] = time.perf_counter()
+            if key is not None:
+                ttl = step['params'].get('duration', PLAYBOOK_IDEMPOTENCY_TTL)
+                if not self.ledger.claim(key, ttl):
+                    return {'action': step['action'], 'ip': context.get('source_ip'), 'status': 'already_applied'}
+                run['claimed'] = True
+        try:
+            result = self._execute_action(step['action'], step['params'], context)
+        except Exception:
+            if key is not None:
+                self.ledger.release(key)
+            raise
+        if key is not None and result.get('status') == 'not_implemented':
+            self.ledger.release(key)
+        return result
     
     def _execute_action(self, action: str, params: Dict, context: Dict) -> Dict:
         """Execute a single playbook action"""
@@ -71,7 +285,7 @@ class PlaybookEngine:
     
     def _log_incident(self, params: Dict, context: Dict) -> Dict:
         """Log incident"""
-        # In production, this would create an incident record
+        # The incident record itself is written by the alert task with these results
         print(f"[PLAYBOOK] Logging incident for alert {context.get('alert_id')}")
         return {'action': 'log_incident', 'status': 'logged'}
     
@@ -98,4 +312,3 @@ class PlaybookEngine:
         duration = params.get('duration', 300)
         print(f"[PLAYBOOK] Capturing traffic for {duration} seconds")
         return {'action': 'capture_traffic', 'duration': duration, 'status': 'capturing'}
-
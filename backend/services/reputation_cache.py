@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Entries kept in each process before the least recently used is evicted
+THREAT_INTEL_CACHE_SIZE = int(os.getenv("THREAT_INTEL_CACHE_SIZE", "10000"))
+# Seconds a reputation result is reused...
+THREAT_INTEL_CACHE_TTL = float(os.getenv("THREAT_INTEL_CACHE_TTL", "3600"))
+# ...and a negative (clean / unknown IP) result, kept shorter so newly reported IPs are picked up
+THREAT_INTEL_NEGATIVE_TTL = float(os.getenv("THREAT_INTEL_NEGATIVE_TTL", "300"))
+# memory: per process, redis: shared second tier across Celery workers
+THREAT_INTEL_CACHE_BACKEND = os.getenv("THREAT_INTEL_CACHE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Seconds between pushes of local counters to the shared Redis hash
+STATS_FLUSH_INTERVAL = 10
+
+class _InFlight:
+    """A lookup in progress that other callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[Exception] = None
+
+class ReputationCache:
+    """
+    Thread-safe LRU cache with per-entry TTLs for reputation lookups.
+    Concurrent misses for the same key share one lookup (single flight).
+    With a Redis URL, results are also stored in Redis with the same TTL so
+    every Celery worker reuses them, and hit/miss counters are aggregated
+    in a Redis hash
+    """
+
+    def __init__(
+        self,
+        maxsize: int = THREAT_INTEL_CACHE_SIZE,
+        ttl: float = THREAT_INTEL_CACHE_TTL,
+        negative_ttl: float = THREAT_INTEL_NEGATIVE_TTL,
+        redis_url: Optional[str] = None,
+        prefix: str = "securewatch:reputation"
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefix = prefix
+        self._entries: OrderedDict = OrderedDict()
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url)
+
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'shared_hits': 0,
+            'collapsed': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'load_errors': 0,
+            'redis_errors': 0,
+        }
+        self._flushed = dict(self.counters)
+        self._last_flush = time.monotonic()
+
+    def get(self, key: str, loader: Callable[[str], Dict], is_negative: Callable[[Dict], bool] = lambda value: False) -> Dict:
+        """Return the cached value for key, calling loader(key) at most once per expiry"""
+        with self._lock:
+            value = self._get_local(key)
+            if value is not None:
+                self.counters['hits'] += 1
+            else:
+                in_flight = self._in_flight.get(key)
+                leader = in_flight is None
+                if leader:
+                    in_flight = self._in_flight[key] = _InFlight()
+                else:
+                    self.counters['collapsed'] += 1
+
+        if value is not None:
+            self._maybe_flush_stats()
+            return value
+        if not leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.value
+
+        try:
+            value, ttl = self._get_shared(key)
+            if value is None:
+                self._count('misses')
+                value = loader(key)
+                ttl = self.negative_ttl if is_negative(value) else self.ttl
+                self._set_shared(key, value, ttl)
+            with self._lock:
+                self._set_local(key, value, ttl)
+            in_flight.value = value
+            return value
+        except Exception as e:
+            self._count('load_errors')
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.done.set()
+            self._maybe_flush_stats()
+
+    def _get_local(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.counters['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: Dict, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def _get_shared(self, key: str):
+        """(value, remaining ttl) from Redis, (None, None) on a miss"""
+        if self._redis is None:
+            return None, None
+        try:
+            pipe = self._redis.pipeline()
+            pipe.get(f"{self.prefix}:{key}")
+            pipe.pttl(f"{self.prefix}:{key}")
+            raw, pttl = pipe.execute()
+        except Exception as e:
+            self._count('redis_errors')
+            print(f"Reputation cache Redis error: {e}")
+            return None, None
+        if raw is None or pttl is None or pttl <= 0:
+            return None, None
+        self._count('shared_hits')
+        return json.loads(raw), pttl / 1000
+
+    def _set_shared(self, key: str, value: Dict, ttl: float):
+        if self._redis is None:
+            return
+        try:
+            self._redis.set(f"{self.prefix}:{key}", json.dumps(value), px=max(1, int(ttl * 1000)))
+        except Exception as e:
+            self._count('redis_errors')
+            print(f"Reputation cache Redis error: {e}")
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _maybe_flush_stats(self, force: bool = False):
+        """Add this process's counter deltas to the shared Redis hash"""
+        if self._redis is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_flush < STATS_FLUSH_INTERVAL:
+                return
+            deltas = {name: value - self._flushed[name] for name, value in self.counters.items()}
+            self._flushed = dict(self.counters)
+            self._last_flush = now
+        try:
+            pipe = self._redis.pipeline()
+            for name, delta in deltas.items():
+                if delta:
+                    pipe.hincrby(f"{self.prefix}:stats", name, delta)
+            pipe.execute()
+        except Exception as e:
+            print(f"Reputation cache Redis error: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Counters for this process, plus the totals across workers when Redis is used"""
+        with self._lock:
+            stats = {
+                'backend': 'redis' if self._redis is not None else 'memory',
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                **self.counters,
+            }
+        if self._redis is not None:
+            self._maybe_flush_stats(force=True)
+            try:
+                shared = self._redis.hgetall(f"{self.prefix}:stats")
+                stats['shared'] = {name.decode(): int(value) for name, value in shared.items()}
+            except Exception as e:
+                print(f"Reputation cache Redis error: {e}")
+        return stats
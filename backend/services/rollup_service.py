@@ -0,0 +1,186 @@
+import hashlib
+import math
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import LogRollup, LogRollupSource, SeverityLevel
+
+load_dotenv()
+
+# Maintain the log_rollups tables at ingest time
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() == "true"
+# Minute buckets are kept this many hours, hour buckets this many days (0 keeps everything)
+ROLLUP_MINUTE_RETENTION_HOURS = int(os.getenv("ROLLUP_MINUTE_RETENTION_HOURS", "48"))
+ROLLUP_HOUR_RETENTION_DAYS = int(os.getenv("ROLLUP_HOUR_RETENTION_DAYS", "400"))
+# Largest number of buckets a single timeseries request may return
+ROLLUP_MAX_POINTS = int(os.getenv("ROLLUP_MAX_POINTS", "5000"))
+
+# Distinct sources are counted with a HyperLogLog of 2^8 registers per bucket
+# (about 6.5% standard error), so a scan or spoofed flood adds no rows
+SOURCE_HLL_PRECISION = 8
+SOURCE_HLL_REGISTERS = 1 << SOURCE_HLL_PRECISION
+SOURCE_HLL_ALPHA = 0.7213 / (1 + 1.079 / SOURCE_HLL_REGISTERS)
+
+RESOLUTIONS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+}
+
+def bucket_start(timestamp: datetime, resolution: str) -> datetime:
+    if resolution == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+def source_register(source_ip: str):
+    """(register, rank) of a source IP in the per-bucket HyperLogLog"""
+    h = int.from_bytes(hashlib.blake2b(source_ip.encode(), digest_size=8).digest(), 'little')
+    return h & (SOURCE_HLL_REGISTERS - 1), 64 - SOURCE_HLL_PRECISION - (h >> SOURCE_HLL_PRECISION).bit_length() + 1
+
+def distinct_estimate(rank_counts: Dict[int, int]) -> int:
+    """HyperLogLog estimate from the number of registers at each rank (unset registers are absent)"""
+    zeros = SOURCE_HLL_REGISTERS - sum(rank_counts.values())
+    harmonic = zeros + sum(count * 2.0 ** -rank for rank, count in rank_counts.items())
+    estimate = SOURCE_HLL_ALPHA * SOURCE_HLL_REGISTERS ** 2 / harmonic
+    if estimate <= 2.5 * SOURCE_HLL_REGISTERS and zeros:
+        estimate = SOURCE_HLL_REGISTERS * math.log(SOURCE_HLL_REGISTERS / zeros)
+    return round(estimate)
+
+def _insert(dialect_name: str):
+    return postgresql_insert if dialect_name == "postgresql" else sqlite_insert
+
+def apply_rollups(db: Session, records: List[Dict]):
+    """
+    Fold a batch of stored log records into the rollup tables. The batch is
+    aggregated in memory first, so a whole batch costs one upsert per
+    distinct bucket/severity/log_type/anomaly combination. Run it before the
+    batch commits so logs and rollups land together
+    """
+    if not ROLLUPS_ENABLED or not records:
+        return
+
+    counts = Counter()
+    registers = {}
+    for record in records:
+        severity = record['severity'] or SeverityLevel.LOW
+        source = source_register(record['source_ip']) if record.get('source_ip') else None
+        for resolution in RESOLUTIONS:
+            bucket = bucket_start(record['timestamp'], resolution)
+            counts[(resolution, bucket, severity.value, record['log_type'] or '', bool(record['is_anomaly']))] += 1
+            if source:
+                key = (resolution, bucket, source[0])
+                registers[key] = max(registers.get(key, 0), source[1])
+
+    dialect_name = db.bind.dialect.name
+    insert = _insert(dialect_name)
+
+    # Sorted so concurrent batches lock rollup rows in the same order
+    rows = [
+        {
+            'resolution': resolution,
+            'bucket': bucket,
+            'severity': SeverityLevel(severity),
+            'log_type': log_type,
+            'is_anomaly': is_anomaly,
+            'count': count
+        }
+        for (resolution, bucket, severity, log_type, is_anomaly), count in sorted(counts.items())
+    ]
+    stmt = insert(LogRollup)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['resolution', 'bucket', 'severity', 'log_type', 'is_anomaly'],
+            set_={'count': LogRollup.count + stmt.excluded.count}
+        ),
+        rows
+    )
+
+    if registers:
+        # Registers only ever grow: keep the larger rank (max() is SQLite's two-argument form of greatest())
+        greatest = func.greatest if dialect_name == "postgresql" else func.max
+        stmt = insert(LogRollupSource)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=['resolution', 'bucket', 'register'],
+                set_={'rank': greatest(LogRollupSource.rank, stmt.excluded.rank)}
+            ),
+            [
+                {'resolution': resolution, 'bucket': bucket, 'register': register, 'rank': rank}
+                for (resolution, bucket, register), rank in sorted(registers.items())
+            ]
+        )
+
+def choose_resolution(since: datetime, until: datetime) -> str:
+    """Minute buckets for windows up to six hours, hour buckets beyond"""
+    return "minute" if until - since <= timedelta(hours=6) else "hour"
+
+def timeseries(db: Session, since: datetime, until: datetime, resolution: str) -> List[Dict]:
+    """Zero-filled buckets between since and until built from the rollup tables"""
+    step = RESOLUTIONS[resolution]
+    first = bucket_start(since, resolution)
+
+    buckets = {}
+    bucket = first
+    while bucket < until:
+        buckets[bucket] = {
+            'bucket': bucket,
+            'total': 0,
+            'anomalies': 0,
+            'distinct_sources': 0,
+            'severity': {level.value: 0 for level in SeverityLevel},
+            'log_type': {}
+        }
+        bucket += step
+
+    rows = db.execute(
+        select(LogRollup.bucket, LogRollup.severity, LogRollup.log_type, LogRollup.is_anomaly, LogRollup.count)
+        .where(LogRollup.resolution == resolution, LogRollup.bucket >= first, LogRollup.bucket < until)
+    )
+    for bucket, severity, log_type, is_anomaly, count in rows:
+        point = buckets.get(bucket)
+        if point is None:
+            continue
+        point['total'] += count
+        if is_anomaly:
+            point['anomalies'] += count
+        point['severity'][severity.value] += count
+        point['log_type'][log_type] = point['log_type'].get(log_type, 0) + count
+
+    rank_counts: Dict[datetime, Dict[int, int]] = {}
+    rows = db.execute(
+        select(LogRollupSource.bucket, LogRollupSource.rank, func.count())
+        .where(LogRollupSource.resolution == resolution, LogRollupSource.bucket >= first, LogRollupSource.bucket < until)
+        .group_by(LogRollupSource.bucket, LogRollupSource.rank)
+    )
+    for bucket, rank, count in rows:
+        rank_counts.setdefault(bucket, {})[rank] = count
+    for bucket, counts in rank_counts.items():
+        if bucket in buckets:
+            buckets[bucket]['distinct_sources'] = distinct_estimate(counts)
+
+    return list(buckets.values())
+
+def prune_rollups(db: Session, now: Optional[datetime] = None) -> Dict:
+    """Delete rollup buckets past their retention"""
+    now = now or datetime.utcnow()
+    deleted = {}
+    for resolution, retention in (
+        ("minute", timedelta(hours=ROLLUP_MINUTE_RETENTION_HOURS)),
+        ("hour", timedelta(days=ROLLUP_HOUR_RETENTION_DAYS)),
+    ):
+        if not retention:
+            continue
+        cutoff = now - retention
+        deleted[resolution] = 0
+        for model in (LogRollup, LogRollupSource):
+            deleted[resolution] += db.execute(
+                delete(model).where(model.resolution == resolution, model.bucket < cutoff)
+            ).rowcount
+    db.commit()
+    return deleted
@@ -0,0 +1,163 @@
+import ipaddress
+from functools import lru_cache
+from typing import Dict, FrozenSet, Optional, Tuple
+
+SEVERITIES = {'low', 'medium', 'high', 'critical'}
+
+@lru_cache(maxsize=4096)
+def _parse_ip(ip: str):
+    try:
+        return ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+
+class SubscriptionFilter:
+    """
+    Server-side filter a WebSocket client subscribes with. Every field is
+    optional and an unset field matches everything, so the default filter
+    receives all events. Supported fields:
+        types:        event types, e.g. ["new_log", "new_alert"]
+        severities:   ["high", "critical"]
+        is_anomaly:   true / false
+        log_types:    ["SSH", "HTTP"]
+        source_cidrs: ["203.0.113.0/24"]
+    """
+
+    def __init__(
+        self,
+        types: Optional[FrozenSet[str]] = None,
+        severities: Optional[FrozenSet[str]] = None,
+        is_anomaly: Optional[bool] = None,
+        log_types: Optional[FrozenSet[str]] = None,
+        source_cidrs: Optional[Tuple[str, ...]] = None
+    ):
+        self.types = types
+        self.severities = severities
+        self.is_anomaly = is_anomaly
+        self.log_types = log_types
+        self.source_cidrs = source_cidrs
+        self.networks = [ipaddress.ip_network(cidr, strict=False) for cidr in source_cidrs or ()]
+        self.key = (
+            types,
+            severities,
+            is_anomaly,
+            log_types,
+            frozenset(str(network) for network in self.networks) or None
+        )
+
+    @classmethod
+    def from_dict(cls, spec: Optional[Dict]) -> 'SubscriptionFilter':
+        """Validate and normalize a filter sent by a client, raises ValueError"""
+        if spec is None:
+            spec = {}
+        if not isinstance(spec, dict):
+            raise ValueError("'filter' must be an object")
+        unknown = set(spec) - {'types', 'severities', 'is_anomaly', 'log_types', 'source_cidrs'}
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+
+        def string_set(field, lower=False):
+            values = spec.get(field)
+            if values is None:
+                return None
+            if isinstance(values, str):
+                values = [values]
+            if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+                raise ValueError(f"'{field}' must be a list of strings")
+            return frozenset(v.lower() if lower else v for v in values)
+
+        severities = string_set('severities', lower=True)
+        if severities and not severities <= SEVERITIES:
+            raise ValueError(f"Invalid severities: {', '.join(sorted(severities - SEVERITIES))}")
+
+        is_anomaly = spec.get('is_anomaly')
+        if is_anomaly is not None and not isinstance(is_anomaly, bool):
+            raise ValueError("'is_anomaly' must be a boolean")
+
+        cidrs = string_set('source_cidrs')
+        try:
+            filter_ = cls(
+                types=string_set('types'),
+                severities=severities,
+                is_anomaly=is_anomaly,
+                log_types=string_set('log_types'),
+                source_cidrs=tuple(sorted(cidrs)) if cidrs else None
+            )
+        except ValueError as e:
+            raise ValueError(f"Invalid source CIDR: {e}")
+        return filter_
+
+    def to_dict(self) -> Dict:
+        return {
+            'types': sorted(self.types) if self.types is not None else None,
+            'severities': sorted(self.severities) if self.severities is not None else None,
+            'is_anomaly': self.is_anomaly,
+            'log_types': sorted(self.log_types) if self.log_types is not None else None,
+            'source_cidrs': [str(network) for network in self.networks] or None,
+        }
+
+    def matches(self, message: Dict) -> bool:
+        """Check an event against the filter (event type is checked by the index)"""
+        data = message.get('data') or {}
+
+        if self.severities is not None and data.get('severity') not in self.severities:
+            return False
+        if self.is_anomaly is not None and data.get('is_anomaly') is not self.is_anomaly:
+            return False
+        if self.log_types is not None and data.get('log_type') not in self.log_types:
+            return False
+        if self.networks:
+            ip = _parse_ip(data.get('source_ip') or '')
+            if ip is None or not any(ip in network for network in self.networks):
+                return False
+        return True
+
+MATCH_ALL = SubscriptionFilter()
+
+class SubscriptionIndex:
+    """
+    Groups clients by identical filter and indexes the groups by event type,
+    so each event is evaluated once per distinct relevant filter instead of
+    once per connected client
+    """
+
+    def __init__(self):
+        self.filters: Dict[tuple, SubscriptionFilter] = {}
+        self.members: Dict[tuple, set] = {}
+        self.by_type: Dict[Optional[str], set] = {}
+
+    def add(self, filter_: SubscriptionFilter, member):
+        key = filter_.key
+        if key not in self.filters:
+            self.filters[key] = filter_
+            self.members[key] = set()
+            for event_type in filter_.types or (None,):
+                self.by_type.setdefault(event_type, set()).add(key)
+        self.members[key].add(member)
+
+    def remove(self, filter_: SubscriptionFilter, member):
+        key = filter_.key
+        members = self.members.get(key)
+        if members is None:
+            return
+        members.discard(member)
+        if members:
+            return
+        del self.members[key]
+        del self.filters[key]
+        for event_type in filter_.types or (None,):
+            keys = self.by_type.get(event_type)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_type[event_type]
+
+    def match(self, message: Dict):
+        """Yield every member whose filter accepts the message"""
+        keys = self.by_type.get(message.get('type'), set()) | self.by_type.get(None, set())
+        for key in keys:
+            if self.filters[key].matches(message):
+                yield from self.members[key]
+
+    def __len__(self) -> int:
+        return len(self.filters)
@@ -2,17 +2,45 @@ from typing import Dict
 import os
 from dotenv import load_dotenv
 
+from services.intel_index import intel_index
+from services.reputation_cache import REDIS_URL, THREAT_INTEL_CACHE_BACKEND, ReputationCache
+
 load_dotenv()
 
 class ThreatIntelligence:
-    def __init__(self):
+    def __init__(self, cache: ReputationCache = None):
         # These would be real API keys in production
         self.abuse_ipdb_key = os.getenv("ABUSE_IPDB_KEY", "")
         self.virustotal_key = os.getenv("VIRUSTOTAL_KEY", "")
         self.enabled = bool(self.abuse_ipdb_key or self.virustotal_key)
+        self.cache = cache or ReputationCache(
+            redis_url=REDIS_URL if THREAT_INTEL_CACHE_BACKEND == "redis" else None
+        )
     
     def check_ip_reputation(self, ip: str) -> Dict:
-        """Check IP against threat intelligence sources"""
+        """Check IP against threat intelligence sources (cached per IP)"""
+        # Copy so callers can't mutate the cached entry
+        return dict(self.cache.get(ip, self.lookup_ip_reputation, lambda intel: not intel['is_malicious']))
+    
+    def lookup_ip_reputation(self, ip: str) -> Dict:
+        """Query threat intelligence sources for an IP, bypassing the cache"""
+        # The offline index (see services/intel_index.py) wins when one has been built
+        intel = intel_index.lookup(ip)
+        if intel is not None:
+            reputation = intel['reputation'] or {}
+            geo = intel['geo'] or {}
+            return {
+                'ip': ip,
+                'is_malicious': bool(reputation),
+                'abuse_score': reputation.get('score', 0),
+                'country': geo.get('country', 'Unknown'),
+                'asn': geo.get('asn'),
+                'as_org': geo.get('as_org'),
+                'reports': len(reputation.get('lists', [])),
+                'lists': reputation.get('lists', []),
+                'source': 'local_index'
+            }
+        
         if not self.enabled:
             # Return mock data when API keys are not configured
             return {
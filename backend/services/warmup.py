@@ -0,0 +1,107 @@
+"""
+Lazy initialization of slow subsystems
+
+Connecting to Elasticsearch, loading the anomaly model and creating the
+database schema are LazyResources: nothing happens at import, the API
+starts building them on background threads at startup, and whichever
+caller needs one first either waits for it or carries on without it.
+GET /ready reports the state of each.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds before a subsystem that failed to initialize is tried again
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "30"))
+
+class LazyResource:
+    """A value built once by factory, on first use or by a background warm-up"""
+
+    def __init__(self, name: str, factory: Callable[[], Any], required: bool = True, retry_interval: float = WARMUP_RETRY_INTERVAL):
+        self.name = name
+        self.factory = factory
+        # Required resources must be ready before /ready reports the process ready
+        self.required = required
+        self.retry_interval = retry_interval
+        self.state = 'cold'
+        self.error: Optional[str] = None
+        self.duration_ms: Optional[float] = None
+        self._value = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+
+    def get(self, wait: bool = True):
+        """
+        The built value. With wait the caller builds it (or waits for the
+        warm-up thread); without, None is returned until it is ready and a
+        background build is started if none is running
+        """
+        if self.state == 'ready':
+            return self._value
+        if wait:
+            self._build()
+        else:
+            self.warm_up()
+        return self._value
+
+    def warm_up(self):
+        """Build in a background thread, unless it is built, building or waiting out a retry"""
+        if self.state in ('ready', 'warming') or (self.state == 'failed' and time.monotonic() < self._retry_at):
+            return
+        threading.Thread(target=self._build, name=f"warmup-{self.name}", daemon=True).start()
+
+    def _build(self):
+        with self._lock:
+            if self.state == 'ready' or (self.state == 'failed' and time.monotonic() < self._retry_at):
+                return
+            self.state = 'warming'
+            started = time.perf_counter()
+            try:
+                value = self.factory()
+            except Exception as e:
+                self.state = 'failed'
+                self.error = str(e)
+                self._retry_at = time.monotonic() + self.retry_interval
+                print(f"Warning: {self.name} not available: {e}")
+                return
+            finally:
+                self.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            self._value = value
+            self.error = None
+            self.state = 'ready'
+
+    def status(self) -> Dict:
+        return {'state': self.state, 'required': self.required, 'duration_ms': self.duration_ms, 'error': self.error}
+
+class Warmup:
+    """The process's lazy resources, started together and reported by /ready"""
+
+    def __init__(self):
+        self.resources: Dict[str, LazyResource] = {}
+        self.started_at = time.monotonic()
+
+    def add(self, resource: LazyResource) -> LazyResource:
+        self.resources[resource.name] = resource
+        return resource
+
+    def start(self):
+        """Warm every resource that is not ready, also retries failed ones that are due"""
+        for resource in self.resources.values():
+            resource.warm_up()
+
+    def status(self) -> Dict:
+        return {
+            'ready': all(resource.ready for resource in self.resources.values() if resource.required),
+            'uptime_seconds': round(time.monotonic() - self.started_at, 3),
+            'subsystems': {name: resource.status() for name, resource in self.resources.items()}
+        }
+
+warmup = Warmup()
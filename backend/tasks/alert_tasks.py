@@ -1,13 +1,25 @@
 from celery_app import celery_app
-from services.ml_service import extract_features
+from services.ml_service import BEHAVIOR_DISTINCT_DESTINATION_THRESHOLD, BEHAVIOR_FAILED_LOGIN_THRESHOLD, extract_features
 from services.threat_intel_service import ThreatIntelligence
 from services.playbook_service import PlaybookEngine
-from models import Alert, SeverityLevel, AlertStatus
+from services.broadcast_backplane import publish_event
+from services.alert_counters import adjust_statement, reconcile
+from services.alert_dedup import create_alert_window, dedup_key
+from services.alert_queue import ALERT_BATCH_MAX_BATCHES, ALERT_BATCH_MODE, ALERT_BATCH_SIZE, pop_alert_payloads, push_alert_payloads
+from models import Alert, Incident, SeverityLevel, AlertStatus
 from database import SessionLocal
+import json
 import traceback
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import insert, select, update
 
 threat_intel = ThreatIntelligence()
 playbook_engine = PlaybookEngine()
+alert_window = create_alert_window()
+
+SEVERITY_RANK = {SeverityLevel.LOW: 0, SeverityLevel.MEDIUM: 1, SeverityLevel.HIGH: 2, SeverityLevel.CRITICAL: 3}
 
 def calculate_severity(confidence: float) -> SeverityLevel:
     """Calculate alert severity based on confidence score"""
@@ -20,41 +32,171 @@ def calculate_severity(confidence: float) -> SeverityLevel:
     else:
         return SeverityLevel.LOW
 
-def detect_threat_type(raw_log: str) -> str:
-    """Detect threat type from log content"""
+def detect_threat_type(raw_log: str, behavior: Optional[Dict] = None) -> str:
+    """Detect threat type from log content and, when given, the source's recent behavior"""
     raw_log_lower = raw_log.lower()
+    behavior = behavior or {}
     
     if any(kw in raw_log_lower for kw in ['sql', 'union', 'select', "' or '1'='1", '--']):
         return 'sql_injection'
     elif 'failed login' in raw_log_lower or 'brute force' in raw_log_lower:
         return 'brute_force'
+    elif behavior.get('src_failed_logins', 0) >= BEHAVIOR_FAILED_LOGIN_THRESHOLD:
+        return 'brute_force'
     elif any(kw in raw_log_lower for kw in ['exfiltrat', 'large data', 'gb', 'mb']):
         return 'data_exfiltration'
     elif 'port scan' in raw_log_lower:
         return 'port_scan'
+    elif behavior.get('src_distinct_destinations', 0) >= BEHAVIOR_DISTINCT_DESTINATION_THRESHOLD:
+        return 'port_scan'
     else:
         return 'unknown'
 
+def alert_values(log_data: Dict, threat_type: str, now: datetime, occurrences: int = 1) -> Dict:
+    """Column values for a new alert raised from an anomaly payload"""
+    return {
+        'title': f"Anomaly detected from {log_data.get('source_ip', 'unknown')}",
+        'description': f"Suspicious activity detected: {log_data.get('raw_log', '')[:200]}",
+        'severity': calculate_severity(log_data.get('confidence', 0.5)),
+        'source': "ML Engine",
+        'source_ip': log_data.get('source_ip'),
+        'timestamp': now,
+        'is_resolved': False,
+        'status': AlertStatus.OPEN,
+        'category': threat_type.replace('_', ' ').title(),
+        'anomaly_score': str(log_data.get('anomaly_score', 0)),
+        'occurrence_count': occurrences,
+        'first_seen': now,
+        'last_seen': now
+    }
+
+def new_alert_event(alert_id: int, values: Dict, log_type: Optional[str]) -> Dict:
+    """Build the WebSocket event for a newly created alert"""
+    return {
+        'type': 'new_alert',
+        'data': {
+            'id': alert_id,
+            'title': values['title'],
+            'severity': values['severity'].value,
+            'source_ip': values['source_ip'],
+            'category': values['category'],
+            'status': values['status'].value,
+            'is_anomaly': True,
+            'log_type': log_type,
+            'timestamp': values['timestamp'].isoformat()
+        }
+    }
+
+def alert_updated_event(alert_id: int, occurrences: int, severity: SeverityLevel, now: datetime, log_data: Dict) -> Dict:
+    """Build the WebSocket event for occurrences folded into an open alert"""
+    return {
+        'type': 'alert_updated',
+        'data': {
+            'id': alert_id,
+            'source_ip': log_data.get('source_ip'),
+            'occurrence_count': occurrences,
+            'severity': severity.value,
+            'last_seen': now.isoformat(),
+            'is_anomaly': True,
+            'log_type': log_data.get('log_type')
+        }
+    }
+
+def run_playbook(threat_type: str, alert_id: int, log_data: Dict, severity: SeverityLevel):
+    """Execute the playbook for a known threat type and record it as an incident, errors are logged and swallowed"""
+    if threat_type == 'unknown':
+        return
+    try:
+        playbook_results = playbook_engine.execute_playbook(threat_type, {
+            'source_ip': log_data.get('source_ip'),
+            'alert_id': alert_id,
+            'log_data': log_data
+        })
+        if playbook_results.get('status') == 'no_playbook_found':
+            return
+        
+        db = SessionLocal()
+        try:
+            db.add(Incident(
+                title=f"Automated response to {threat_type.replace('_', ' ')} from {log_data.get('source_ip', 'unknown')}",
+                description=f"Playbook {threat_type} executed for alert {alert_id}",
+                severity=severity,
+                playbook_executed=True,
+                playbook_results=playbook_results
+            ))
+            db.commit()
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"Playbook execution error: {e}")
+
+def merge_into_alert(db, alert_id: int, now: datetime, severity: SeverityLevel, count: int = 1) -> Optional[Tuple[int, SeverityLevel]]:
+    """
+    Count more occurrences on an unresolved alert, raising its severity when
+    the new payloads are more confident (caller commits). Returns the new
+    count and severity, or None when the alert was resolved or deleted
+    """
+    current = db.execute(
+        select(Alert.severity).where(Alert.id == alert_id, Alert.is_resolved.is_(False)).with_for_update()
+    ).scalar()
+    if current is None:
+        return None
+    if SEVERITY_RANK[severity] <= SEVERITY_RANK[current]:
+        severity = current
+    occurrences = db.execute(
+        update(Alert)
+        .where(Alert.id == alert_id)
+        .values(occurrence_count=Alert.occurrence_count + count, last_seen=now, severity=severity)
+        .returning(Alert.occurrence_count)
+    ).scalar()
+    if severity != current:
+        db.execute(adjust_statement(current, False, -1))
+        db.execute(adjust_statement(severity, False, 1))
+    return occurrences, severity
+
+def fold_into_open_alert(db, key, now: datetime, severity: SeverityLevel, count: int = 1) -> Optional[Tuple[int, int, SeverityLevel]]:
+    """
+    (alert id, occurrences, severity) after merging into the alert whose
+    window is open for key, or None when the caller is to create the alert
+    (and then register() or release() the key)
+    """
+    for _ in range(3):
+        alert_id = alert_window.acquire(key)
+        if alert_id is None:
+            return None
+        merged = merge_into_alert(db, alert_id, now, severity, count)
+        if merged is not None:
+            return (alert_id,) + merged
+        # Resolved (or deleted) since the window opened: close it so the next acquire creates a new alert
+        alert_window.forget(key, alert_id)
+    return None
+
 @celery_app.task
 def analyze_log_and_create_alert(log_data: dict):
     """Analyze log and create alert if anomaly detected"""
+    key = None
     try:
         db = SessionLocal()
+        now = datetime.utcnow()
         
         # Extract threat type
-        threat_type = detect_threat_type(log_data.get('raw_log', ''))
+        threat_type = detect_threat_type(log_data.get('raw_log', ''), log_data.get('behavior'))
+        
+        # Fold repeats of an open (source_ip, threat type) window into its alert
+        if alert_window is not None:
+            key = dedup_key(log_data.get('source_ip'), threat_type)
+            merged = fold_into_open_alert(db, key, now, calculate_severity(log_data.get('confidence', 0.5)))
+            if merged is not None:
+                db.commit()
+                db.close()
+                alert_id, occurrences, severity = merged
+                key = None
+                publish_event(alert_updated_event(alert_id, occurrences, severity, now, log_data))
+                return {"alert_created": False, "alert_id": alert_id, "merged": True, "threat_type": threat_type}
         
         # Create alert
-        alert = Alert(
-            title=f"Anomaly detected from {log_data.get('source_ip', 'unknown')}",
-            description=f"Suspicious activity detected: {log_data.get('raw_log', '')[:200]}",
-            severity=calculate_severity(log_data.get('confidence', 0.5)),
-            source="ML Engine",
-            source_ip=log_data.get('source_ip'),
-            status=AlertStatus.OPEN,
-            category=threat_type.replace('_', ' ').title(),
-            anomaly_score=str(log_data.get('anomaly_score', 0))
-        )
+        values = alert_values(log_data, threat_type, now)
+        alert = Alert(**values)
         
         # Enrich with threat intelligence
         if log_data.get('source_ip'):
@@ -62,30 +204,198 @@ def analyze_log_and_create_alert(log_data: dict):
             alert.threat_intel = intel
         
         db.add(alert)
+        db.execute(adjust_statement(alert.severity, False, 1))
         db.commit()
         alert_id = alert.id
-        db.refresh(alert)
+        if key is not None:
+            alert_window.register(key, alert_id)
+            key = None
+        
+        # Push the new alert to connected dashboards
+        publish_event(new_alert_event(alert_id, values, log_data.get('log_type')))
         
         # Execute playbook if threat type is known
-        if threat_type != 'unknown':
-            try:
-                playbook_results = playbook_engine.execute_playbook(threat_type, {
-                    'source_ip': log_data.get('source_ip'),
-                    'alert_id': alert_id,
-                    'log_data': log_data
-                })
-                # Store playbook results in alert or incident
-            except Exception as e:
-                print(f"Playbook execution error: {e}")
+        run_playbook(threat_type, alert_id, log_data, values['severity'])
         
         db.close()
         
         return {"alert_created": True, "alert_id": alert_id, "threat_type": threat_type}
     except Exception as e:
+        if key is not None:
+            alert_window.release(key)
         print(f"Error creating alert: {e}")
         print(traceback.format_exc())
         return {"alert_created": False, "error": str(e)}
 
+def create_alerts_batch(db, payloads: List[Dict]) -> Dict:
+    """
+    Create alerts for many anomaly payloads at once: payloads for the same
+    (source_ip, threat type) fold into one alert, open dedup windows are
+    extended with one UPDATE per alert, threat intel is looked up once per
+    IP and all new alerts go in with one bulk insert. A payload that fails
+    is reported in the summary without failing the rest of the batch
+    """
+    now = datetime.utcnow()
+    summary = {'processed': len(payloads), 'created': 0, 'merged': 0, 'failed': 0, 'errors': []}
+    
+    def fail(items: List[Dict], error: Exception):
+        summary['failed'] += len(items)
+        for item in items:
+            summary['errors'].append({'log_id': item.get('log_id'), 'error': str(error)})
+    
+    # Classify, grouping repeats when deduplication is on
+    groups: Dict[tuple, Dict] = {}
+    for i, payload in enumerate(payloads):
+        try:
+            threat_type = detect_threat_type(payload.get('raw_log', ''), payload.get('behavior'))
+            severity = calculate_severity(payload.get('confidence', 0.5))
+            key = dedup_key(payload.get('source_ip'), threat_type) if alert_window is not None else (i,)
+            group = groups.setdefault(key, {'key': key, 'threat_type': threat_type, 'items': [], 'severity': severity})
+            group['items'].append(payload)
+            group['severity'] = max(group['severity'], severity, key=SEVERITY_RANK.get)
+        except Exception as e:
+            fail([payload], e)
+    
+    # Extend alerts whose window is still open
+    new_groups = []
+    merged = []
+    for key, group in groups.items():
+        if alert_window is None:
+            new_groups.append(group)
+            continue
+        try:
+            with db.begin_nested():
+                result = fold_into_open_alert(db, key, now, group['severity'], len(group['items']))
+        except Exception as e:
+            alert_window.release(key)
+            fail(group['items'], e)
+            continue
+        if result is None:
+            new_groups.append(group)
+        else:
+            merged.append((result, group))
+    if merged:
+        db.commit()
+        summary['merged'] = sum(len(group['items']) for _, group in merged)
+        for (alert_id, occurrences, severity), group in merged:
+            publish_event(alert_updated_event(alert_id, occurrences, severity, now, group['items'][-1]))
+    
+    # Build every row on its own so one bad payload cannot fail the whole insert
+    valid_groups = []
+    rows = []
+    for group in new_groups:
+        try:
+            # The most confident payload decides the severity
+            representative = max(group['items'], key=lambda item: item.get('confidence', 0.5))
+            rows.append(alert_values(representative, group['threat_type'], now, len(group['items'])))
+            valid_groups.append(group)
+        except Exception as e:
+            if alert_window is not None:
+                alert_window.release(group['key'])
+            fail(group['items'], e)
+    new_groups = valid_groups
+    
+    if not new_groups:
+        return summary
+    
+    # One threat intel lookup per distinct IP
+    intel = {}
+    for row in rows:
+        ip = row['source_ip']
+        try:
+            if ip is not None and ip not in intel:
+                intel[ip] = threat_intel.check_ip_reputation(ip)
+            row['threat_intel'] = intel.get(ip)
+        except Exception as e:
+            print(f"Threat intel lookup error for {ip}: {e}")
+            row['threat_intel'] = None
+    
+    try:
+        ids = db.scalars(insert(Alert).returning(Alert.id, sort_by_parameter_order=True), rows).all()
+        for severity, count in Counter(row['severity'] for row in rows).items():
+            db.execute(adjust_statement(severity, False, count))
+        db.commit()
+    except Exception as e:
+        # Isolate the failing rows by falling back to one transaction per alert
+        db.rollback()
+        print(f"Bulk alert insert failed, retrying one by one: {e}")
+        ids = []
+        for group, row in zip(new_groups, rows):
+            try:
+                ids.append(db.scalars(insert(Alert).returning(Alert.id), [row]).one())
+                db.execute(adjust_statement(row['severity'], False, 1))
+                db.commit()
+            except Exception as row_error:
+                db.rollback()
+                ids.append(None)
+                fail(group['items'], row_error)
+    
+    for group, row, alert_id in zip(new_groups, rows, ids):
+        if alert_id is None:
+            if alert_window is not None:
+                alert_window.release(group['key'])
+            continue
+        summary['created'] += 1
+        if alert_window is not None:
+            alert_window.register(group['key'], alert_id)
+        publish_event(new_alert_event(alert_id, row, group['items'][0].get('log_type')))
+        run_playbook(group['threat_type'], alert_id, group['items'][0], row['severity'])
+    
+    return summary
+
+def queue_alert_analysis(payloads: List[Dict]) -> int:
+    """Hand anomaly payloads to the alert workers, batched through Redis in ALERT_BATCH_MODE"""
+    if not payloads:
+        return 0
+    if ALERT_BATCH_MODE:
+        # Trigger a consumer only when the queue was empty before this push; while
+        # it is non-empty a consumer is already due, and beat polls in case a trigger is lost
+        if push_alert_payloads(payloads) == len(payloads):
+            process_alert_batch.delay()
+    else:
+        for payload in payloads:
+            analyze_log_and_create_alert.delay(payload)
+    return len(payloads)
+
+@celery_app.task
+def process_alert_batch():
+    """Drain the alert queue in batches of ALERT_BATCH_SIZE payloads"""
+    totals = Counter()
+    for _ in range(ALERT_BATCH_MAX_BATCHES):
+        payloads = []
+        raw_items = pop_alert_payloads(ALERT_BATCH_SIZE)
+        if not raw_items:
+            break
+        for raw in raw_items:
+            try:
+                payloads.append(json.loads(raw))
+            except ValueError:
+                totals['failed'] += 1
+                print(f"Dropping malformed alert payload: {raw[:200]!r}")
+        
+        db = SessionLocal()
+        try:
+            summary = create_alerts_batch(db, payloads)
+        except Exception as e:
+            print(f"Error creating alert batch: {e}")
+            print(traceback.format_exc())
+            summary = {'processed': len(payloads), 'failed': len(payloads)}
+        finally:
+            db.close()
+        for name in ('processed', 'created', 'merged', 'failed'):
+            totals[name] += summary.get(name, 0)
+        totals['batches'] += 1
+    return dict(totals)
+
+@celery_app.task
+def reconcile_alert_counters():
+    """Rebuild the alert counters from the alerts table to fix any drift"""
+    db = SessionLocal()
+    try:
+        return reconcile(db)
+    finally:
+        db.close()
+
 @celery_app.task
 def send_alert_notification(alert_id: int):
     """Send email/slack notification for critical alerts"""
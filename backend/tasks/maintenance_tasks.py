@@ -0,0 +1,18 @@
+from celery_app import celery_app
+from database import SessionLocal
+from services.partition_manager import partition_manager
+from services.rollup_service import prune_rollups
+
+@celery_app.task
+def maintain_log_partitions():
+    """Create upcoming log_entries partitions and drop expired ones"""
+    return partition_manager.maintain()
+
+@celery_app.task
+def prune_log_rollups():
+    """Delete rollup buckets past their retention"""
+    db = SessionLocal()
+    try:
+        return prune_rollups(db)
+    finally:
+        db.close()
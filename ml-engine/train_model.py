@@ -8,7 +8,9 @@ import numpy as np
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 import joblib
+import argparse
 import os
+import sys
 from datetime import datetime, timedelta
 
 def ip_to_int(ip):
@@ -38,6 +40,10 @@ def generate_training_data(num_samples=10000):
             has_sql = 1
             has_script = np.random.choice([0, 1])
             failed_login = np.random.choice([0, 1])
+            # Brute forcing and scanning sources are busy in the behavior window
+            src_events = np.random.randint(20, 500)
+            src_failed_logins = np.random.randint(10, 200) if failed_login else np.random.randint(0, 3)
+            src_distinct_destinations = np.random.randint(50, 500) if np.random.random() < 0.3 else np.random.randint(1, 10)
         else:
             # Normal traffic patterns
             hour = np.random.randint(8, 20)  # Business hours
@@ -47,6 +53,9 @@ def generate_training_data(num_samples=10000):
             has_sql = 0
             has_script = 0
             failed_login = 0
+            src_events = np.random.randint(1, 30)
+            src_failed_logins = np.random.randint(0, 2)
+            src_distinct_destinations = np.random.randint(1, 10)
         
         data.append({
             'hour': hour,
@@ -57,6 +66,9 @@ def generate_training_data(num_samples=10000):
             'has_sql_keywords': has_sql,
             'has_script_tags': has_script,
             'failed_login': failed_login,
+            'src_events': src_events,
+            'src_failed_logins': src_failed_logins,
+            'src_distinct_destinations': src_distinct_destinations,
             'is_anomaly': 1 if is_anomaly else 0
         })
     
@@ -67,9 +79,10 @@ def train_model():
     print("Generating training data...")
     df = generate_training_data(10000)
     
-    # Features for training
+    # Features for training, in backend MODEL_FEATURE_NAMES order (per-log, then per-source behavior)
     features = ['hour', 'day_of_week', 'source_ip_int', 'dest_ip_int', 
-                'log_length', 'has_sql_keywords', 'has_script_tags', 'failed_login']
+                'log_length', 'has_sql_keywords', 'has_script_tags', 'failed_login',
+                'src_events', 'src_failed_logins', 'src_distinct_destinations']
     
     X = df[features].values
     
@@ -109,9 +122,24 @@ def train_model():
     
     return model, scaler
 
+def publish_model(description):
+    """Add the saved model and scaler to the backend's model registry as the active version"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+    from services.model_registry import publish
+    
+    meta = publish('ml-engine/anomaly_detector.pkl', 'ml-engine/scaler.pkl', description=description)
+    print(f"Published and activated model version {meta['version']}")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the SecureWatch anomaly detection model")
+    parser.add_argument("--publish", action="store_true", help="Publish the model to the registry, running workers switch to it")
+    parser.add_argument("--description", default="", help="Description stored with the published version")
+    args = parser.parse_args()
+    
     print("Training SecureWatch Anomaly Detection Model")
     print("=" * 50)
     train_model()
+    if args.publish:
+        publish_model(args.description)
     print("\nTraining complete!")
 
@@ -0,0 +1,104 @@
+"""
+Alert creation benchmark for SecureWatch
+Creates alerts for the same stream of anomaly payloads with the
+per-message task body (analyze_log_and_create_alert, one transaction and
+one threat intel lookup per payload) and with the batched consumer body
+(create_alerts_batch), and reports payloads/sec for each.
+
+Both run in-process so Celery and broker overhead is left out, which
+favours the per-message path. Threat intel is replaced by a stub that
+sleeps --intel-ms per lookup to stand in for an uncached reputation
+check, and playbooks are disabled. Uses DATABASE_URL like the backend does.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from database import SessionLocal, engine, init_db
+from services.alert_dedup import MemoryAlertWindow
+import tasks.alert_tasks as alert_tasks
+
+RAW_LOGS = [
+    "Failed login for root from {ip} port 22 ssh2",
+    "GET /search?q=1' UNION SELECT password FROM users-- HTTP/1.1",
+    "GET /index.php?page=../../etc/passwd HTTP/1.1",
+    "GET /comment?text=<script>alert(1)</script> HTTP/1.1",
+    "Connection attempt on port 4444 from {ip}",
+]
+
+def make_payloads(count, ips, seed):
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(count):
+        host = rng.randrange(ips)
+        ip = f"203.0.{host // 250}.{host % 250}"
+        payloads.append({
+            'log_id': i,
+            'source_ip': ip,
+            'destination_ip': '192.168.1.10',
+            'raw_log': rng.choice(RAW_LOGS).format(ip=ip),
+            'log_type': 'auth',
+            'anomaly_score': round(rng.uniform(-0.5, 0), 3),
+            'confidence': round(rng.uniform(0.3, 1.0), 3)
+        })
+    return payloads
+
+def run_single(payloads):
+    for payload in payloads:
+        alert_tasks.analyze_log_and_create_alert(payload)
+
+def run_batched(payloads, batch_size):
+    for start in range(0, len(payloads), batch_size):
+        db = SessionLocal()
+        try:
+            alert_tasks.create_alerts_batch(db, payloads[start:start + batch_size])
+        finally:
+            db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-message vs batched alert creation")
+    parser.add_argument("--count", type=int, default=2000, help="Anomaly payloads per run")
+    parser.add_argument("--ips", type=int, default=200, help="Distinct source IPs in the stream")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--intel-ms", type=float, default=2.0, help="Simulated latency of one threat intel lookup")
+    parser.add_argument("--dedup", action="store_true", help="Fold repeats into open alerts (ALERT_DEDUP_WINDOW) in both paths")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    init_db()
+
+    lookups = []
+    def stub_lookup(ip):
+        lookups.append(ip)
+        time.sleep(args.intel_ms / 1000)
+        return {'ip': ip, 'is_malicious': False, 'source': 'bench'}
+    alert_tasks.threat_intel.check_ip_reputation = stub_lookup
+    alert_tasks.playbook_engine.execute_playbook = lambda *args, **kwargs: None
+
+    payloads = make_payloads(args.count, args.ips, args.seed)
+
+    print("SecureWatch Alert Creation Benchmark")
+    print("=" * 50)
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    print(f"{args.count} payloads, {args.ips} source IPs, {args.intel_ms} ms per intel lookup, dedup {'on' if args.dedup else 'off'}\n")
+    print(f"{'mode':>16} {'seconds':>10} {'payloads/s':>12} {'intel calls':>12}")
+
+    runs = [("per-message", lambda: run_single(payloads))]
+    for batch_size in args.batch_sizes:
+        runs.append((f"batch {batch_size}", lambda batch_size=batch_size: run_batched(payloads, batch_size)))
+
+    for name, run in runs:
+        # A fresh window per run so every mode starts with no open alerts
+        alert_tasks.alert_window = MemoryAlertWindow() if args.dedup else None
+        lookups.clear()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>16} {elapsed:>10.2f} {args.count / elapsed:>12.0f} {len(lookups):>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Behavior store benchmark for SecureWatch
+Streams logs from a large number of distinct source IPs through the
+sliding-window BehaviorStore, with one brute-forcing and one scanning
+source planted in the traffic, and reports observe() cost, sketch memory
+(which should not move) and the estimates for the planted sources.
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from services.behavior_store import BehaviorStore
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-source behavior sketches")
+    parser.add_argument("--ips", type=int, default=2000000, help="Distinct background source IPs")
+    parser.add_argument("--rate", type=float, default=20000, help="Simulated logs per second")
+    parser.add_argument("--attacks", type=int, default=200, help="Failed logins / ports from each planted source")
+    args = parser.parse_args()
+
+    store = BehaviorStore()
+    start_memory = store.stats()['memory_bytes']
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print("SecureWatch Behavior Store Benchmark")
+    print("=" * 50)
+    print(f"{args.ips} distinct sources at {args.rate:.0f} logs/s, window {store.stats()['window_seconds']:.0f}s\n")
+    print(f"{'sources':>10} {'us/log':>8} {'sketch MB':>10} {'max RSS MB':>11}")
+
+    now = 0.0
+    step = 1 / args.rate
+    # Planted sources are spread through the stream
+    attack_every = max(1, args.ips // args.attacks)
+    checkpoint = max(1, args.ips // 5)
+    started = time.perf_counter()
+    for i in range(args.ips):
+        now += step
+        store.observe(f"{(i >> 24) & 255}.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", "10.0.0.1:443", i % 17 == 0, now=now)
+        if i % attack_every == 0:
+            store.observe("203.0.113.66", "10.0.0.5:22", True, now=now)
+            store.observe("203.0.113.77", f"10.0.0.9:{i % 65536}", False, now=now)
+        if (i + 1) % checkpoint == 0:
+            elapsed = time.perf_counter() - started
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{i + 1:>10} {elapsed / (i + 1) * 1e6:>8.2f} {store.stats()['memory_bytes'] / 1e6:>10.1f} {rss:>11.1f}")
+
+    window_attacks = min(args.attacks, int(store.stats()['window_seconds'] * args.rate / attack_every))
+    print(f"\nSketch memory {start_memory / 1e6:.1f} MB before, {store.stats()['memory_bytes'] / 1e6:.1f} MB after "
+          f"(RSS grew {(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss) / 1024:.1f} MB)")
+    print(f"Planted sources, about {window_attacks} events each in the last window:")
+    print(f"  brute force  (events, failed logins, destinations) = {store.estimate('203.0.113.66', now=now)}")
+    print(f"  port scan    (events, failed logins, destinations) = {store.estimate('203.0.113.77', now=now)}")
+    print(f"  background   (events, failed logins, destinations) = {store.estimate('0.0.0.1', now=now)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Cold start benchmark for SecureWatch
+Starts the API under uvicorn and measures the time until /health answers
+(serving) and until /ready returns 200 (every required subsystem warm), then
+times a Celery worker process importing the app and its task modules.
+--hang-es points Elasticsearch at a local socket that accepts connections
+and never answers, the case that used to stall boot on timeouts.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+WORKER_BOOT = """
+import time
+started = time.perf_counter()
+from celery_app import celery_app
+celery_app.loader.import_default_modules()
+print(time.perf_counter() - started)
+"""
+
+def start_blackhole() -> int:
+    """Listen on a free port and accept connections without ever replying"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(128)
+    connections = []
+
+    def accept():
+        while True:
+            connections.append(server.accept()[0])
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server.getsockname()[1]
+
+def get(url: str):
+    """(status, body) or (None, None) when nothing is listening yet"""
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'null')
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None, None
+
+def time_api(env, port, timeout):
+    """Seconds from process start to serving /health and to /ready returning 200"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port)],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    serving = ready = None
+    body = None
+    try:
+        while time.perf_counter() - started < timeout and ready is None:
+            if process.poll() is not None:
+                raise RuntimeError("uvicorn exited, run it by hand to see the error")
+            if serving is None:
+                status, _ = get(f"http://127.0.0.1:{port}/health")
+                if status == 200:
+                    serving = time.perf_counter() - started
+            else:
+                status, body = get(f"http://127.0.0.1:{port}/ready")
+                if status == 200:
+                    ready = time.perf_counter() - started
+            time.sleep(0.01)
+        if ready is None:
+            _, body = get(f"http://127.0.0.1:{port}/ready")
+    finally:
+        process.terminate()
+        process.wait()
+    return serving, ready, body
+
+def time_worker(env):
+    """(wall seconds including interpreter start, seconds importing the app and task modules)"""
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', WORKER_BOOT], cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, float(output.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API and Celery worker cold start")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for /ready per run")
+    parser.add_argument("--hang-es", action="store_true", help="Point Elasticsearch at a socket that never answers")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.hang_es:
+        env['ELASTICSEARCH_URL'] = f"http://127.0.0.1:{start_blackhole()}"
+
+    print("SecureWatch Cold Start Benchmark")
+    print("=" * 50)
+    print(f"Elasticsearch: {env.get('ELASTICSEARCH_URL', 'http://localhost:9200')}\n")
+
+    serving_times, ready_times = [], []
+    for run in range(args.runs):
+        serving, ready, body = time_api(env, args.port, args.timeout)
+        if serving is None:
+            print(f"API run {run + 1}: /health not answering after {args.timeout:.0f}s")
+            continue
+        serving_times.append(serving)
+        if ready is not None:
+            ready_times.append(ready)
+        subsystems = {name: sub['state'] for name, sub in (body or {}).get('subsystems', {}).items()}
+        ready_text = f"{ready:.2f}s" if ready is not None else f"not ready after {args.timeout:.0f}s"
+        print(f"API run {run + 1}: serving /health {serving:.2f}s, /ready {ready_text} {subsystems}")
+
+    worker = [time_worker(env) for _ in range(args.runs)]
+    for run, (wall, imports) in enumerate(worker):
+        print(f"Worker run {run + 1}: process {wall:.2f}s, app + task imports {imports:.2f}s")
+
+    if serving_times:
+        print(f"\nMedian API serving {statistics.median(serving_times):.2f}s"
+              + (f", ready {statistics.median(ready_times):.2f}s" if ready_times else ""))
+    print(f"Median worker boot {statistics.median(wall for wall, _ in worker):.2f}s")
+
+if __name__ == "__main__":
+    main()
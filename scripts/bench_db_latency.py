@@ -0,0 +1,101 @@
+"""
+Database latency benchmark for SecureWatch
+Replays an open-loop stream of concurrent "list alerts" requests through
+the blocking Session (the previous router setup) and through the asyncio
+AsyncSession layer, and reports p50/p95/p99 latency per setup.
+
+Uses DATABASE_URL / ASYNC_DATABASE_URL like the backend does.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from sqlalchemy import func, select, text
+
+from database import AsyncSessionLocal, SessionLocal, engine, init_db
+from models import Alert, SeverityLevel
+
+def build_query(pg_sleep_ms):
+    """Representative router query, optionally padded with pg_sleep to mimic a slow database"""
+    query = select(Alert).order_by(Alert.timestamp.desc()).limit(100)
+    if pg_sleep_ms:
+        return text(f"SELECT pg_sleep({pg_sleep_ms / 1000})"), query
+    return None, query
+
+async def blocking_handler(queries):
+    """An async handler using the blocking Session, as the routers did before"""
+    db = SessionLocal()
+    try:
+        for query in queries:
+            db.execute(query).all()
+    finally:
+        db.close()
+
+async def async_handler(queries):
+    """An async handler using AsyncSession"""
+    async with AsyncSessionLocal() as db:
+        for query in queries:
+            (await db.execute(query)).all()
+
+async def run(handler, queries, rate, count):
+    """Fire `count` requests at `rate` req/s and return per-request latencies in ms"""
+    loop = asyncio.get_running_loop()
+    start = loop.time() + 0.05
+    latencies = []
+
+    async def request(i):
+        arrival = start + i / rate
+        await asyncio.sleep(max(0, arrival - loop.time()))
+        await handler(queries)
+        latencies.append((loop.time() - arrival) * 1000)
+
+    await asyncio.gather(*(request(i) for i in range(count)))
+    return sorted(latencies)
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def seed_alerts(rows):
+    """Make sure the alerts table has enough rows to query"""
+    init_db()
+    db = SessionLocal()
+    try:
+        existing = db.scalar(select(func.count()).select_from(Alert))
+        if existing < rows:
+            db.add_all(
+                Alert(title=f"Benchmark alert {i}", severity=SeverityLevel.LOW, source="benchmark")
+                for i in range(rows - existing)
+            )
+            db.commit()
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark blocking vs asyncio database sessions")
+    parser.add_argument("--rate", type=float, default=200, help="Requests per second")
+    parser.add_argument("--count", type=int, default=2000, help="Requests per setup")
+    parser.add_argument("--seed-rows", type=int, default=1000, help="Minimum rows in the alerts table")
+    parser.add_argument("--pg-sleep-ms", type=float, default=0, help="Extra server-side delay per request (PostgreSQL only)")
+    args = parser.parse_args()
+
+    seed_alerts(args.seed_rows)
+    queries = [q for q in build_query(args.pg_sleep_ms) if q is not None]
+
+    print("SecureWatch Database Latency Benchmark")
+    print("=" * 50)
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    print(f"{args.count} requests at {args.rate:.0f} req/s\n")
+    print(f"{'setup':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+
+    for name, handler in (("blocking", blocking_handler), ("async", async_handler)):
+        latencies = asyncio.run(run(handler, queries, args.rate, args.count))
+        print(
+            f"{name:>10} {percentile(latencies, 50):>10.2f} {percentile(latencies, 95):>10.2f} "
+            f"{percentile(latencies, 99):>10.2f} {latencies[-1]:>10.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
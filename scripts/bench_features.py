@@ -0,0 +1,111 @@
+"""
+Feature extraction microbenchmark for SecureWatch
+Compares the compiled single-pass FeatureExtractor against the original
+multi-scan extract_features implementation on realistic log lengths
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from services.feature_extractor import AHOCORASICK_AVAILABLE, AHOCORASICK_MAX_LENGTH, FEATURE_NAMES, feature_extractor, ip_to_int
+
+from log_simulator import generate_normal_traffic, generate_suspicious_traffic
+
+def legacy_ip_to_int(ip):
+    """Original IP conversion, kept as the benchmark baseline"""
+    try:
+        parts = ip.split('.')
+        if len(parts) != 4:
+            return 0
+        return sum(int(part) * (256 ** (3 - i)) for i, part in enumerate(parts))
+    except:
+        return 0
+
+def legacy_extract_features(log_entry):
+    """Original extract_features, kept as the benchmark baseline"""
+    timestamp = log_entry.get('timestamp')
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except:
+            timestamp = datetime.utcnow()
+    elif not isinstance(timestamp, datetime):
+        timestamp = datetime.utcnow()
+
+    raw_log = log_entry.get('raw_log', '').lower()
+
+    return {
+        'hour': timestamp.hour,
+        'day_of_week': timestamp.weekday(),
+        'source_ip_int': legacy_ip_to_int(log_entry.get('source_ip', '0.0.0.0')),
+        'dest_ip_int': legacy_ip_to_int(log_entry.get('destination_ip', '0.0.0.0')),
+        'log_length': len(log_entry.get('raw_log', '')),
+        'has_sql_keywords': int(any(kw in raw_log for kw in ['select', 'union', 'drop', 'delete', 'insert', 'update', "' or '1'='1", '--'])),
+        'has_script_tags': int('<script>' in raw_log or 'javascript:' in raw_log),
+        'failed_login': int('failed login' in raw_log or 'authentication failed' in raw_log or 'unauthorized' in raw_log),
+    }
+
+FILLER = (
+    "GET /static/app.js HTTP/1.1 200 ua=Mozilla/5.0 (X11; Linux x86_64) "
+    "referer=https://intranet.example.com/dashboard?page=2&sort=desc "
+)
+
+def generate_entries(count, length):
+    """Generate log entries padded to roughly `length` characters"""
+    entries = []
+    for _ in range(count):
+        log = generate_normal_traffic() if random.random() > 0.1 else generate_suspicious_traffic()
+        padding = FILLER * (length // len(FILLER) + 1)
+        offset = random.randint(0, len(FILLER))
+        raw_log = (log['raw_log'] + ' ' + padding[offset:])[:length]
+        entries.append({
+            'timestamp': datetime.utcnow(),
+            'source_ip': log['source_ip'],
+            'destination_ip': log['destination_ip'],
+            'raw_log': raw_log,
+        })
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feature extraction")
+    parser.add_argument("--count", type=int, default=5000, help="Log entries per length")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[64, 256, 1024, 4096])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    print("SecureWatch Feature Extraction Benchmark")
+    print("=" * 50)
+    print(f"Matcher: {f'aho-corasick below {AHOCORASICK_MAX_LENGTH} chars, then substring search' if AHOCORASICK_AVAILABLE else 'substring search'}\n")
+    print(f"{'length':>8} {'legacy us/log':>15} {'compiled us/log':>17} {'speedup':>9}")
+
+    for length in args.lengths:
+        entries = generate_entries(args.count, length)
+
+        for entry in entries:
+            legacy = legacy_extract_features(entry)
+            compiled = feature_extractor.extract_row(entry)
+            assert [legacy[name] for name in FEATURE_NAMES] == list(compiled), entry
+
+        ip_to_int.cache_clear()
+        legacy_time = min(timeit.repeat(
+            lambda: [legacy_extract_features(e) for e in entries], number=1, repeat=3
+        ))
+        compiled_time = min(timeit.repeat(
+            lambda: feature_extractor.extract_matrix(entries), number=1, repeat=3
+        ))
+
+        legacy_us = legacy_time / len(entries) * 1e6
+        compiled_us = compiled_time / len(entries) * 1e6
+        print(f"{length:>8} {legacy_us:>15.2f} {compiled_us:>17.2f} {legacy_us / compiled_us:>8.1f}x")
+
+    print(f"\nip_to_int cache: {ip_to_int.cache_info()}")
+
+if __name__ == "__main__":
+    main()
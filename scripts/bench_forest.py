@@ -0,0 +1,81 @@
+"""
+Isolation Forest scoring benchmark for SecureWatch
+Times sklearn's scaler.transform + score_samples against the array-compiled
+forest (services/forest_compiler.py) per call at several batch sizes, and
+checks that both give the same scores
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml-engine'))
+
+from services.forest_compiler import CompiledForest
+
+def load_or_train(model_path, scaler_path):
+    """The given model files, or a model trained like ml-engine/train_model.py"""
+    import joblib
+    if model_path and scaler_path:
+        return joblib.load(model_path), joblib.load(scaler_path)
+
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+    from train_model import generate_training_data
+
+    np.random.seed(42)
+    df = generate_training_data(10000)
+    X = df.drop(columns=['is_anomaly']).values
+    scaler = StandardScaler().fit(X)
+    model = IsolationForest(contamination=0.15, random_state=42, n_estimators=100).fit(scaler.transform(X))
+    return model, scaler
+
+def time_calls(fn, matrix, seconds):
+    """Per-call latencies in ms over about `seconds` of repeated calls"""
+    fn(matrix)
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or len(latencies) < 5:
+        started = time.perf_counter()
+        fn(matrix)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return np.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compiled Isolation Forest scoring")
+    parser.add_argument("--model", help="anomaly_detector.pkl (trained in memory if omitted)")
+    parser.add_argument("--scaler", help="scaler.pkl")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 4096])
+    parser.add_argument("--seconds", type=float, default=2.0, help="Time spent per batch size and scorer")
+    args = parser.parse_args()
+
+    model, scaler = load_or_train(args.model, args.scaler)
+    started = time.perf_counter()
+    forest = CompiledForest.from_model(model, scaler)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    print("SecureWatch Isolation Forest Scoring Benchmark")
+    print("=" * 50)
+    print(f"{forest.n_trees} trees, depth {forest.depth}, {forest.n_features} features, compiled in {compile_ms:.1f} ms\n")
+
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(forest.mean, forest.scale * 2, (max(args.batch_sizes), forest.n_features))
+    difference = np.abs(forest.score_samples(matrix) - model.score_samples(scaler.transform(matrix))).max()
+    print(f"Max score difference vs sklearn over {len(matrix)} rows: {difference:.2e}\n")
+
+    sklearn_score = lambda batch: model.score_samples(scaler.transform(batch))
+    print(f"{'batch':>6} {'scorer':>9} {'p50 ms':>9} {'p99 ms':>9} {'us/row':>8} {'speedup':>8}")
+    for size in args.batch_sizes:
+        batch = matrix[:size]
+        baseline = time_calls(sklearn_score, batch, args.seconds)
+        compiled = time_calls(forest.score_samples, batch, args.seconds)
+        for name, latencies in (('sklearn', baseline), ('compiled', compiled)):
+            p50, p99 = np.percentile(latencies, [50, 99])
+            speedup = np.median(baseline) / p50
+            print(f"{size:>6} {name:>9} {p50:>9.3f} {p99:>9.3f} {p50 * 1000 / size:>8.2f} {speedup:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Ingest throughput benchmark for SecureWatch
+Compares logs/sec of the single-log endpoint against the batch endpoint
+"""
+import argparse
+import random
+import time
+import requests
+
+from log_simulator import generate_normal_traffic, generate_suspicious_traffic
+
+API_BASE = "http://localhost:8000/api/logs"
+
+def generate_logs(count):
+    """Generate a mix of normal and suspicious logs (90/10)"""
+    return [
+        generate_normal_traffic() if random.random() > 0.1 else generate_suspicious_traffic()
+        for _ in range(count)
+    ]
+
+def bench_single(session, logs):
+    """Send logs one request at a time, returns logs/sec"""
+    start = time.perf_counter()
+    for log in logs:
+        response = session.post(f"{API_BASE}/ingest", json=log, timeout=30)
+        response.raise_for_status()
+    return len(logs) / (time.perf_counter() - start)
+
+def bench_batch(session, logs, batch_size):
+    """Send logs in batches, returns logs/sec"""
+    start = time.perf_counter()
+    for i in range(0, len(logs), batch_size):
+        response = session.post(
+            f"{API_BASE}/ingest/batch",
+            json={"logs": logs[i:i + batch_size]},
+            timeout=120
+        )
+        response.raise_for_status()
+    return len(logs) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single vs batch log ingestion")
+    parser.add_argument("--count", type=int, default=2000, help="Logs sent per run")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    logs = generate_logs(args.count)
+
+    print("SecureWatch Ingest Benchmark")
+    print("=" * 50)
+    print(f"Sending {args.count} logs to {API_BASE}\n")
+
+    with requests.Session() as session:
+        single = bench_single(session, logs)
+        print(f"{'single':>12}: {single:10.1f} logs/sec")
+
+        for batch_size in args.batch_sizes:
+            rate = bench_batch(session, logs, batch_size)
+            print(f"{'batch ' + str(batch_size):>12}: {rate:10.1f} logs/sec ({rate / single:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Metrics overhead benchmark for SecureWatch
+Times the instrumentation calls the ingest path makes (a timed stage, a
+counter increment, a labelled series lookup) with metrics enabled and
+disabled, and how long rendering /metrics takes for a registry filled like
+a busy API worker
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from services.metrics import INGEST_STAGES, MetricsRegistry
+
+def per_call_ns(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e9
+
+def build(enabled: bool):
+    registry = MetricsRegistry(enabled=enabled)
+    stages = registry.histogram("bench_stage_seconds", "Stage time", ("mode", "stage"))
+    counter = registry.counter("bench_total", "Events", ("reason",))
+    return registry, stages, counter
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure metrics instrumentation overhead")
+    parser.add_argument("--iterations", type=int, default=500000)
+    args = parser.parse_args()
+
+    print("SecureWatch Metrics Overhead Benchmark")
+    print("=" * 50)
+    baseline = per_call_ns(lambda: None, args.iterations)
+    print(f"Empty call: {baseline:.0f} ns\n")
+
+    print(f"{'operation':<28} {'enabled ns':>11} {'disabled ns':>12}")
+    results = {}
+    for enabled in (True, False):
+        registry, stages, counter = build(enabled)
+        series = stages.labels('single', 'predict')
+        reason = counter.labels('error')
+
+        def timed_stage():
+            with series.time():
+                pass
+
+        results[enabled] = {
+            'timed stage': per_call_ns(timed_stage, args.iterations),
+            'counter inc': per_call_ns(reason.inc, args.iterations),
+            'labels() + inc': per_call_ns(lambda: counter.labels('error').inc(), args.iterations),
+            'observe': per_call_ns(lambda: series.observe(0.002), args.iterations),
+        }
+    for operation in results[True]:
+        print(f"{operation:<28} {results[True][operation]:>11.0f} {results[False][operation]:>12.0f}")
+
+    registry, stages, counter = build(True)
+    for mode in ('single', 'batch'):
+        for stage in INGEST_STAGES:
+            series = stages.labels(mode, stage)
+            for value in (0.0002, 0.003, 0.04, 0.6):
+                series.observe(value)
+    for reason in ('error', 'no_model'):
+        counter.labels(reason).inc()
+    started = time.perf_counter()
+    for _ in range(100):
+        text = registry.render()
+    render_ms = (time.perf_counter() - started) / 100 * 1000
+    print(f"\nRender {len(text.splitlines())} lines: {render_ms:.2f} ms")
+
+if __name__ == "__main__":
+    main()
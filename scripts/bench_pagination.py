@@ -0,0 +1,94 @@
+"""
+Pagination benchmark for SecureWatch
+Times fetching one page of logs at increasing depths with skip/limit
+(OFFSET) and with keyset cursors on (timestamp, id).
+
+Uses DATABASE_URL like the backend does.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from sqlalchemy import func, insert, select
+
+from database import SessionLocal, engine, init_db
+from models import LogEntry, SeverityLevel
+from pagination import encode_cursor, paginate
+
+def seed_logs(rows):
+    """Make sure log_entries has at least `rows` rows"""
+    init_db()
+    db = SessionLocal()
+    try:
+        existing = db.scalar(select(func.count()).select_from(LogEntry))
+        start = datetime.utcnow() - timedelta(days=30)
+        for offset in range(existing, rows, 10000):
+            db.execute(insert(LogEntry), [
+                {
+                    "source_ip": f"10.0.{i % 250}.{i % 200}",
+                    "destination_ip": "192.168.1.10",
+                    # A few rows per second so ties on timestamp exercise the id tie-breaker
+                    "timestamp": start + timedelta(seconds=i // 3),
+                    "log_type": "HTTP",
+                    "raw_log": f"GET /page/{i} HTTP/1.1 200",
+                    "severity": SeverityLevel.LOW,
+                    "is_anomaly": False
+                }
+                for i in range(offset, min(rows, offset + 10000))
+            ])
+            db.commit()
+    finally:
+        db.close()
+
+def time_query(db, query, repeat):
+    """Best of `repeat` runs in ms"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.execute(query).all()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OFFSET vs keyset pagination")
+    parser.add_argument("--rows", type=int, default=500000, help="Minimum rows in log_entries")
+    parser.add_argument("--limit", type=int, default=100, help="Page size")
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1000, 10000, 100000, 400000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seed_logs(args.rows)
+
+    print("SecureWatch Pagination Benchmark")
+    print("=" * 50)
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    print(f"Page size {args.limit}\n")
+    print(f"{'depth':>10} {'offset ms':>12} {'cursor ms':>12}")
+
+    base = select(LogEntry)
+    db = SessionLocal()
+    try:
+        for depth in args.depths:
+            offset_ms = time_query(db, paginate(base, LogEntry.timestamp, LogEntry.id, depth, args.limit, None), args.repeat)
+
+            # Cursor a client would hold after paging down to `depth` (looked up untimed)
+            cursor = None
+            if depth:
+                last = db.execute(
+                    select(LogEntry.timestamp, LogEntry.id)
+                    .order_by(LogEntry.timestamp.desc(), LogEntry.id.desc())
+                    .offset(depth - 1).limit(1)
+                ).one()
+                cursor = encode_cursor(last.timestamp, last.id)
+            cursor_ms = time_query(db, paginate(base, LogEntry.timestamp, LogEntry.id, 0, args.limit, cursor), args.repeat)
+
+            print(f"{depth:>10} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
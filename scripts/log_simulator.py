@@ -1,13 +1,30 @@
 """
 Log Simulator for SecureWatch
-Generates realistic log entries for testing the SOC platform
+Generates realistic log entries for testing the SOC platform, and doubles as
+a load generator: logs are sent open-loop at a target rate (each request
+goes out at its scheduled time however slow the API is, and latency is
+measured from that time), as single logs, batches or through the async
+queue, from a seeded normal/attack mix or replayed from an NDJSON capture.
+Reports p50/p95/p99 latency, errors and achieved throughput.
 """
-import requests
+import argparse
+import asyncio
+import itertools
+import json
 import random
 import time
-from datetime import datetime
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
 
-API_URL = "http://localhost:8000/api/logs/ingest"
+API_URL = "http://localhost:8000"
+
+ENDPOINTS = {
+    'single': "/api/logs/ingest",
+    'batch': "/api/logs/ingest/batch",
+    'async': "/api/logs/ingest/async",
+}
+# Fields of a log accepted by the ingest endpoints, anything else in a capture is ignored
+LOG_FIELDS = ("source_ip", "destination_ip", "log_type", "raw_log", "message")
 
 def generate_normal_traffic():
     """Generate normal traffic log"""
@@ -55,7 +72,7 @@ def generate_suspicious_traffic():
             "message": "XSS attempt detected"
         },
     ]
-    
+
     attack = random.choice(attacks)
     return {
         "source_ip": f"203.0.113.{random.randint(1, 254)}",
@@ -65,41 +82,210 @@ def generate_suspicious_traffic():
         "message": attack["message"]
     }
 
-def send_log(log_data):
-    """Send log to API"""
+def generate_logs(attack_ratio: float, seed: Optional[int]) -> Iterator[Dict]:
+    """Endless normal/suspicious mix, the same sequence for the same seed"""
+    random.seed(seed)
+    while True:
+        if random.random() < attack_ratio:
+            yield generate_suspicious_traffic()
+        else:
+            yield generate_normal_traffic()
+
+def replay_logs(path: str, loop: bool) -> Iterator[Dict]:
+    """Logs from an NDJSON capture (one JSON object per line), repeated with loop"""
+    while True:
+        replayed = 0
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield {field: record.get(field) for field in LOG_FIELDS}
+                    replayed += 1
+        if not loop or not replayed:
+            return
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+class Stats:
+    """Latencies and outcomes of the requests completed so far"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.latencies: List[float] = []
+        self.requests = 0
+        self.logs_ok = 0
+        self.logs_failed = 0
+        self.anomalies = 0
+        self.errors: Counter = Counter()
+        self._reported = 0
+
+    def record(self, latency_ms: float, logs: int, error: Optional[str] = None, anomalies: int = 0):
+        self.requests += 1
+        self.latencies.append(latency_ms)
+        if error:
+            self.errors[error] += 1
+            self.logs_failed += logs
+        else:
+            self.logs_ok += logs
+            self.anomalies += anomalies
+
+    def report(self, final: bool = False) -> str:
+        """Summary line; interim reports cover the requests since the previous one"""
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies if final else self.latencies[self._reported:])
+        self._reported = len(self.latencies)
+        errors = sum(self.errors.values())
+        line = (
+            f"{elapsed:7.1f}s  {self.logs_ok / elapsed:8.1f} logs/s ok  "
+            f"errors {errors / self.requests if self.requests else 0:6.2%}"
+        )
+        if latencies:
+            line += (
+                f"  p50 {percentile(latencies, 50):8.1f} ms  p95 {percentile(latencies, 95):8.1f} ms"
+                f"  p99 {percentile(latencies, 99):8.1f} ms  max {latencies[-1]:8.1f} ms"
+            )
+        return line
+
+def log_outcome(log: Dict, result: Dict):
+    """Per-log output of --verbose"""
+    if result.get('is_anomaly'):
+        print(f"⚠️  Anomaly detected: {log['raw_log'][:50]}...")
+    else:
+        print(f"✓  Normal log ingested: {log['log_type']}")
+
+async def send(client, args, logs: List[Dict], due: float, stats: Stats):
+    """Send one request and record its latency from the time it was scheduled for"""
+    loop = asyncio.get_running_loop()
+    error, anomalies = None, 0
     try:
-        response = requests.post(API_URL, json=log_data, timeout=5)
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('is_anomaly'):
-                print(f"⚠️  Anomaly detected: {log_data['raw_log'][:50]}...")
-            else:
-                print(f"✓  Normal log ingested: {log_data['log_type']}")
+        if args.endpoint == 'batch':
+            response = await client.post(ENDPOINTS['batch'], json={"logs": logs})
         else:
-            print(f"✗  Error: {response.status_code}")
-    except requests.exceptions.RequestException as e:
-        print(f"✗  Connection error: {e}")
+            response = await client.post(ENDPOINTS[args.endpoint], json=logs[0])
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}"
+        elif args.endpoint == 'batch':
+            anomalies = response.json()['anomalies']
+        elif args.endpoint == 'single':
+            result = response.json()
+            anomalies = int(bool(result.get('is_anomaly')))
+            if args.verbose:
+                log_outcome(logs[0], result)
+    except Exception as e:
+        error = type(e).__name__
+    stats.record((loop.time() - due) * 1000, len(logs), error, anomalies)
+    if error and args.verbose:
+        print(f"✗  Error: {error}")
+
+async def batch_endpoint_available(client) -> bool:
+    """Older backends have no batch endpoint, an empty batch tells without ingesting anything"""
+    try:
+        response = await client.post(ENDPOINTS['batch'], json={"logs": []})
+    except Exception:
+        return True
+    return response.status_code not in (404, 405)
+
+async def run(args, source: Iterator[Dict], stats: Stats):
+    import httpx
+
+    batch_size = args.batch_size if args.endpoint == 'batch' else 1
+    interval = batch_size / args.rate
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    # No pool timeout: a request waiting for a connection is late, and its latency shows it
+    timeout = httpx.Timeout(args.timeout, pool=None)
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        if args.endpoint == 'batch' and not await batch_endpoint_available(client):
+            print("Batch endpoint not available, sending single logs\n")
+            args.endpoint, batch_size, interval = 'single', 1, 1 / args.rate
+
+        record = open(args.record, 'w') if args.record else None
+        stats.started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + args.duration if args.duration else None
+        next_report = start + args.report_interval
+        pending = set()
+        sent = 0
+        try:
+            for i in itertools.count():
+                logs = list(itertools.islice(source, min(batch_size, args.count - sent) if args.count else batch_size))
+                if not logs:
+                    break
+                due = start + i * interval
+                if deadline is not None and due >= deadline:
+                    break
+                if record:
+                    record.writelines(json.dumps(log) + "\n" for log in logs)
+                await asyncio.sleep(max(0, due - loop.time()))
+
+                if len(pending) >= args.max_pending:
+                    # The API has fallen so far behind that the client would only queue more memory
+                    stats.record((loop.time() - due) * 1000, len(logs), "client backlog full")
+                else:
+                    task = asyncio.create_task(send(client, args, logs, due, stats))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                sent += len(logs)
+
+                if loop.time() >= next_report and stats.requests:
+                    print(stats.report())
+                    next_report += args.report_interval
+            if pending:
+                await asyncio.wait(pending)
+        finally:
+            if record:
+                record.close()
 
 def main():
-    """Main simulation loop"""
+    """Send logs at the requested rate until --duration, --count, the capture or Ctrl+C ends the run"""
+    parser = argparse.ArgumentParser(description="Generate or replay SecureWatch logs at a target rate")
+    parser.add_argument("--url", default=API_URL, help="API base URL")
+    parser.add_argument("--rate", type=float, default=0.5, help="Logs per second")
+    parser.add_argument("--duration", type=float, help="Seconds to run (default: until Ctrl+C)")
+    parser.add_argument("--count", type=int, help="Stop after this many logs")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="single")
+    parser.add_argument("--batch-size", type=int, default=100, help="Logs per request with --endpoint batch")
+    parser.add_argument("--attack-ratio", type=float, default=0.1, help="Share of suspicious logs in the generated mix")
+    parser.add_argument("--seed", type=int, help="Seed for a reproducible log sequence")
+    parser.add_argument("--replay", help="NDJSON capture to send instead of generated logs")
+    parser.add_argument("--loop", action="store_true", help="Repeat the --replay capture")
+    parser.add_argument("--record", help="Also write every log sent to this NDJSON file")
+    parser.add_argument("--concurrency", type=int, default=100, help="Maximum open connections")
+    parser.add_argument("--max-pending", type=int, default=10000, help="Requests in flight before new ones are counted as failed")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds per request")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument("--verbose", action="store_true", help="Print every log's outcome")
+    args = parser.parse_args()
+    if args.rate <= 0 or args.batch_size < 1:
+        parser.error("--rate and --batch-size must be positive")
+
+    source = replay_logs(args.replay, args.loop) if args.replay else generate_logs(args.attack_ratio, args.seed)
+
     print("SecureWatch Log Simulator")
     print("=" * 50)
-    print(f"Sending logs to {API_URL}")
+    print(f"Sending logs to {args.url}{ENDPOINTS[args.endpoint]} at {args.rate:g} logs/s")
+    print(f"Source: {args.replay if args.replay else f'generated, {args.attack_ratio:.0%} suspicious, seed {args.seed}'}")
     print("Press Ctrl+C to stop\n")
-    
+
+    stats = Stats()
     try:
-        while True:
-            # 90% normal, 10% suspicious
-            if random.random() > 0.1:
-                log = generate_normal_traffic()
-            else:
-                log = generate_suspicious_traffic()
-            
-            send_log(log)
-            time.sleep(2)  # Send a log every 2 seconds
+        asyncio.run(run(args, source, stats))
     except KeyboardInterrupt:
         print("\n\nSimulator stopped.")
+    except ImportError:
+        print("httpx is required: pip install httpx")
+        return
+    if not stats.requests:
+        return
+
+    print("\nSummary")
+    print("-" * 50)
+    print(stats.report(final=True))
+    print(f"Requests {stats.requests}, logs ok {stats.logs_ok}, failed {stats.logs_failed}, anomalies {stats.anomalies}")
+    for error, count in stats.errors.most_common():
+        print(f"  {error}: {count}")
 
 if __name__ == "__main__":
     main()
-
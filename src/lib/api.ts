@@ -23,6 +23,9 @@ export interface Alert {
   assigned_to?: string;
   category?: string;
   anomaly_score?: string;
+  occurrence_count?: number;
+  first_seen?: string;
+  last_seen?: string;
 }
 
 export interface LogEntry {